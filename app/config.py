@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
 import os
 
 class Settings(BaseSettings):
@@ -12,22 +12,91 @@ class Settings(BaseSettings):
     # サーバー設定
     HOST: str = "0.0.0.0"
     PORT: int = 8000
+    WARM_UP_ON_STARTUP: bool = True  # 起動後にバックグラウンドでサービス（埋め込みモデル等）を初期化
     
     # ファイル設定
     UPLOAD_DIR: str = "uploads"
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # アップロードを読み込み・ハッシュ計算・書き込みする単位
     MAX_FILE_SIZE: int = 50 * 1024 * 1024  # 50MB
     ALLOWED_EXTENSIONS: list = [".xlsx", ".pdf"]
+    EXCEL_EXTRACTION_FORMAT: str = "compact"  # "compact"（行単位の見出し: 値）または "legacy"（DataFrame.to_string）
+    
+    # エグゼキューター設定（ブロッキング処理をイベントループ外で実行）
+    CPU_EXECUTOR_WORKERS: int = 2  # テキスト抽出・埋め込み計算用
+    IO_EXECUTOR_WORKERS: int = 8  # ChromaDB・ディスク・Redis用
+    EXTRACTION_USE_PROCESSES: bool = True  # テキスト抽出をプロセスプールで実行
+    EXTRACTION_PROCESS_WORKERS: int = 2
+    EXTRACTION_TIMEOUT_SECONDS: int = 120  # 1ファイルあたりの抽出タイムアウト
+    PDF_PAGES_PER_TASK: int = 20  # 大きなPDFを分割して並列抽出する際の1タスクあたりのページ数
+    EXTRACTION_MAX_INFLIGHT_RANGES: int = 2  # ストリーミング取り込み時に先読みするページ範囲の数
+    INGEST_MICRO_BATCH_SIZE: int = 64  # ストリーミング取り込み時に1回で埋め込み・追加するチャンク数
     
     # データベース設定
-    DATABASE_URL: str = "sqlite:///./skillsheet.db"
+    DATABASE_URL: str = "sqlite:///./skillsheet.db"  # アップロード済みファイルのカタログ（本番環境は PostgreSQL）
+    FILE_LIST_PAGE_SIZE: int = 50  # /files の1ページあたりの件数（既定値）
+    FILE_LIST_MAX_PAGE_SIZE: int = 500  # /files の1ページあたりの件数の上限
     
     # RAG設定
     CHROMA_PERSIST_DIR: str = "./chroma_db"
+    VECTOR_STORE: str = "chroma"  # "chroma"（ChromaDB）または "flat"（メモリマップした埋め込み行列で厳密検索）
+    FLAT_VECTOR_STORE_DIR: str = "./chroma_db/flat"  # flat: 埋め込み行列と行メタデータの保存先
+    FLAT_VECTOR_DTYPE: str = "float16"  # flat: 保存形式 "float16" または "int8"（作成後は変更不可）
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBEDDING_BACKEND: str = "local"  # "local"（SentenceTransformer）・"onnx"・"onnx_int8"（ONNX Runtime）・"server"（埋め込みサーバーを共有）
+    ONNX_MODEL_DIR: str = "./models/onnx"  # onnx・onnx_int8: 書き出したモデルの保存先（未作成の場合は初回起動時に書き出す）
+    ONNX_NUM_THREADS: int = 0  # onnx・onnx_int8: ONNX Runtime のスレッド数（0 の場合は既定値）
+    CHUNK_STRATEGY: str = "token"  # "token"（モデルのトークン数で分割）または "character"（文字数で分割）
+    CHUNK_MAX_TOKENS: int = 256  # token: 1チャンクの最大トークン数（モデルの最大系列長を超える分は切り詰め）
+    CHUNK_OVERLAP_TOKENS: int = 32  # token: 前のチャンクと重ねるトークン数
+    CHUNK_SIZE: int = 1000  # character: 1チャンクの文字数
+    CHUNK_OVERLAP: int = 200  # character: 前のチャンクと重ねる文字数
+    EMBEDDING_BATCH_SIZE: int = 256  # 埋め込み計算・コレクション追加の1バッチあたりのチャンク数
+    BATCH_EXTRACT_CONCURRENCY: int = 4  # 一括アップロード時のテキスト抽出並列数
+    MAX_BATCH_FILES: int = 500  # 一括アップロードの最大ファイル数
+    EMBEDDING_STORE_PATH: str = "./chroma_db/embedding_store.sqlite3"  # チャンク本文ハッシュ → 埋め込みの永続ストア
+    DOCUMENT_CATALOG_PATH: str = "./chroma_db/document_catalog.sqlite3"  # ファイル別の統計情報（コレクション情報用）
+    COLLECTION_VERSION_PATH: str = "./chroma_db/collection_version.sqlite3"  # コレクションのバージョン番号（プロセス間で共有）
+    LEXICAL_INDEX_PATH: str = "./chroma_db/lexical_index.sqlite3"  # チャンク本文の転置インデックス（語彙検索用）
+    
+    # 検索設定
+    SEARCH_MODE: str = "vector"  # 既定の検索モード: "vector"・"lexical"・"hybrid"（リクエストの mode で切り替え）
+    HYBRID_CANDIDATE_MULTIPLIER: int = 3  # hybrid: 各検索で取得する候補数（n_results の倍数）
+    HYBRID_RRF_K: int = 60  # hybrid: Reciprocal Rank Fusion の定数 k
+    SEARCH_OVERFETCH_MULTIPLIER: int = 4  # group_by・MMR 使用時に取得する候補数（n_results の倍数）
+    MMR_LAMBDA: float = 0.7  # MMR: 1.0 に近いほど関連度、0.0 に近いほど多様性を重視
+    MAX_BATCH_QUERIES: int = 100  # 一括検索の最大クエリ数
+    
+    # 埋め込みサーバー設定（EMBEDDING_BACKEND=server の場合、python -m app.embedding_server で起動）
+    EMBEDDING_SERVER_SOCKET: str = "/tmp/skillsheet-embedding.sock"
+    EMBEDDING_SERVER_BACKEND: str = "local"  # サーバーが使うバックエンド: "local"・"onnx"・"onnx_int8"（クライアント側も同じ値にする）
+    EMBEDDING_SERVER_MAX_BATCH: int = 256  # まとめて計算する最大テキスト数
+    EMBEDDING_SERVER_MAX_WAIT_MS: int = 5  # 後続の依頼をまとめるために待つ最大時間
+    EMBEDDING_SERVER_THREADS: int = 0  # torch のスレッド数（0 の場合は既定値）
+    EMBEDDING_SERVER_CONNECT_TIMEOUT_SECONDS: int = 60  # サーバーの起動を待つ時間
+    EMBEDDING_SERVER_TIMEOUT_SECONDS: int = 120  # 接続後、1回の依頼の応答を待つ時間
+    
+    # キャッシュ設定
+    QUERY_EMBEDDING_CACHE_SIZE: int = 1024  # プロセス内で保持するクエリ埋め込みの件数
+    QUERY_EMBEDDING_CACHE_REDIS: bool = False  # Redisで全ワーカー共有のキャッシュを使用
+    QUERY_EMBEDDING_CACHE_TTL_SECONDS: int = 24 * 60 * 60
+    SEARCH_RESULT_CACHE_ENABLED: bool = True  # コレクションのバージョン番号で無効化される検索結果キャッシュ
+    SEARCH_RESULT_CACHE_SIZE: int = 512  # Redisが使えない場合にプロセス内で保持する件数
+    SEARCH_RESULT_CACHE_TTL_SECONDS: int = 24 * 60 * 60  # 正しさには影響しない（Redisの容量管理用）
 
     # Google API設定
     GOOGLE_CREDENTIALS_FILE: str = "credentials.json"
     GOOGLE_TOKEN_FILE: str = "token.json"
+    GOOGLE_INTERACTIVE_AUTH: Optional[bool] = None  # ブラウザでのOAuth認証を行うか（未設定の場合は development のみ）
+    GOOGLE_DRIVE_PAGE_SIZE: int = 1000  # ファイル一覧の1ページあたりの件数（最大1000）
+    GOOGLE_DRIVE_DOWNLOAD_CONCURRENCY: int = 4  # フォルダ同期時の同時ダウンロード数
+    GOOGLE_DRIVE_DOWNLOAD_CHUNK_SIZE: int = 8 * 1024 * 1024  # ダウンロード時に1回で取得・書き込むバイト数
+    GOOGLE_DRIVE_CACHE_TTL_SECONDS: int = 60  # ファイル一覧・名前検索の結果をキャッシュする時間（新しいファイルが反映されるまでの最大遅延）
+    GOOGLE_DRIVE_CACHE_SIZE: int = 256  # キャッシュするファイル一覧・検索結果の件数
+    GOOGLE_DRIVE_FAKE_DIR: Optional[str] = None  # 設定するとローカルディレクトリをGoogle Driveとして使う（テスト・開発用）
+    DRIVE_SYNC_LEDGER_PATH: str = "./chroma_db/drive_sync.sqlite3"  # フォルダ同期済みファイルの記録（差分同期用）
+    GOOGLE_DRIVE_SYNC_FOLDERS: List[str] = []  # 定期同期するフォルダID（JSON配列で指定、Celery beat で実行）
+    GOOGLE_DRIVE_SYNC_INTERVAL_SECONDS: int = 15 * 60  # 定期同期の間隔
+    GOOGLE_DRIVE_SYNC_LOCK_TTL_SECONDS: int = 60 * 60  # 同じフォルダの同期が重ならないよう保持するロックの期限
     
     # OpenAI GPT設定
     OPENAI_API_KEY: Optional[str] = None
@@ -38,6 +107,14 @@ class Settings(BaseSettings):
     # Redis設定
     REDIS_URL: str = "redis://localhost:6379"
     
+    # ジョブキュー設定（Celery）
+    CELERY_BROKER_URL: Optional[str] = None  # 未設定時は REDIS_URL を使用
+    CELERY_RESULT_BACKEND: Optional[str] = None  # 未設定時は REDIS_URL を使用
+    CELERY_TASK_ALWAYS_EAGER: bool = False  # True の場合はワーカーを使わず同期実行（ローカル開発用）
+    INGESTION_QUEUE: str = "ingestion"
+    INGESTION_WORKER_CONCURRENCY: int = 2
+    JOB_TTL_SECONDS: int = 7 * 24 * 60 * 60  # ジョブ状態の保持期間（7日）
+    
     # セキュリティ設定
     SECRET_KEY: str = "your-secret-key-here"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
@@ -0,0 +1,132 @@
+"""埋め込みサーバー
+
+1プロセスで埋め込みモデルを保持し、uvicorn・Celeryの各ワーカーからの依頼を
+Unix ソケットで受け付ける。待ち行列に溜まった依頼は最大 EMBEDDING_SERVER_MAX_BATCH 件まで
+まとめて1回の encode で計算する（動的バッチング）。
+
+起動方法:
+    python -m app.embedding_server
+"""
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+import numpy as np
+
+from .config import settings
+from .services.embedding_backend import FRAME_HEADER, create_embedding_backend
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingServer:
+    """埋め込み計算を動的バッチングで処理するサーバー"""
+
+    def __init__(self):
+        self.socket_path = settings.EMBEDDING_SERVER_SOCKET
+        self.max_batch = settings.EMBEDDING_SERVER_MAX_BATCH
+        self.max_wait = settings.EMBEDDING_SERVER_MAX_WAIT_MS / 1000
+        if settings.EMBEDDING_SERVER_BACKEND == "server":
+            raise ValueError("EMBEDDING_SERVER_BACKEND に server は指定できません")
+        self.backend = create_embedding_backend(settings.EMBEDDING_SERVER_BACKEND)
+        # モデルの計算は1スレッドで順に行い、torch・ONNX Runtime 内部のスレッドで並列化する
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+        self._queue: "asyncio.Queue[Tuple[List[str], asyncio.Future]]" = asyncio.Queue()
+
+    async def serve(self) -> None:
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        os.makedirs(os.path.dirname(self.socket_path) or ".", exist_ok=True)
+
+        server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+        os.chmod(self.socket_path, 0o660)
+        logger.info(f"埋め込みサーバーを起動しました: {self.socket_path}（モデル: {self.backend.model_id}）")
+
+        batcher = asyncio.create_task(self._batch_loop())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    (length,) = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+                    request = json.loads(await reader.readexactly(length))
+                except asyncio.IncompleteReadError:
+                    break
+
+                future = loop.create_future()
+                await self._queue.put((request["texts"], future))
+                try:
+                    vectors = await future
+                    header = {"model": self.backend.model_id, "shape": list(vectors.shape)}
+                    body = vectors.tobytes()
+                except Exception as e:
+                    header = {"error": str(e)}
+                    body = b""
+
+                payload = json.dumps(header).encode("utf-8")
+                writer.write(FRAME_HEADER.pack(len(payload)) + payload + FRAME_HEADER.pack(len(body)) + body)
+                await writer.drain()
+        except Exception as e:
+            logger.error(f"埋め込みサーバー接続エラー: {str(e)}")
+        finally:
+            writer.close()
+
+    async def _batch_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            total = len(batch[0][0])
+
+            # 最初の依頼から max_wait の間に届いた依頼を max_batch 件までまとめる
+            deadline = loop.time() + self.max_wait
+            while total < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0 and self._queue.empty():
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), max(timeout, 0))
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                total += len(item[0])
+
+            texts = [text for request_texts, _ in batch for text in request_texts]
+            try:
+                vectors = await loop.run_in_executor(
+                    self._executor,
+                    lambda: self.backend.encode(texts, batch_size=settings.EMBEDDING_BATCH_SIZE)
+                )
+                vectors = np.asarray(vectors, dtype=np.float32)
+            except Exception as e:
+                logger.error(f"埋め込み計算エラー: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            offset = 0
+            for request_texts, future in batch:
+                if not future.done():
+                    future.set_result(vectors[offset:offset + len(request_texts)])
+                offset += len(request_texts)
+
+
+def main() -> None:
+    if settings.EMBEDDING_SERVER_THREADS > 0:
+        import torch
+        torch.set_num_threads(settings.EMBEDDING_SERVER_THREADS)
+    asyncio.run(EmbeddingServer().serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,29 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Query
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import os
+import asyncio
 from pathlib import Path
+from datetime import datetime
 from typing import List, Optional
 import logging
 
-from .services.file_service import FileService
-from .services.rag_service import RAGService
+from .services.file_service import FileService, StoredFile
+from .services.rag_service import RAGService, SEARCH_MODES, SEARCH_GROUP_BY
+from .services.document_catalog import DocumentCatalog
+from .services.ranking import AGGREGATIONS
 from .services.google_docs_service import GoogleDocsService
 from .services.gpt_service import GPTService
-from .models.skillsheet import SkillsheetResponse, SearchResponse
+from .services.job_service import JobService
+from .services.executor import executor_service
+from .services.service_registry import ServiceRegistry
+from .models.skillsheet import (
+    SkillsheetResponse, SearchResponse, SearchFilters, BatchSearchRequest, BatchSearchResponse,
+    CandidateRankingRequest, CandidateRankingResponse,
+    ProcessingStatus, BatchUploadResponse, IngestionResult, FileListResponse
+)
 from .config import settings
+from .worker import ingest_document, import_google_doc, ingest_batch, sync_google_drive_folder
 
 # ログ設定
 logging.basicConfig(level=logging.INFO)
@@ -33,10 +45,28 @@ app.add_middleware(
 )
 
 # サービス初期化
+# 埋め込みモデルの読み込みや外部サービスへの接続は起動をブロックしないよう、
+# 起動後にバックグラウンドで行う（ウォームアップ前に届いたリクエストは完了を待つ）
 file_service = FileService()
-rag_service = RAGService()
-google_docs_service = GoogleDocsService()
-gpt_service = GPTService()
+services = ServiceRegistry()
+rag_service_provider = services.register("rag", RAGService)
+google_docs_service_provider = services.register("google_docs", GoogleDocsService, required=False)
+gpt_service_provider = services.register("gpt", GPTService)
+job_service_provider = services.register("jobs", JobService)
+document_catalog_provider = services.register("catalog", DocumentCatalog)
+_warm_up_task: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def start_warm_up():
+    """サービスのウォームアップをバックグラウンドで開始"""
+    global _warm_up_task
+    if settings.WARM_UP_ON_STARTUP:
+        _warm_up_task = asyncio.create_task(services.warm_up())
+
+@app.on_event("shutdown")
+async def shutdown_executors():
+    """エグゼキューターを停止"""
+    executor_service.shutdown(wait=False)
 
 @app.get("/")
 async def root():
@@ -45,21 +75,37 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """ヘルスチェック"""
+    """ヘルスチェック（プロセスの生存確認のみ）"""
     return {"status": "healthy", "environment": settings.ENVIRONMENT}
 
+@app.get("/ready")
+async def readiness_check():
+    """レディネスチェック（サービスごとのウォームアップ状況と所要時間）"""
+    status = services.get_status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
 @app.get("/google-auth-status")
 async def google_auth_status():
     """Google認証状態を確認"""
+    try:
+        google_docs_service = await google_docs_service_provider.get()
+    except Exception as e:
+        # Google Docsサービスは任意のため、作成に失敗した場合は未認証として返す
+        logger.error(f"Google Docsサービス初期化エラー: {str(e)}")
+        return {
+            "authenticated": False,
+            "message": "Google認証状態を確認しました"
+        }
     return {
         "authenticated": google_docs_service.is_authenticated(),
         "message": "Google認証状態を確認しました"
     }
 
-@app.post("/upload", response_model=SkillsheetResponse)
+@app.post("/upload", response_model=SkillsheetResponse, status_code=202)
 async def upload_skillsheet(file: UploadFile = File(...)):
     """スキルシートファイルをアップロード"""
     try:
+        job_service = await job_service_provider.get()
         # ファイル形式チェック
         if not file.filename.lower().endswith(('.xlsx', '.pdf')):
             raise HTTPException(
@@ -68,56 +114,187 @@ async def upload_skillsheet(file: UploadFile = File(...)):
             )
         
         # ファイル保存
-        saved_path = await file_service.save_file(file)
+        stored = await file_service.save_file(file)
+        saved_path = stored.path
         
-        # RAGシステムに追加
-        await rag_service.add_document(saved_path, file.filename)
+        # 同じ内容で取り込み済みのファイルは取り込み直さない
+        if await _is_ingested(stored):
+            return SkillsheetResponse(
+                filename=saved_path.name,
+                file_path=str(saved_path),
+                file_size=stored.size,
+                message="同じ内容のファイルが登録済みのため、RAGシステムへの追加は行いません"
+            )
+        
+        # 取り込みジョブをキューに登録（RAGシステムへの追加はワーカーで実行）
+        # 同名ファイルの再アップロードは既存ドキュメントの置き換えとして扱う
+        job = await executor_service.run_io(job_service.create_job, saved_path.name, source="upload")
+        await executor_service.run_io(ingest_document.delay, job.job_id, str(saved_path), saved_path.name)
         
         return SkillsheetResponse(
-            filename=file.filename,
+            filename=saved_path.name,
             file_path=str(saved_path),
-            message="ファイルが正常にアップロードされ、RAGシステムに追加されました"
+            file_size=stored.size,
+            job_id=job.job_id,
+            message="ファイルがアップロードされました。RAGシステムへの追加はバックグラウンドで実行されます"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"ファイルアップロードエラー: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/google-docs/import")
+@app.post("/upload/batch", response_model=BatchUploadResponse, status_code=202)
+async def upload_skillsheets_batch(files: List[UploadFile] = File(...)):
+    """複数のスキルシートファイルを一括アップロード"""
+    try:
+        job_service = await job_service_provider.get()
+        if len(files) > settings.MAX_BATCH_FILES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"一度にアップロードできるファイルは{settings.MAX_BATCH_FILES}件までです"
+            )
+        
+        saved = []
+        unchanged = []
+        rejected = []
+        for file in files:
+            # ファイル形式チェック（対象外のファイルはスキップして結果に含める）
+            if not file.filename or not file.filename.lower().endswith(('.xlsx', '.pdf')):
+                rejected.append(IngestionResult(
+                    filename=file.filename or "unknown_file",
+                    success=False,
+                    message="サポートされているファイル形式は .xlsx と .pdf のみです"
+                ))
+                continue
+            try:
+                stored = await file_service.save_file(file)
+            except HTTPException as e:
+                rejected.append(IngestionResult(filename=file.filename, success=False, message=str(e.detail)))
+                continue
+            if await _is_ingested(stored):
+                unchanged.append(stored)
+            else:
+                saved.append((stored.path, stored.path.name))
+        
+        # 保存できたファイルをまとめて1つの取り込みジョブとして登録
+        job_id = None
+        if saved:
+            job = await executor_service.run_io(
+                job_service.create_job, f"{len(saved)} files", source="upload"
+            )
+            await executor_service.run_io(
+                ingest_batch.delay, job.job_id, [[str(path), filename] for path, filename in saved]
+            )
+            job_id = job.job_id
+        
+        return BatchUploadResponse(
+            job_id=job_id,
+            files=[
+                SkillsheetResponse(filename=filename, file_path=str(path), job_id=job_id, message="アップロードされました")
+                for path, filename in saved
+            ] + [
+                SkillsheetResponse(
+                    filename=stored.path.name,
+                    file_path=str(stored.path),
+                    file_size=stored.size,
+                    message="同じ内容のファイルが登録済みのため、取り込みは行いません"
+                )
+                for stored in unchanged
+            ],
+            rejected=rejected,
+            message=f"{len(saved)} 件のファイルを受け付けました。RAGシステムへの追加はバックグラウンドで実行されます"
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"一括アップロードエラー: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _is_ingested(stored: StoredFile) -> bool:
+    """同じファイル名・同じ内容のファイルが取り込み済みか"""
+    if not stored.unchanged:
+        return False
+    document_catalog = await document_catalog_provider.get()
+    return await executor_service.run_io(document_catalog.contains, stored.path.name)
+
+@app.post("/google-docs/import", response_model=SkillsheetResponse, status_code=202)
 async def import_from_google_docs(file_id: str = Form(...), filename: str = Form(...)):
     """Google Docsからファイルをインポート"""
     try:
+        google_docs_service = await google_docs_service_provider.get()
+        job_service = await job_service_provider.get()
         if not google_docs_service.is_authenticated():
             raise HTTPException(
                 status_code=401,
                 detail="Google認証が必要です。credentials.jsonを設定してください。"
             )
         
-        # Google Driveからファイルをダウンロード
-        temp_file = await google_docs_service.download_file(file_id, filename)
-        if not temp_file:
+        # ダウンロードとRAGシステムへの追加はワーカーで実行
+        job = await executor_service.run_io(job_service.create_job, filename, source="google_drive")
+        await executor_service.run_io(import_google_doc.delay, job.job_id, file_id, filename)
+        
+        return SkillsheetResponse(
+            filename=filename,
+            file_path=f"gdrive://{file_id}",
+            job_id=job.job_id,
+            message="Google Docsからのインポートを受け付けました。RAGシステムへの追加はバックグラウンドで実行されます"
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Google Docsインポートエラー: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/google-docs/sync", response_model=SkillsheetResponse, status_code=202)
+async def sync_google_drive_folder_files(folder_id: str = Form(...), full: bool = Form(False)):
+    """Google Driveフォルダを同期（前回の同期から追加・更新されたファイルの取り込みと、削除されたファイルの削除）
+    
+    full=true の場合は前回の同期結果を使わず、すべてのファイルを取り込み直す。
+    """
+    try:
+        google_docs_service = await google_docs_service_provider.get()
+        job_service = await job_service_provider.get()
+        if not google_docs_service.is_authenticated():
             raise HTTPException(
-                status_code=500,
-                detail="Google Driveからのファイルダウンロードに失敗しました"
+                status_code=401,
+                detail="Google認証が必要です。credentials.jsonを設定してください。"
             )
         
-        # RAGシステムに追加
-        await rag_service.add_document(temp_file, filename)
+        # 一覧の取得・ダウンロード・RAGシステムへの追加はワーカーで実行
+        job = await executor_service.run_io(job_service.create_job, f"folder:{folder_id}", source="google_drive")
+        await executor_service.run_io(sync_google_drive_folder.delay, job.job_id, folder_id, full)
         
         return SkillsheetResponse(
-            filename=filename,
-            file_path=str(temp_file),
-            message="Google Docsからファイルが正常にインポートされ、RAGシステムに追加されました"
+            filename=f"folder:{folder_id}",
+            file_path=f"gdrive://{folder_id}",
+            job_id=job.job_id,
+            message="Google Driveフォルダの同期を受け付けました。RAGシステムへの追加はバックグラウンドで実行されます"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Google Docsインポートエラー: {str(e)}")
+        logger.error(f"Google Driveフォルダ同期エラー: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/jobs/{job_id}", response_model=ProcessingStatus)
+async def get_job_status(job_id: str):
+    """取り込みジョブの処理状況を取得"""
+    job_service = await job_service_provider.get()
+    job = await executor_service.run_io(job_service.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    return job
+
 @app.get("/google-docs/files")
 async def list_google_docs_files(folder_id: Optional[str] = Query(None)):
     """Google Driveのスキルシートファイル一覧を取得"""
     try:
+        google_docs_service = await google_docs_service_provider.get()
         if not google_docs_service.is_authenticated():
             raise HTTPException(
                 status_code=401,
@@ -127,6 +304,8 @@ async def list_google_docs_files(folder_id: Optional[str] = Query(None)):
         files = await google_docs_service.list_skillsheets(folder_id)
         return {"files": files, "message": "Google Driveファイル一覧を取得しました"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Google Driveファイル一覧取得エラー: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -135,6 +314,7 @@ async def list_google_docs_files(folder_id: Optional[str] = Query(None)):
 async def search_google_docs_files(query: str = Query(...)):
     """Google Driveでファイルを検索"""
     try:
+        google_docs_service = await google_docs_service_provider.get()
         if not google_docs_service.is_authenticated():
             raise HTTPException(
                 status_code=401,
@@ -144,54 +324,209 @@ async def search_google_docs_files(query: str = Query(...)):
         files = await google_docs_service.search_files(query)
         return {"files": files, "query": query, "message": "Google Drive検索が完了しました"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Google Drive検索エラー: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/files", response_model=List[SkillsheetResponse])
-async def list_files():
-    """アップロードされたファイル一覧を取得"""
+@app.get("/files", response_model=FileListResponse)
+async def list_files(
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = Query(None),
+    sort: str = Query("upload_date"),  # upload_date / filename / file_size
+    order: str = Query("desc"),  # asc / desc
+    file_type: Optional[str] = Query(None),
+    name: Optional[str] = Query(None),
+    processed: Optional[bool] = Query(None)
+):
+    """アップロードされたファイル一覧を取得（カーソルによるページング）
+    
+    次のページは前のレスポンスの next_cursor を cursor に指定して取得する（sort・order・絞り込み条件は同じものを指定）。
+    """
     try:
-        files = await file_service.list_files()
-        return files
+        files, total, next_cursor = await file_service.list_files(
+            limit, cursor, sort, order, file_type, name, processed
+        )
+        return FileListResponse(files=files, total=total, next_cursor=next_cursor)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"ファイル一覧取得エラー: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/search", response_model=SearchResponse)
-async def search_skillsheets(query: str = Form(...), n_results: int = Query(10)):
+async def search_skillsheets(
+    query: str = Form(...),
+    n_results: int = Query(10),
+    mode: Optional[str] = Query(None, description="検索モード: vector / lexical / hybrid"),
+    filename: Optional[List[str]] = Query(None, description="ファイル名パターン（* ? のワイルドカード可、複数指定可、Google Driveのファイルは表示名と照合）"),
+    source: Optional[str] = Query(None, description="取り込み元: upload / google_drive"),
+    file_type: Optional[str] = Query(None, description="ファイル形式: pdf / xlsx"),
+    ingested_from: Optional[datetime] = Query(None, description="取り込み日時の下限"),
+    ingested_to: Optional[datetime] = Query(None, description="取り込み日時の上限"),
+    group_by: Optional[str] = Query(None, description="結果のまとめ方: file（ファイル単位）"),
+    mmr: bool = Query(False, description="MMRで似た結果が並ばないよう選び直す"),
+    mmr_lambda: Optional[float] = Query(None, ge=0.0, le=1.0, description="MMRの関連度の重み（0.0〜1.0）")
+):
     """スキルシートを検索"""
     try:
-        results = await rag_service.search(query, n_results)
+        rag_service = await rag_service_provider.get()
+        if mode is not None and mode not in SEARCH_MODES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"サポートされていない検索モードです: {mode}（{' / '.join(SEARCH_MODES)}）"
+            )
+        if group_by is not None and group_by not in SEARCH_GROUP_BY:
+            raise HTTPException(
+                status_code=400,
+                detail=f"サポートされていない group_by です: {group_by}（{' / '.join(SEARCH_GROUP_BY)}）"
+            )
+        
+        filters = SearchFilters(
+            filename=filename,
+            source=source,
+            file_type=file_type,
+            ingested_from=ingested_from,
+            ingested_to=ingested_to
+        )
+        results = await rag_service.search(
+            query,
+            n_results,
+            mode,
+            filters,
+            group_by=group_by,
+            mmr=mmr,
+            mmr_lambda=mmr_lambda
+        )
         return SearchResponse(
             query=query,
             results=results,
             total_results=len(results),
             message="検索が完了しました"
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"検索エラー: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/search/batch", response_model=BatchSearchResponse)
+async def search_skillsheets_batch(request: BatchSearchRequest):
+    """複数のクエリでスキルシートを一括検索"""
+    try:
+        rag_service = await rag_service_provider.get()
+        if not request.queries:
+            raise HTTPException(status_code=400, detail="検索クエリが指定されていません")
+        if len(request.queries) > settings.MAX_BATCH_QUERIES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"一度に検索できるクエリは {settings.MAX_BATCH_QUERIES} 件までです"
+            )
+        if request.mode is not None and request.mode not in SEARCH_MODES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"サポートされていない検索モードです: {request.mode}（{' / '.join(SEARCH_MODES)}）"
+            )
+        if request.group_by is not None and request.group_by not in SEARCH_GROUP_BY:
+            raise HTTPException(
+                status_code=400,
+                detail=f"サポートされていない group_by です: {request.group_by}（{' / '.join(SEARCH_GROUP_BY)}）"
+            )
+        
+        results = await rag_service.search_batch(
+            request.queries,
+            request.n_results,
+            request.mode,
+            request.filters,
+            group_by=request.group_by,
+            mmr=request.mmr,
+            mmr_lambda=request.mmr_lambda
+        )
+        return BatchSearchResponse(
+            results=[
+                SearchResponse(
+                    query=query,
+                    results=query_results,
+                    total_results=len(query_results),
+                    message="検索が完了しました"
+                )
+                for query, query_results in zip(request.queries, results)
+            ],
+            total_queries=len(request.queries),
+            message=f"{len(request.queries)} 件のクエリの検索が完了しました"
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"一括検索エラー: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/candidates/rank", response_model=CandidateRankingResponse)
+async def rank_candidates(request: CandidateRankingRequest):
+    """求人票に対してすべてのスキルシートをランキング"""
+    try:
+        rag_service = await rag_service_provider.get()
+        if not request.job_description.strip():
+            raise HTTPException(status_code=400, detail="求人票の本文が指定されていません")
+        if request.aggregation not in AGGREGATIONS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"サポートされていない集約方法です: {request.aggregation}（{' / '.join(AGGREGATIONS)}）"
+            )
+        
+        requirement_chunks, candidates = await rag_service.rank_candidates(
+            request.job_description,
+            request.top_k,
+            request.aggregation,
+            request.filters
+        )
+        return CandidateRankingResponse(
+            candidates=candidates,
+            requirement_chunks=requirement_chunks,
+            total_candidates=len(candidates),
+            message="候補者のランキングが完了しました"
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"候補者ランキングエラー: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/rag/collection-info")
 async def get_rag_collection_info():
     """RAGコレクション情報を取得"""
     try:
+        rag_service = await rag_service_provider.get()
         info = await rag_service.get_collection_info()
         return {"collection_info": info, "message": "コレクション情報を取得しました"}
     except Exception as e:
         logger.error(f"コレクション情報取得エラー: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/rag/cache-stats")
+async def get_rag_cache_stats():
+    """検索キャッシュの統計情報を取得"""
+    rag_service = await rag_service_provider.get()
+    return {
+        "query_embedding": rag_service.query_embedding_cache.get_stats(),
+        "search_result": rag_service.search_result_cache.get_stats(),
+        "message": "キャッシュ統計情報を取得しました"
+    }
+
 @app.post("/rag/clear")
 async def clear_rag_collection():
     """RAGコレクションをクリア"""
     try:
+        rag_service = await rag_service_provider.get()
         success = await rag_service.clear_collection()
         if success:
+            await executor_service.run_io(file_service.file_catalog.reset_processed)
             return {"message": "RAGコレクションがクリアされました"}
         else:
             raise HTTPException(status_code=500, detail="コレクションのクリアに失敗しました")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"コレクションクリアエラー: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -200,9 +535,12 @@ async def clear_rag_collection():
 async def delete_file(filename: str):
     """ファイルを削除"""
     try:
+        rag_service = await rag_service_provider.get()
         await file_service.delete_file(filename)
         await rag_service.remove_document(filename)
         return {"message": f"ファイル {filename} が削除されました"}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"ファイル削除エラー: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -211,6 +549,8 @@ async def delete_file(filename: str):
 async def generate_gpt_answer(query: str = Form(...), n_results: int = Query(5)):
     """GPTを使用して質問に対する回答を生成"""
     try:
+        rag_service = await rag_service_provider.get()
+        gpt_service = await gpt_service_provider.get()
         if not gpt_service.is_available():
             raise HTTPException(
                 status_code=400,
@@ -229,7 +569,7 @@ async def generate_gpt_answer(query: str = Form(...), n_results: int = Query(5))
             }
         
         # GPTで回答を生成
-        answer = await gpt_service.generate_answer(query, search_results)
+        answer = await gpt_service.generate_answer(query, [result.model_dump() for result in search_results])
         
         if not answer:
             raise HTTPException(
@@ -251,6 +591,15 @@ async def generate_gpt_answer(query: str = Form(...), n_results: int = Query(5))
 @app.get("/gpt/status")
 async def get_gpt_status():
     """GPTサービスの状態を確認"""
+    try:
+        gpt_service = await gpt_service_provider.get()
+    except Exception as e:
+        logger.error(f"GPTサービス初期化エラー: {str(e)}")
+        return {
+            "available": False,
+            "model": None,
+            "message": "GPTサービス状態を確認しました"
+        }
     return {
         "available": gpt_service.is_available(),
         "model": gpt_service.model if gpt_service.is_available() else None,
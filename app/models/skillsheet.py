@@ -8,6 +8,23 @@ class SkillsheetResponse(BaseModel):
     file_path: str
     file_size: Optional[int] = None
     upload_date: Optional[datetime] = None
+    job_id: Optional[str] = None
+    message: str
+
+class IngestionResult(BaseModel):
+    """ファイル単位の取り込み結果モデル"""
+    filename: str
+    success: bool
+    chunks: int = 0
+    reused_chunks: int = 0  # 保存済みの埋め込みを再利用したチャンク数
+    reuse_ratio: float = 0.0
+    message: Optional[str] = None
+
+class BatchUploadResponse(BaseModel):
+    """一括アップロードレスポンスモデル"""
+    job_id: Optional[str] = None
+    files: List[SkillsheetResponse]
+    rejected: List[IngestionResult] = []
     message: str
 
 class SearchResult(BaseModel):
@@ -15,7 +32,17 @@ class SearchResult(BaseModel):
     filename: str
     content: str
     score: float
+    display_name: Optional[str] = None  # 表示用のファイル名（Google Driveのファイルはキーではなくファイル名）
     metadata: Optional[Dict[str, Any]] = None
+    matched_chunks: Optional[int] = None  # group_by=file の場合にファイル内でヒットしたチャンク数
+
+class SearchFilters(BaseModel):
+    """検索の絞り込み条件モデル"""
+    filename: Optional[List[str]] = None  # ファイル名パターン（* ? のワイルドカード可、Google Driveのファイルは表示名と照合）
+    source: Optional[str] = None  # "upload", "google_drive"
+    file_type: Optional[str] = None  # "pdf", "xlsx"
+    ingested_from: Optional[datetime] = None
+    ingested_to: Optional[datetime] = None
 
 class SearchResponse(BaseModel):
     """検索レスポンスモデル"""
@@ -24,6 +51,44 @@ class SearchResponse(BaseModel):
     total_results: int
     message: str
 
+class BatchSearchRequest(BaseModel):
+    """一括検索リクエストモデル"""
+    queries: List[str]
+    n_results: int = 10
+    mode: Optional[str] = None  # "vector", "lexical", "hybrid"
+    filters: Optional[SearchFilters] = None
+    group_by: Optional[str] = None  # "file"
+    mmr: bool = False
+    mmr_lambda: Optional[float] = None
+
+class BatchSearchResponse(BaseModel):
+    """一括検索レスポンスモデル"""
+    results: List[SearchResponse]
+    total_queries: int
+    message: str
+
+class CandidateRankingRequest(BaseModel):
+    """求人票による候補者ランキングリクエストモデル"""
+    job_description: str
+    top_k: int = 20
+    aggregation: str = "max_mean"  # "max_mean", "max", "mean"
+    filters: Optional[SearchFilters] = None
+
+class CandidateMatch(BaseModel):
+    """候補者（スキルシート）ごとの一致度モデル"""
+    filename: str
+    score: float
+    display_name: Optional[str] = None  # 表示用のファイル名（Google Driveのファイルはキーではなくファイル名）
+    requirement_scores: List[float]  # 求人票の各チャンクについて、スキルシート内で最も近いチャンクとの類似度
+    best_chunk: Optional[str] = None  # 求人票に最も近いチャンクの本文
+
+class CandidateRankingResponse(BaseModel):
+    """候補者ランキングレスポンスモデル"""
+    candidates: List[CandidateMatch]
+    requirement_chunks: int
+    total_candidates: int
+    message: str
+
 class FileInfo(BaseModel):
     """ファイル情報モデル"""
     id: int
@@ -34,11 +99,21 @@ class FileInfo(BaseModel):
     upload_date: datetime
     processed: bool = False
 
+class FileListResponse(BaseModel):
+    """ファイル一覧レスポンスモデル"""
+    files: List[FileInfo]
+    total: int  # 絞り込み条件に一致するファイル数
+    next_cursor: Optional[str] = None  # 次のページを取得する際に cursor に指定する値（最後のページでは None）
+
 class ProcessingStatus(BaseModel):
     """処理状況モデル"""
+    job_id: str
     filename: str
+    source: str = "upload"  # "upload", "google_drive"
     status: str  # "pending", "processing", "completed", "failed"
+    stage: str = "queued"  # "queued", "downloading", "extracting", "chunking", "embedding", "storing", "done"
     progress: float = 0.0
     message: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
     created_at: datetime
     updated_at: datetime
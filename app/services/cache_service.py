@@ -0,0 +1,320 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import redis
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """キャッシュキー用にクエリを正規化（全角/半角・大文字/小文字・空白の揺れを吸収）"""
+    return " ".join(unicodedata.normalize("NFKC", query).lower().split())
+
+
+def _connect_redis(purpose: str) -> Optional[redis.Redis]:
+    try:
+        client = redis.Redis.from_url(settings.REDIS_URL)
+        client.ping()
+        return client
+    except Exception as e:
+        logger.warning(f"Redisに接続できないため、{purpose}はプロセス内のみで保持します: {str(e)}")
+        return None
+
+
+class QueryEmbeddingCache:
+    """検索クエリの埋め込みベクトルキャッシュ
+
+    プロセス内のLRU（件数上限付き）を1段目、Redisを2段目とし、
+    Redisを有効にした場合は全uvicornワーカーで埋め込みを共有する。
+    """
+
+    KEY_PREFIX = "skillsheet:query_embedding:"
+
+    def __init__(self, max_size: Optional[int] = None, use_redis: Optional[bool] = None, model_id: Optional[str] = None):
+        self.max_size = max_size if max_size is not None else settings.QUERY_EMBEDDING_CACHE_SIZE
+        self.ttl = settings.QUERY_EMBEDDING_CACHE_TTL_SECONDS
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+        self.redis = None
+        if settings.QUERY_EMBEDDING_CACHE_REDIS if use_redis is None else use_redis:
+            self.redis = _connect_redis("クエリ埋め込みキャッシュ")
+
+        # モデルを切り替えた場合に古いベクトルを使わないよう、キーにモデル名を含める
+        model_id = model_id or settings.EMBEDDING_MODEL
+        self._namespace = self.KEY_PREFIX + hashlib.sha1(model_id.encode()).hexdigest()[:8] + ":"
+
+    def get_local(self, normalized_query: str) -> Optional[np.ndarray]:
+        """プロセス内キャッシュから取得"""
+        with self._lock:
+            embedding = self._entries.get(normalized_query)
+            if embedding is not None:
+                self._entries.move_to_end(normalized_query)
+                self.hits += 1
+            return embedding
+
+    def get_remote(self, normalized_query: str) -> Optional[np.ndarray]:
+        """Redisから取得（見つかった場合はプロセス内キャッシュにも格納）"""
+        embedding = None
+        if self.redis is not None:
+            try:
+                raw = self.redis.get(self._redis_key(normalized_query))
+                if raw is not None:
+                    embedding = np.frombuffer(raw, dtype=np.float32)
+            except Exception as e:
+                logger.warning(f"クエリ埋め込みキャッシュ取得エラー: {str(e)}")
+
+        with self._lock:
+            if embedding is None:
+                self.misses += 1
+                return None
+            self.redis_hits += 1
+        self._put_local(normalized_query, embedding)
+        return embedding
+
+    def set(self, normalized_query: str, embedding: np.ndarray) -> None:
+        """キャッシュに格納"""
+        embedding = np.asarray(embedding, dtype=np.float32)
+        self._put_local(normalized_query, embedding)
+        if self.redis is not None:
+            try:
+                self.redis.set(self._redis_key(normalized_query), embedding.tobytes(), ex=self.ttl)
+            except Exception as e:
+                logger.warning(f"クエリ埋め込みキャッシュ保存エラー: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """ヒット率などの統計情報を取得"""
+        with self._lock:
+            lookups = self.hits + self.redis_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.redis_hits) / lookups if lookups else 0.0,
+                "redis_enabled": self.redis is not None,
+            }
+
+    def _put_local(self, normalized_query: str, embedding: np.ndarray) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[normalized_query] = embedding
+            self._entries.move_to_end(normalized_query)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _redis_key(self, normalized_query: str) -> str:
+        return self._namespace + hashlib.sha256(normalized_query.encode("utf-8")).hexdigest()
+
+
+class CollectionVersionStore:
+    """コレクションのバージョン番号
+
+    SQLite（WALモード）に保存するため、Redisがなくても同じデータディレクトリを使う
+    APIプロセスとワーカーの間で共有できる。
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        path = Path(db_path or settings.COLLECTION_VERSION_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS versions (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.commit()
+
+    def get(self, name: str = "collection") -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM versions WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def increment(self, name: str = "collection") -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO versions (name, value) VALUES (?, 1)"
+                " ON CONFLICT(name) DO UPDATE SET value = value + 1",
+                (name,)
+            )
+            self._conn.commit()
+
+
+class SearchResultCache:
+    """検索結果キャッシュ（コレクションのバージョン番号で無効化）
+
+    キャッシュした結果には取得時点のコレクションバージョンを記録し、
+    add_document・remove_document・clear_collection でバージョンを進めることで
+    書き込み前の結果を返さないようにする。TTLは容量管理のためだけに使う。
+    Redisに接続できる場合はバージョン番号と結果を全ワーカーで共有する。
+    接続できない場合も、ワーカーでの取り込みを反映できるようバージョン番号は
+    CollectionVersionStore で共有し、結果のみプロセス内に保持する。
+    """
+
+    VERSION_KEY = "skillsheet:collection_version"
+    KEY_PREFIX = "skillsheet:search_result:"
+
+    def __init__(self, max_size: Optional[int] = None):
+        self.enabled = settings.SEARCH_RESULT_CACHE_ENABLED
+        self.max_size = max_size if max_size is not None else settings.SEARCH_RESULT_CACHE_SIZE
+        self.ttl = settings.SEARCH_RESULT_CACHE_TTL_SECONDS
+        self._entries: "OrderedDict[str, Tuple[int, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.redis = _connect_redis("検索結果キャッシュ") if self.enabled else None
+        # Redisに接続できないプロセスがあっても無効化が伝わるよう、常に更新する
+        self.version_store = CollectionVersionStore()
+
+    def get(self, params: Dict[str, Any]) -> Tuple[int, Optional[List[Dict[str, Any]]]]:
+        """現在のコレクションバージョンとキャッシュ済みの結果を取得"""
+        if not self.enabled:
+            return -1, None
+        key = self._key(params)
+        if self.redis is not None:
+            try:
+                # バージョンと結果を1往復で取得
+                raw_version, raw_entry = self.redis.mget(self.VERSION_KEY, key)
+                version = int(raw_version or 0)
+                entry = json.loads(raw_entry) if raw_entry is not None else None
+                results = entry["results"] if entry and entry["version"] == version else None
+            except Exception as e:
+                logger.warning(f"検索結果キャッシュ取得エラー: {str(e)}")
+                return -1, None
+        else:
+            try:
+                version = self.version_store.get()
+            except Exception as e:
+                logger.warning(f"コレクションバージョン取得エラー: {str(e)}")
+                return -1, None
+            with self._lock:
+                cached = self._entries.get(key)
+                results = cached[1] if cached and cached[0] == version else None
+                if results is not None:
+                    self._entries.move_to_end(key)
+
+        with self._lock:
+            if results is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return version, results
+
+    def set(self, params: Dict[str, Any], version: int, results: List[Dict[str, Any]]) -> None:
+        """検索前に取得したバージョンとともに結果を格納"""
+        if version < 0:
+            return
+        key = self._key(params)
+        if self.redis is not None:
+            try:
+                self.redis.set(key, json.dumps({"version": version, "results": results}, ensure_ascii=False), ex=self.ttl)
+            except Exception as e:
+                logger.warning(f"検索結果キャッシュ保存エラー: {str(e)}")
+            return
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (version, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def bump_version(self) -> None:
+        """コレクションへの書き込み後にバージョンを進め、既存のキャッシュを無効化"""
+        with self._lock:
+            self._entries.clear()
+        try:
+            self.version_store.increment()
+        except Exception as e:
+            logger.error(f"コレクションバージョン更新エラー: {str(e)}")
+        if self.redis is not None:
+            try:
+                self.redis.incr(self.VERSION_KEY)
+            except Exception as e:
+                logger.error(f"コレクションバージョン更新エラー: {str(e)}")
+
+    def current_version(self) -> int:
+        """現在のコレクションバージョンを取得（Redisに接続できない場合は CollectionVersionStore の値）"""
+        if self.redis is not None:
+            try:
+                return int(self.redis.get(self.VERSION_KEY) or 0)
+            except Exception as e:
+                logger.warning(f"コレクションバージョン取得エラー: {str(e)}")
+        return self.version_store.get()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """ヒット率などの統計情報を取得"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "local_size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "redis_enabled": self.redis is not None,
+            }
+
+    def _key(self, params: Dict[str, Any]) -> str:
+        serialized = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+        return self.KEY_PREFIX + hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+class AsyncTTLCache:
+    """有効期限付きのプロセス内キャッシュ（イベントループ用）
+
+    期限切れ・未取得のキーに同時に届いたリクエストは、1回の取得処理の完了をまとめて待つ。
+    取得処理が例外を送出した場合はキャッシュせず、待っていた全リクエストに同じ例外を返す。
+    同じイベントループからのみ使う（ロックは不要）。
+    """
+
+    def __init__(self, ttl_seconds: float, max_size: int):
+        self.ttl = ttl_seconds
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """キャッシュ済みの値、または loader で取得した値を返す"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            return entry[1]
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(key, loader))
+            self._inflight[key] = future
+        # 待っているリクエストがキャンセルされても取得処理は続ける
+        return await asyncio.shield(future)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await loader()
+            if self.max_size > 0 and self.ttl > 0:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def invalidate(self) -> None:
+        """すべてのキャッシュを破棄"""
+        self._entries.clear()
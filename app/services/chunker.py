@@ -0,0 +1,287 @@
+import logging
+import re
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from transformers import AutoTokenizer
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# チャンク境界として優先する位置（改行＝Excelの行・PDFの行、および文末の句読点）
+_SENTENCE_BOUNDARY = re.compile(r"\n|[。．！？!?]")
+# 1文がチャンクに収まらない場合に次に優先する位置（読点・カンマ・空白）
+_CLAUSE_BOUNDARY = re.compile(r"[、，,;；]\s*|\s+")
+
+
+@lru_cache(maxsize=4)
+def get_tokenizer(model_name: str):
+    """埋め込みモデルと同じトークナイザーを取得（プロセス内で1度だけ読み込む）"""
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    logger.info(f"トークナイザー '{model_name}' を読み込みました")
+    return tokenizer
+
+
+class BaseChunker(ABC):
+    """チャンク分割の基底クラス
+
+    feed() で受け取ったテキストから確定したチャンクを逐次返し、finish() で残りを返す。
+    テキストをどのように分けて feed() しても、split() と同じチャンクになる。
+    1ドキュメントごとに新しいインスタンスを使う。
+    """
+
+    @abstractmethod
+    def feed(self, text: str) -> List[str]:
+        """テキストを追加し、確定したチャンクを返す"""
+
+    @abstractmethod
+    def finish(self) -> List[str]:
+        """残りのテキストのチャンクを返す"""
+
+    def split(self, text: str) -> List[str]:
+        """テキスト全体をチャンクに分割"""
+        return self.feed(text) + self.finish()
+
+
+class CharacterChunker(BaseChunker):
+    """文字数でチャンクに分割
+
+    chunk_size 文字の位置から次の区切り（空白・改行・句読点）まで延ばして切り、
+    次のチャンクは overlap 文字戻った位置から始める。区切りの探索は
+    max_lookahead 文字までとし、区切りのない日本語の長文でも線形時間で終わる。
+    """
+
+    BOUNDARY_CHARS = frozenset(" \n\t。、．，！？!?")
+
+    def __init__(self, chunk_size: int = 1000, overlap: int = 200, max_lookahead: Optional[int] = None):
+        self.chunk_size = chunk_size
+        self.overlap = min(overlap, chunk_size - 1)
+        self.max_lookahead = max_lookahead if max_lookahead is not None else max(1, chunk_size // 10)
+        self._buffer = ""
+        self._offset = 0  # バッファ先頭の全体テキスト上の位置
+        self._start = 0  # 次のチャンクの開始位置
+
+    def feed(self, text: str) -> List[str]:
+        self._buffer += text
+        return self._drain(final=False)
+
+    def finish(self) -> List[str]:
+        return self._drain(final=True)
+
+    def _drain(self, final: bool) -> List[str]:
+        chunks = []
+        while True:
+            length = self._offset + len(self._buffer)
+            if self._start >= length:
+                break
+
+            end = self._start + self.chunk_size
+            limit = end + self.max_lookahead
+            if limit > length and not final:
+                # 後続のテキスト次第で境界が変わるため待つ
+                break
+            if end < length:
+                # 次の区切りを探す（max_lookahead 文字まで）
+                while end < min(limit, length) and self._buffer[end - self._offset] not in self.BOUNDARY_CHARS:
+                    end += 1
+            else:
+                end = length
+
+            chunk = self._buffer[self._start - self._offset:end - self._offset].strip()
+            if chunk:
+                chunks.append(chunk)
+            # 途中までのテキストでは、区切りの探索が末尾で終わっても続きがある
+            if end >= length and final:
+                self._start = length
+                break
+
+            # オーバーラップを考慮して次の開始位置を設定
+            self._start = end - self.overlap
+            # 不要になった先頭部分は、バッファの半分を超えた時点でまとめて捨てる（償却線形時間）
+            if self._start - self._offset > len(self._buffer) // 2:
+                self._buffer = self._buffer[self._start - self._offset:]
+                self._offset = self._start
+        return chunks
+
+
+class TokenChunker(BaseChunker):
+    """埋め込みモデルのトークン数でチャンクに分割
+
+    テキストを文（改行・文末の句読点）単位に区切り、max_tokens に収まるだけ
+    詰めてチャンクにする。次のチャンクには直前のチャンク末尾の文を
+    overlap_tokens まで重ねる。1文が max_tokens を超える場合は読点・空白で、
+    それでも収まらない場合はトークン位置で分割する。各文字は一定回数しか
+    走査しないため、文書長に対して線形時間で処理できる。
+
+    文の区切りがないまま max_pending_chars 文字溜まった場合は、split() でも同じ位置で
+    切れる箇所（文が max_tokens を超えることが確定した後の読点・空白、それもなければ
+    トークナイザーが返すトークン位置）までを先に確定し、残りは同じ文の続きとして扱う。
+    """
+
+    def __init__(self, tokenizer, max_tokens: int = 254, overlap_tokens: int = 32):
+        self.tokenizer = tokenizer
+        self.max_tokens = max(1, max_tokens)
+        self.overlap_tokens = min(overlap_tokens, self.max_tokens // 2)
+        # 文の区切りが見つからないまま溜まり続けないようにする上限（文字数）
+        self.max_pending_chars = self.max_tokens * 8
+        self._pending = ""
+        # _pending の先頭が、max_tokens を超えて途中まで確定した文の続きか
+        self._continued = False
+        self._current: List[Tuple[str, int]] = []
+        self._current_tokens = 0
+
+    def feed(self, text: str) -> List[str]:
+        scan_from = len(self._pending)
+        self._pending += text
+
+        # 新しく追加された部分から最後の文の区切りを探す
+        units = []
+        cut = -1
+        for match in _SENTENCE_BOUNDARY.finditer(self._pending, scan_from):
+            cut = match.end()
+        if cut >= 0:
+            complete, self._pending = self._pending[:cut], self._pending[cut:]
+            units = self._split_units(complete)
+        if len(self._pending) >= self.max_pending_chars:
+            units.extend(self._split_pending_prefix())
+        return self._pack(units)
+
+    def finish(self) -> List[str]:
+        chunks = self._pack(self._split_units(self._pending))
+        self._pending = ""
+        self._continued = False
+        if self._current:
+            chunk = "".join(unit for unit, _ in self._current).strip()
+            if chunk:
+                chunks.append(chunk)
+        self._current = []
+        self._current_tokens = 0
+        return chunks
+
+    def _count_tokens(self, units: List[str]) -> List[int]:
+        if not units:
+            return []
+        encoded = self.tokenizer(units, add_special_tokens=False)["input_ids"]
+        return [len(ids) for ids in encoded]
+
+    def _offsets(self, text: str) -> List[Tuple[int, int]]:
+        return self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+
+    def _split_units(self, text: str) -> List[Tuple[str, int]]:
+        """テキストを (文, トークン数) に分割（長すぎる文はさらに分割）"""
+        if not text:
+            return []
+        sentences = []
+        start = 0
+        for match in _SENTENCE_BOUNDARY.finditer(text):
+            sentences.append(text[start:match.end()])
+            start = match.end()
+        if start < len(text):
+            sentences.append(text[start:])
+
+        # 途中まで確定した文の続きは、長さによらず確定済みの部分と同じく読点・空白で分割
+        continued, self._continued = self._continued, False
+        units = []
+        for index, (sentence, tokens) in enumerate(zip(sentences, self._count_tokens(sentences))):
+            if tokens <= self.max_tokens and not (continued and index == 0):
+                units.append((sentence, tokens))
+            else:
+                units.extend(self._split_long_sentence(sentence))
+        return units
+
+    def _split_pending_prefix(self) -> List[Tuple[str, int]]:
+        """区切りのないまま溜まった文の先頭のうち、文全体を分割した場合と同じ位置で切れる部分を分割"""
+        pending = self._pending
+        if not self._continued and self._count_tokens([pending])[0] <= self.max_tokens:
+            # まだ1文として収まる可能性があるため、続きを待つ
+            return []
+
+        # 末尾に接した区切りは後続の空白で延びる可能性があるため使わない
+        cut = 0
+        for match in _CLAUSE_BOUNDARY.finditer(pending):
+            if match.end() < len(pending):
+                cut = match.end()
+        if cut:
+            units = self._split_long_sentence(pending[:cut])
+        else:
+            # 区切りもない場合はトークン位置で切る（末尾の窓は後続の文字で変わり得るため残す）
+            offsets = self._offsets(pending)
+            windows = len(offsets) // self.max_tokens - 1
+            if windows <= 0:
+                return []
+            cut = offsets[windows * self.max_tokens - 1][1]
+            units = self._split_by_tokens(pending[:cut])
+        self._pending = pending[cut:]
+        self._continued = True
+        return units
+
+    def _split_long_sentence(self, sentence: str) -> List[Tuple[str, int]]:
+        clauses = []
+        start = 0
+        for match in _CLAUSE_BOUNDARY.finditer(sentence):
+            clauses.append(sentence[start:match.end()])
+            start = match.end()
+        if start < len(sentence):
+            clauses.append(sentence[start:])
+
+        units = []
+        for clause, tokens in zip(clauses, self._count_tokens(clauses)):
+            if tokens <= self.max_tokens:
+                units.append((clause, tokens))
+            else:
+                units.extend(self._split_by_tokens(clause))
+        return units
+
+    def _split_by_tokens(self, text: str) -> List[Tuple[str, int]]:
+        """区切りのない長いテキストをトークン位置で分割"""
+        offsets = self._offsets(text)
+        pieces = []
+        char_start = 0
+        for token_start in range(0, len(offsets), self.max_tokens):
+            window = offsets[token_start:token_start + self.max_tokens]
+            char_end = window[-1][1] if token_start + self.max_tokens < len(offsets) else len(text)
+            pieces.append((text[char_start:char_end], len(window)))
+            char_start = char_end
+        return pieces
+
+    def _pack(self, units: List[Tuple[str, int]]) -> List[str]:
+        """文を max_tokens に収まるだけ詰めてチャンクにする"""
+        chunks = []
+        for unit, tokens in units:
+            if self._current and self._current_tokens + tokens > self.max_tokens:
+                chunk = "".join(text for text, _ in self._current).strip()
+                if chunk:
+                    chunks.append(chunk)
+
+                # 末尾の文を overlap_tokens まで次のチャンクに引き継ぐ
+                carried: List[Tuple[str, int]] = []
+                carried_tokens = 0
+                for previous in reversed(self._current):
+                    if carried_tokens + previous[1] > self.overlap_tokens:
+                        break
+                    carried.insert(0, previous)
+                    carried_tokens += previous[1]
+                if carried_tokens + tokens > self.max_tokens:
+                    carried, carried_tokens = [], 0
+                self._current = carried
+                self._current_tokens = carried_tokens
+
+            self._current.append((unit, tokens))
+            self._current_tokens += tokens
+        return chunks
+
+
+def create_chunker(strategy: Optional[str] = None) -> BaseChunker:
+    """設定に応じたチャンク分割器を作成"""
+    strategy = strategy or settings.CHUNK_STRATEGY
+    if strategy == "character":
+        return CharacterChunker(settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+    if strategy == "token":
+        tokenizer = get_tokenizer(settings.EMBEDDING_MODEL)
+        # [CLS]・[SEP] の分を差し引き、モデルの最大系列長で切り捨てられないようにする
+        model_limit = getattr(tokenizer, "model_max_length", settings.CHUNK_MAX_TOKENS)
+        max_tokens = min(settings.CHUNK_MAX_TOKENS, model_limit) - 2
+        return TokenChunker(tokenizer, max_tokens, settings.CHUNK_OVERLAP_TOKENS)
+    raise ValueError(f"サポートされていないチャンク分割方式: {strategy}")
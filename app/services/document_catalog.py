@@ -0,0 +1,172 @@
+import fnmatch
+import json
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentCatalog:
+    """RAGコレクションに登録済みのファイル単位の統計情報
+
+    チャンク数・合計文字数・取り込み日時・取り込み元・表示名をファイルごとに1行で保持し、
+    取り込み・削除・クリアのたびに更新する。コレクション情報の取得はこのカタログのみで
+    応答し、ベクトルインデックスには問い合わせない。
+    generation は検索対象とするチャンクの世代で、再取り込みでは新しい世代のチャンクを
+    書き終えてからこの列を切り替える（それまでは置き換え前の世代が検索される）。
+    display_name はキーと異なる表示名（Google Driveのファイル名）で、キーと同じ場合は NULL とする。
+    SQLite（WALモード）に保存するため、APIプロセスとワーカーの間で共有できる。
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = Path(db_path or settings.DOCUMENT_CATALOG_PATH)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " filename TEXT PRIMARY KEY,"
+            " chunks INTEGER NOT NULL,"
+            " total_size INTEGER NOT NULL,"
+            " source TEXT NOT NULL,"
+            " file_path TEXT,"
+            " ingested_at TEXT NOT NULL,"
+            " generation TEXT,"
+            " display_name TEXT)"
+        )
+        # 以前のカタログには後から追加した列を追加（既存の行は世代なしのチャンク・表示名なしに対応）
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(documents)")}
+        for column in ("generation", "display_name"):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE documents ADD COLUMN {column} TEXT")
+        self._conn.commit()
+
+    def upsert(
+        self,
+        filename: str,
+        chunks: int,
+        total_size: int,
+        source: str,
+        file_path: Optional[str] = None,
+        ingested_at: Optional[datetime] = None,
+        generation: Optional[str] = None,
+        display_name: Optional[str] = None
+    ) -> None:
+        """ファイルの統計情報を登録（同じファイル名の場合は置き換え）"""
+        ingested_at = ingested_at or datetime.now()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents"
+                " (filename, chunks, total_size, source, file_path, ingested_at, generation, display_name)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (filename, chunks, total_size, source, file_path, ingested_at.isoformat(), generation, display_name)
+            )
+            self._conn.commit()
+
+    def remove(self, filenames: Iterable[str]) -> None:
+        """ファイルの統計情報を削除"""
+        with self._lock:
+            self._conn.executemany("DELETE FROM documents WHERE filename = ?", [(name,) for name in filenames])
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """すべての統計情報を削除"""
+        with self._lock:
+            self._conn.execute("DELETE FROM documents")
+            self._conn.commit()
+
+    def contains(self, filename: str) -> bool:
+        """ファイルが取り込み済みか"""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM documents WHERE filename = ?", (filename,)).fetchone() is not None
+
+    def get_source(self, filename: str) -> Optional[str]:
+        """ファイルの取り込み元（登録されていない場合は None）"""
+        with self._lock:
+            row = self._conn.execute("SELECT source FROM documents WHERE filename = ?", (filename,)).fetchone()
+        return row[0] if row else None
+
+    def get_generations(self, filenames: Optional[Iterable[str]] = None) -> Dict[str, Optional[str]]:
+        """ファイル名 → 検索対象の世代（filenames 省略時はすべてのファイル、登録されていないファイルは含まない）"""
+        sql = "SELECT filename, generation FROM documents"
+        params: List[Any] = []
+        if filenames is not None:
+            # バインド変数の上限を避けるため、ファイル名の一覧はJSON配列として渡す
+            sql += " WHERE filename IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(list(filenames), ensure_ascii=False))
+        with self._lock:
+            return dict(self._conn.execute(sql, params).fetchall())
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM documents LIMIT 1").fetchone() is None
+
+    def find_filenames(
+        self,
+        patterns: Optional[List[str]] = None,
+        source: Optional[str] = None,
+        file_type: Optional[str] = None,
+        ingested_from: Optional[datetime] = None,
+        ingested_to: Optional[datetime] = None
+    ) -> List[str]:
+        """条件に一致するファイル名を取得
+
+        patterns は * ? のワイルドカードを含むファイル名で、表示名のあるファイル（Google Driveのファイル）は
+        キーではなく表示名と照合する。
+        """
+        conditions = []
+        params: List[Any] = []
+        if source:
+            conditions.append("source = ?")
+            params.append(source)
+        if file_type:
+            # Google Driveのファイルはキーに拡張子がないため、保存先のパスで判定
+            conditions.append("lower(coalesce(file_path, filename)) LIKE ?")
+            params.append("%." + file_type.lower().lstrip("."))
+        # 取り込み日時はローカル時刻のISO形式で保存しているため、同じ形式に揃えて比較
+        if ingested_from:
+            conditions.append("ingested_at >= ?")
+            params.append(datetime.fromtimestamp(int(ingested_from.timestamp())).isoformat())
+        if ingested_to:
+            conditions.append("ingested_at < ?")
+            params.append(datetime.fromtimestamp(int(ingested_to.timestamp()) + 1).isoformat())
+        sql = "SELECT filename, coalesce(display_name, filename) FROM documents"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        return [
+            filename for filename, name in rows
+            if not patterns or any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+        ]
+
+    def get_summary(self) -> Dict[str, Any]:
+        """コレクション全体とファイル別の統計情報を取得"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT filename, chunks, total_size, source, ingested_at, display_name FROM documents ORDER BY filename"
+            ).fetchall()
+
+        file_stats = {
+            filename: {
+                "chunks": chunks,
+                "total_size": total_size,
+                "source": source,
+                "ingested_at": ingested_at,
+                "display_name": display_name or filename,
+            }
+            for filename, chunks, total_size, source, ingested_at, display_name in rows
+        }
+        return {
+            "total_documents": sum(stats["chunks"] for stats in file_stats.values()),
+            "files": len(file_stats),
+            "file_statistics": file_stats,
+        }
@@ -0,0 +1,163 @@
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def plan_sync(
+    entries: Dict[str, Dict[str, Any]],
+    files: List[Dict[str, Any]]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """前回の同期結果と現在のファイル一覧を比較し、(追加・更新されたファイル, 削除されたファイルの記録) を返す
+
+    md5Checksum がある通常ファイルは内容のハッシュで、Google Docs など md5Checksum がない
+    ファイルは modifiedTime で更新を判定する。名前が変わったファイルも更新として扱う。
+    """
+    changed = []
+    for file in files:
+        entry = entries.get(file["id"])
+        if entry is None or entry["name"] != file["name"]:
+            changed.append(file)
+        elif file.get("md5Checksum") and entry["md5"]:
+            if file["md5Checksum"] != entry["md5"]:
+                changed.append(file)
+        elif file.get("modifiedTime") != entry["modified_time"]:
+            changed.append(file)
+
+    listed = {file["id"] for file in files}
+    deleted = [entry for file_id, entry in entries.items() if file_id not in listed]
+    return changed, deleted
+
+
+class DriveSyncLedger:
+    """Google Driveフォルダの同期済みファイルの記録
+
+    フォルダ内の各ファイルについて、前回取り込んだ時点の modifiedTime・md5Checksum と
+    RAGシステムに登録したドキュメントのキー（gdrive/<フォルダID>/<ファイルID>）を保持する。次回の同期では一覧と比較し、
+    追加・更新されたファイルのみをダウンロード・取り込みし、一覧から消えたファイルは削除する。
+    同じフォルダの同期が重ならないよう、フォルダ単位の期限付きロックも管理する。
+    SQLite（WALモード）に保存するため、APIプロセス・ワーカー・Celery beat の間で共有できる。
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = Path(db_path or settings.DRIVE_SYNC_LEDGER_PATH)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS drive_files ("
+            " folder_id TEXT NOT NULL,"
+            " file_id TEXT NOT NULL,"
+            " name TEXT NOT NULL,"
+            " modified_time TEXT,"
+            " md5 TEXT,"
+            " filename TEXT NOT NULL,"
+            " file_path TEXT,"
+            " synced_at TEXT NOT NULL,"
+            " PRIMARY KEY (folder_id, file_id))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_locks ("
+            " folder_id TEXT PRIMARY KEY,"
+            " owner TEXT NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get_entries(self, folder_id: str) -> Dict[str, Dict[str, Any]]:
+        """フォルダの同期済みファイルの記録（ファイルID → 記録）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT file_id, name, modified_time, md5, filename, file_path, synced_at"
+                " FROM drive_files WHERE folder_id = ?",
+                (folder_id,)
+            ).fetchall()
+        return {
+            row[0]: {
+                "file_id": row[0],
+                "name": row[1],
+                "modified_time": row[2],
+                "md5": row[3],
+                "filename": row[4],
+                "file_path": row[5],
+                "synced_at": row[6],
+            }
+            for row in rows
+        }
+
+    def record(self, folder_id: str, file: Dict[str, Any], filename: str, file_path: Optional[str] = None) -> None:
+        """ファイルの取り込みを記録（同じファイルIDの記録は置き換え）"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO drive_files"
+                " (folder_id, file_id, name, modified_time, md5, filename, file_path, synced_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    folder_id,
+                    file["id"],
+                    file["name"],
+                    file.get("modifiedTime"),
+                    file.get("md5Checksum"),
+                    filename,
+                    file_path,
+                    datetime.now().isoformat(),
+                )
+            )
+            self._conn.commit()
+
+    def remove(self, folder_id: str, file_ids: List[str]) -> None:
+        """ファイルの記録を削除"""
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM drive_files WHERE folder_id = ? AND file_id = ?",
+                [(folder_id, file_id) for file_id in file_ids]
+            )
+            self._conn.commit()
+
+    def clear(self, folder_id: str) -> None:
+        """フォルダのすべての記録を削除（次回は全件を取り込み直す）"""
+        with self._lock:
+            self._conn.execute("DELETE FROM drive_files WHERE folder_id = ?", (folder_id,))
+            self._conn.commit()
+
+    def acquire_lock(self, folder_id: str, ttl_seconds: int) -> Optional[str]:
+        """フォルダの同期ロックを取得（取得できた場合はロックの所有者IDを返す）
+
+        期限切れのロック（異常終了したワーカーのもの）は取得し直せる。
+        """
+        owner = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO sync_locks (folder_id, owner, expires_at) VALUES (?, ?, ?)"
+                " ON CONFLICT(folder_id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at"
+                " WHERE sync_locks.expires_at < ?",
+                (folder_id, owner, now + ttl_seconds, now)
+            )
+            self._conn.commit()
+        return owner if cursor.rowcount else None
+
+    def extend_lock(self, folder_id: str, owner: str, ttl_seconds: int) -> bool:
+        """保持している同期ロックの期限を延長（期限切れで他のワーカーに取得された場合は False）"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE sync_locks SET expires_at = ? WHERE folder_id = ? AND owner = ?",
+                (time.time() + ttl_seconds, folder_id, owner)
+            )
+            self._conn.commit()
+        return cursor.rowcount > 0
+
+    def release_lock(self, folder_id: str, owner: str) -> None:
+        """フォルダの同期ロックを解放"""
+        with self._lock:
+            self._conn.execute("DELETE FROM sync_locks WHERE folder_id = ? AND owner = ?", (folder_id, owner))
+            self._conn.commit()
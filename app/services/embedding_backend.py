@@ -0,0 +1,174 @@
+"""埋め込み計算のバックエンド
+
+- local: プロセス内に SentenceTransformer を読み込む
+- onnx / onnx_int8: ONNX 形式に書き出したモデル（onnx_int8 は重みを int8 に動的量子化）を
+  ONNX Runtime で CPU 推論する
+- server: 埋め込みサーバー（python -m app.embedding_server）に Unix ソケット経由で依頼する
+
+server を使うと uvicorn の全ワーカーとCeleryワーカーが1つのモデルを共有するため、
+メモリ使用量がワーカー数に比例せず、torch のスレッドがCPUを奪い合うこともなくなる。
+"""
+import json
+import logging
+import socket
+import struct
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# フレーム: 4バイト（ビッグエンディアン）の長さ + 本体
+FRAME_HEADER = struct.Struct(">I")
+
+EMBEDDING_BACKENDS = ("local", "onnx", "onnx_int8", "server")
+
+
+def embedding_model_id(backend: Optional[str] = None) -> str:
+    """バックエンドが返すベクトルの識別子
+
+    onnx は local と同じベクトル（誤差は浮動小数点の範囲）を返すためモデル名をそのまま使う。
+    onnx_int8 は量子化でベクトルが変わるため、埋め込みストアやキャッシュを分けられるよう区別する。
+    """
+    backend = backend or settings.EMBEDDING_BACKEND
+    if backend == "server":
+        backend = settings.EMBEDDING_SERVER_BACKEND
+    if backend == "onnx_int8":
+        return f"{settings.EMBEDDING_MODEL}#int8"
+    return settings.EMBEDDING_MODEL
+
+
+def send_frame(sock: socket.socket, payload: bytes) -> None:
+    sock.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+
+
+def recv_frame(sock: socket.socket) -> bytes:
+    (length,) = FRAME_HEADER.unpack(_recv_exactly(sock, FRAME_HEADER.size))
+    return _recv_exactly(sock, length)
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray()
+    while len(buffer) < size:
+        data = sock.recv(size - len(buffer))
+        if not data:
+            raise ConnectionError("埋め込みサーバーとの接続が切断されました")
+        buffer.extend(data)
+    return bytes(buffer)
+
+
+class EmbeddingBackend:
+    """埋め込み計算のインターフェース（SentenceTransformer.encode と同じ呼び出し方）"""
+
+    model_id: str
+
+    def encode(self, sentences: List[str], batch_size: int = 32, convert_to_numpy: bool = True) -> np.ndarray:
+        raise NotImplementedError
+
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+    """プロセス内に読み込んだ SentenceTransformer で埋め込みを計算"""
+
+    def __init__(self, model_name: Optional[str] = None):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name or settings.EMBEDDING_MODEL
+        self.model_id = self.model_name
+        self.model = SentenceTransformer(self.model_name)
+
+    def encode(self, sentences: List[str], batch_size: int = 32, convert_to_numpy: bool = True) -> np.ndarray:
+        return self.model.encode(sentences, batch_size=batch_size, convert_to_numpy=True)
+
+
+class EmbeddingServerUnavailable(ConnectionError):
+    """接続の待ち時間内に埋め込みサーバーに接続できなかった"""
+
+
+class RemoteEmbeddingBackend(EmbeddingBackend):
+    """埋め込みサーバーに Unix ソケット経由で埋め込み計算を依頼
+
+    接続はスレッドごとに保持して再利用する。サーバー側で他のワーカーからの依頼と
+    まとめてバッチ計算されるため、batch_size はサーバーの設定に従う。
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, model_id: Optional[str] = None):
+        self.socket_path = socket_path or settings.EMBEDDING_SERVER_SOCKET
+        self.model_id = model_id or embedding_model_id("server")
+        self.connect_timeout = settings.EMBEDDING_SERVER_CONNECT_TIMEOUT_SECONDS
+        self.timeout = settings.EMBEDDING_SERVER_TIMEOUT_SECONDS
+        self._local = threading.local()
+
+    def encode(self, sentences: List[str], batch_size: int = 32, convert_to_numpy: bool = True) -> np.ndarray:
+        request = json.dumps({"texts": list(sentences)}, ensure_ascii=False).encode("utf-8")
+        try:
+            header, body = self._request(request)
+        except EmbeddingServerUnavailable:
+            # 接続の待ち時間を使い切っているため再試行しない
+            raise
+        except socket.timeout:
+            # 応答が止まったサーバーには再送しない（途中まで読んだ接続は再利用できないため閉じる）
+            self._close()
+            raise
+        except (ConnectionError, OSError):
+            # サーバーの再起動などで切れた接続は、1度だけ張り直して再送する
+            self._close()
+            header, body = self._request(request)
+
+        if "error" in header:
+            raise RuntimeError(f"埋め込みサーバーエラー: {header['error']}")
+        if header["model"] != self.model_id:
+            raise RuntimeError(
+                f"埋め込みサーバーのモデル '{header['model']}' が設定 '{self.model_id}' と一致しません"
+            )
+        return np.frombuffer(body, dtype=np.float32).reshape(header["shape"])
+
+    def _request(self, request: bytes) -> Tuple[Dict[str, Any], bytes]:
+        sock = self._connection()
+        send_frame(sock, request)
+        header = json.loads(recv_frame(sock))
+        body = recv_frame(sock)
+        return header, body
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            return sock
+
+        # サーバーの起動を待つため、接続できるまで一定時間リトライ
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.socket_path)
+                break
+            except OSError as e:
+                sock.close()
+                if time.monotonic() >= deadline:
+                    raise EmbeddingServerUnavailable(f"埋め込みサーバー '{self.socket_path}' に接続できません: {str(e)}")
+                time.sleep(0.5)
+        sock.settimeout(self.timeout)
+        self._local.sock = sock
+        return sock
+
+    def _close(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+
+def create_embedding_backend(backend: Optional[str] = None) -> EmbeddingBackend:
+    """設定に応じた埋め込みバックエンドを作成"""
+    backend = backend or settings.EMBEDDING_BACKEND
+    if backend == "local":
+        return LocalEmbeddingBackend()
+    if backend in ("onnx", "onnx_int8"):
+        from .onnx_embedding import OnnxEmbeddingBackend
+        return OnnxEmbeddingBackend(quantized=backend == "onnx_int8")
+    if backend == "server":
+        return RemoteEmbeddingBackend()
+    raise ValueError(f"サポートされていない埋め込みバックエンド: {backend}")
@@ -0,0 +1,72 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def hash_chunk(text: str) -> str:
+    """チャンク本文のハッシュ値を計算"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """チャンク本文のハッシュ → 埋め込みベクトルの永続ストア
+
+    再アップロード時に本文が変わっていないチャンクの埋め込み計算を省略するために使う。
+    SQLite（WALモード）に保存するため、APIプロセスとワーカーの間で共有できる。
+    """
+
+    def __init__(self, db_path: Optional[str] = None, model_name: Optional[str] = None):
+        self.db_path = Path(db_path or settings.EMBEDDING_STORE_PATH)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name or settings.EMBEDDING_MODEL
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_embeddings ("
+            " model TEXT NOT NULL,"
+            " chunk_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, chunk_hash))"
+        )
+        self._conn.commit()
+
+    def get_many(self, chunk_hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        """保存済みの埋め込みを取得"""
+        unique_hashes = list(dict.fromkeys(chunk_hashes))
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            # SQLiteのバインド変数上限を超えないよう分割して問い合わせ
+            for start in range(0, len(unique_hashes), 500):
+                batch = unique_hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT chunk_hash, vector FROM chunk_embeddings WHERE model = ? AND chunk_hash IN ({placeholders})",
+                    [self.model_name, *batch]
+                ).fetchall()
+                for chunk_hash, vector in rows:
+                    found[chunk_hash] = np.frombuffer(vector, dtype=np.float32)
+        return found
+
+    def put_many(self, items: List[Tuple[str, np.ndarray]]) -> None:
+        """埋め込みを保存"""
+        if not items:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunk_embeddings (model, chunk_hash, vector) VALUES (?, ?, ?)",
+                [
+                    (self.model_name, chunk_hash, np.asarray(vector, dtype=np.float32).tobytes())
+                    for chunk_hash, vector in items
+                ]
+            )
+            self._conn.commit()
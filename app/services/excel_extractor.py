@@ -0,0 +1,112 @@
+"""Excelファイルのテキスト抽出
+
+プロセスプールで実行するため、すべてpickle可能なモジュールレベル関数として定義する。
+"""
+import argparse
+from datetime import date, datetime, time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import pandas as pd
+from openpyxl import load_workbook
+
+
+def extract_compact_segments(file_path: Path) -> List[str]:
+    """Excelファイルから行単位のコンパクトなテキストを抽出
+
+    openpyxl の read-only モードで行を順に読み、シートの最初の空でない行を見出しとして
+    各行を「見出し: 値」の組で出力する。空セル・空行は出力しない。
+    """
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        text_content = []
+        for worksheet in workbook.worksheets:
+            text_content.append(f"Sheet: {worksheet.title}")
+            text_content.extend(_iter_sheet_lines(worksheet.iter_rows(values_only=True)))
+            text_content.append("")
+        return text_content
+    finally:
+        workbook.close()
+
+
+def extract_legacy_segments(file_path: Path) -> List[str]:
+    """pandas の DataFrame.to_string による従来形式でテキストを抽出"""
+    df = pd.read_excel(file_path, sheet_name=None)
+    text_content = []
+
+    for sheet_name, sheet_df in df.items():
+        text_content.append(f"Sheet: {sheet_name}")
+        text_content.append(sheet_df.to_string(index=False))
+        text_content.append("")
+
+    return text_content
+
+
+def compare_formats(file_path: Path) -> Dict[str, Any]:
+    """従来形式とコンパクト形式の抽出結果のサイズを比較"""
+    legacy = "\n".join(extract_legacy_segments(file_path))
+    compact = "\n".join(extract_compact_segments(file_path))
+    legacy_chars = len(legacy)
+    compact_chars = len(compact)
+    return {
+        "filename": Path(file_path).name,
+        "legacy_chars": legacy_chars,
+        "compact_chars": compact_chars,
+        "legacy_bytes": len(legacy.encode("utf-8")),
+        "compact_bytes": len(compact.encode("utf-8")),
+        "reduction_ratio": 1.0 - compact_chars / legacy_chars if legacy_chars else 0.0,
+    }
+
+
+def _iter_sheet_lines(rows: Iterator[tuple]) -> Iterator[str]:
+    headers: Optional[List[str]] = None
+    for row in rows:
+        values = [_format_cell(value) for value in row]
+        if not any(values):
+            continue
+
+        # 最初の空でない行を見出しとして扱う
+        if headers is None:
+            headers = [value or f"列{index + 1}" for index, value in enumerate(values)]
+            yield " | ".join(value for value in values if value)
+            continue
+
+        pairs = []
+        for index, value in enumerate(values):
+            if not value:
+                continue
+            header = headers[index] if index < len(headers) else f"列{index + 1}"
+            pairs.append(f"{header}: {value}")
+        yield " | ".join(pairs)
+
+
+def _format_cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.date().isoformat() if value.time() == time() else value.isoformat(sep=" ")
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    # セル内の改行・連続空白は1つの空白にまとめ、1行1レコードを保つ
+    return " ".join(str(value).split())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Excel抽出形式（従来形式とコンパクト形式）のサイズ比較")
+    parser.add_argument("files", nargs="+", type=Path)
+    args = parser.parse_args()
+
+    total_legacy = 0
+    total_compact = 0
+    for path in args.files:
+        report = compare_formats(path)
+        total_legacy += report["legacy_chars"]
+        total_compact += report["compact_chars"]
+        print(
+            f"{report['filename']}: {report['legacy_chars']} -> {report['compact_chars']} 文字 "
+            f"({report['reduction_ratio']:.1%} 削減)"
+        )
+    if total_legacy:
+        print(f"合計: {total_legacy} -> {total_compact} 文字 ({1.0 - total_compact / total_legacy:.1%} 削減)")
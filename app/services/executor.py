@@ -0,0 +1,160 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ExecutorService:
+    """ブロッキング処理をイベントループ外で実行するためのエグゼキューター管理
+
+    - CPUプール: 埋め込み計算などGILを解放するCPUバウンドな処理
+    - I/Oプール: ChromaDB・ディスク・Redisなどの待ち時間が支配的な処理
+    - プロセスプール: GILを保持し続けるテキスト抽出（PyPDF2・openpyxl）
+
+    プールを分けることで、重い取り込み処理がCPUプールを占有していても
+    検索時のChromaDBクエリやファイル操作が待たされないようにする。
+    """
+
+    def __init__(
+        self,
+        cpu_workers: Optional[int] = None,
+        io_workers: Optional[int] = None,
+        process_workers: Optional[int] = None
+    ):
+        self.cpu_workers = cpu_workers or settings.CPU_EXECUTOR_WORKERS
+        self.io_workers = io_workers or settings.IO_EXECUTOR_WORKERS
+        self.process_workers = process_workers or settings.EXTRACTION_PROCESS_WORKERS
+        self._cpu_executor: Optional[ThreadPoolExecutor] = None
+        self._io_executor: Optional[ThreadPoolExecutor] = None
+        self._process_executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def cpu_executor(self) -> ThreadPoolExecutor:
+        if self._cpu_executor is None:
+            self._cpu_executor = ThreadPoolExecutor(
+                max_workers=self.cpu_workers,
+                thread_name_prefix="cpu-worker"
+            )
+        return self._cpu_executor
+
+    @property
+    def io_executor(self) -> ThreadPoolExecutor:
+        if self._io_executor is None:
+            self._io_executor = ThreadPoolExecutor(
+                max_workers=self.io_workers,
+                thread_name_prefix="io-worker"
+            )
+        return self._io_executor
+
+    @property
+    def processes_available(self) -> bool:
+        """プロセスプールが利用可能か（デーモンプロセス内では子プロセスを作れない）"""
+        return settings.EXTRACTION_USE_PROCESSES and not multiprocessing.current_process().daemon
+
+    @property
+    def process_executor(self) -> ProcessPoolExecutor:
+        if self._process_executor is None:
+            # torch等のスレッドを抱えたプロセスのforkを避けるため spawn で起動
+            self._process_executor = ProcessPoolExecutor(
+                max_workers=self.process_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._process_executor
+
+    async def run_cpu(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """CPUバウンドな処理をCPUプールで実行"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.cpu_executor, functools.partial(func, *args, **kwargs))
+
+    async def run_io(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """I/Oバウンドな処理をI/Oプールで実行"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.io_executor, functools.partial(func, *args, **kwargs))
+
+    async def run_process(self, func: Callable[..., T], *args: Any) -> T:
+        """CPUバウンドな処理をプロセスプールで実行
+
+        プロセスプールが使えない環境ではCPUプール（スレッド）で代替する。
+        func と引数は pickle 可能である必要がある。
+        他の処理のタイムアウトやワーカープロセスの異常終了でプールが壊れた場合は、
+        新しいプールで1度だけやり直す。
+        """
+        if not self.processes_available:
+            return await self.run_cpu(func, *args)
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args)
+        executor = self.process_executor
+        try:
+            return await loop.run_in_executor(executor, call)
+        except BrokenProcessPool:
+            if self._process_executor is executor:
+                # ワーカープロセスが異常終了したプールは使えないため作り直す
+                self._discard_process_pool(executor)
+            logger.warning(f"プロセスプールが壊れたため処理をやり直します: {getattr(func, '__name__', func)}")
+            return await loop.run_in_executor(self.process_executor, call)
+
+    def reset_process_pool(self) -> None:
+        """プロセスプールを強制的に作り直す
+
+        タイムアウトした処理は Future のキャンセルでは止まらないため、
+        ワーカープロセスごと終了させて次回利用時に新しいプールを作成する。
+        同じプールで実行中・待機中だった他の処理は BrokenProcessPool で失敗し、
+        run_process が新しいプールでやり直す。
+        """
+        executor = self._process_executor
+        if executor is None:
+            return
+        self._discard_process_pool(executor)
+        logger.warning("プロセスプールを再作成します（実行中の抽出処理を強制終了しました）")
+
+    def _discard_process_pool(self, executor: ProcessPoolExecutor) -> None:
+        if self._process_executor is executor:
+            self._process_executor = None
+        processes = list((executor._processes or {}).values())
+        # 待機中の処理もキャンセルではなく BrokenProcessPool で失敗させ、呼び出し元でやり直せるようにする
+        executor.shutdown(wait=False, cancel_futures=False)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """プールの設定と稼働状況を取得"""
+        def pool_stats(executor: Optional[ThreadPoolExecutor], max_workers: int) -> Dict[str, Any]:
+            return {
+                "max_workers": max_workers,
+                "threads": len(executor._threads) if executor else 0,
+                "queued": executor._work_queue.qsize() if executor else 0,
+            }
+
+        return {
+            "cpu": pool_stats(self._cpu_executor, self.cpu_workers),
+            "io": pool_stats(self._io_executor, self.io_workers),
+            "process": {
+                "max_workers": self.process_workers,
+                "available": self.processes_available,
+                "processes": len(self._process_executor._processes or {}) if self._process_executor else 0,
+            },
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """プールを停止"""
+        for executor in (self._cpu_executor, self._io_executor, self._process_executor):
+            if executor is not None:
+                executor.shutdown(wait=wait, cancel_futures=True)
+        self._cpu_executor = None
+        self._io_executor = None
+        self._process_executor = None
+        logger.info("エグゼキューターを停止しました")
+
+
+# エグゼキューターインスタンス
+executor_service = ExecutorService()
@@ -0,0 +1,155 @@
+"""ローカルディレクトリを Google Drive に見立てたフェイク
+
+GoogleDocsService が使う Drive v3 API の一部（files().list・get・get_media・export_media と
+MediaIoBaseDownload）を同じ呼び出し方で提供する。Settings.GOOGLE_DRIVE_FAKE_DIR を設定すると
+GoogleDocsService は認証を行わずにこのフェイクを使うため、テストやローカル開発で
+Google アカウントなしにフォルダ同期を試せる。
+
+- ファイルID: ルートからの相対パス
+- フォルダID: ディレクトリの相対パス（ルート直下のファイルの親は "root"）
+- mimeType: 拡張子から決める
+"""
+import hashlib
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+MIME_TYPES = {
+    ".pdf": "application/pdf",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".xls": "application/vnd.ms-excel",
+    ".txt": "text/plain",
+}
+
+
+class FakeRequest:
+    """files().list() などが返すリクエスト（execute() で結果を返す）"""
+
+    def __init__(self, func: Callable[[], Dict[str, Any]]):
+        self._func = func
+
+    def execute(self) -> Dict[str, Any]:
+        return self._func()
+
+
+class FakeMediaRequest:
+    """get_media・export_media が返すダウンロード用リクエスト"""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+
+class FakeDownloadStatus:
+    def __init__(self, progress: float):
+        self._progress = progress
+
+    def progress(self) -> float:
+        return self._progress
+
+
+class FakeMediaDownload:
+    """MediaIoBaseDownload と同じ呼び出し方で、ファイルを chunksize ずつ書き込む"""
+
+    def __init__(self, fd, request: FakeMediaRequest, chunksize: int = 1024 * 1024):
+        self._fd = fd
+        self._path = request.path
+        self._chunksize = chunksize
+        self._offset = 0
+        self._total = request.path.stat().st_size
+
+    def next_chunk(self):
+        with open(self._path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read(self._chunksize)
+        self._fd.write(data)
+        self._offset += len(data)
+        done = self._offset >= self._total
+        return FakeDownloadStatus(1.0 if done else self._offset / self._total), done
+
+
+class FakeDriveService:
+    """ローカルディレクトリを Drive に見立てたサービス（build('drive', 'v3') の代わり）"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def files(self) -> "FakeFiles":
+        return FakeFiles(self)
+
+    def describe(self, path: Path) -> Dict[str, Any]:
+        """ファイルを Drive の files リソースの形式で返す"""
+        relative = path.relative_to(self.root)
+        parent = relative.parent.as_posix()
+        stat = path.stat()
+        with open(path, "rb") as f:
+            md5 = hashlib.md5(f.read()).hexdigest()
+        return {
+            "id": relative.as_posix(),
+            "name": path.name,
+            "mimeType": MIME_TYPES.get(path.suffix.lower(), "application/octet-stream"),
+            "size": str(stat.st_size),
+            "md5Checksum": md5,
+            "modifiedTime": datetime.fromtimestamp(stat.st_mtime, timezone.utc).isoformat().replace("+00:00", "Z"),
+            "parents": ["root" if parent == "." else parent],
+        }
+
+    def resolve(self, file_id: str) -> Path:
+        path = (self.root / file_id).resolve()
+        if self.root.resolve() not in path.parents or not path.is_file():
+            raise FileNotFoundError(f"File not found: {file_id}")
+        return path
+
+
+class FakeFiles:
+    """files() リソース"""
+
+    def __init__(self, service: FakeDriveService):
+        self.service = service
+
+    def list(
+        self,
+        q: Optional[str] = None,
+        pageSize: int = 100,
+        pageToken: Optional[str] = None,
+        fields: Optional[str] = None,
+        **kwargs: Any
+    ) -> FakeRequest:
+        def execute() -> Dict[str, Any]:
+            described = (self.service.describe(path) for path in sorted(self.service.root.rglob("*")) if path.is_file())
+            files = [file for file in described if _matches(file, q)]
+            offset = int(pageToken or 0)
+            result: Dict[str, Any] = {"files": files[offset:offset + pageSize]}
+            if offset + pageSize < len(files):
+                result["nextPageToken"] = str(offset + pageSize)
+            return result
+        return FakeRequest(execute)
+
+    def get(self, fileId: str, fields: Optional[str] = None, **kwargs: Any) -> FakeRequest:
+        return FakeRequest(lambda: self.service.describe(self.service.resolve(fileId)))
+
+    def get_media(self, fileId: str, **kwargs: Any) -> FakeMediaRequest:
+        return FakeMediaRequest(self.service.resolve(fileId))
+
+    def export_media(self, fileId: str, mimeType: str, **kwargs: Any) -> FakeMediaRequest:
+        # 変換は行わず元のファイルをそのまま返す
+        return FakeMediaRequest(self.service.resolve(fileId))
+
+
+def _matches(file: Dict[str, Any], query: Optional[str]) -> bool:
+    """Drive の検索クエリのうち、mimeType・親フォルダ・名前の部分一致・更新日時の条件を評価"""
+    if not query:
+        return True
+    mime_types: List[str] = re.findall(r"mimeType\s*=\s*'([^']+)'", query)
+    if mime_types and file["mimeType"] not in mime_types:
+        return False
+    for parent in re.findall(r"'([^']+)'\s+in\s+parents", query):
+        if parent not in file["parents"]:
+            return False
+    for name in re.findall(r"name\s+contains\s+'((?:[^'\\]|\\.)*)'", query):
+        if name.replace("\\'", "'").lower() not in file["name"].lower():
+            return False
+    for modified_after in re.findall(r"modifiedTime\s*>\s*'([^']+)'", query):
+        if file["modifiedTime"] <= modified_after:
+            return False
+    return True
@@ -0,0 +1,289 @@
+"""アップロード済みファイルのカタログ（SQLAlchemy）
+
+アップロード・削除のたびに1ファイル1行で更新し、ファイル一覧はディレクトリを走査せずに
+データベースへのクエリ（絞り込み・並べ替え・カーソルによるページング）で返す。
+DATABASE_URL のデータベース（開発環境は SQLite、本番環境は PostgreSQL）に保存する。
+
+既存の uploads ディレクトリからの登録（初回のみ）:
+    python -m app.services.file_catalog backfill
+"""
+import argparse
+import base64
+import json
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+from sqlalchemy import BigInteger, Boolean, DateTime, Index, Integer, String, and_, create_engine, delete, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, sessionmaker
+
+from ..config import settings
+from ..models.skillsheet import FileInfo
+
+logger = logging.getLogger(__name__)
+
+# 並べ替えに使える列（カーソルは (列の値, id) の組で次のページの開始位置を表す）
+FILE_SORT_KEYS = ("upload_date", "filename", "file_size")
+FILE_SORT_ORDERS = ("asc", "desc")
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class UploadedFile(Base):
+    """アップロード済みファイル（FileInfo に対応するテーブル）"""
+    __tablename__ = "uploaded_files"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    filename: Mapped[str] = mapped_column(String(512), unique=True, nullable=False)
+    file_path: Mapped[str] = mapped_column(String(1024), nullable=False)
+    file_size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    file_type: Mapped[str] = mapped_column(String(16), nullable=False)
+    sha256: Mapped[Optional[str]] = mapped_column(String(64))
+    upload_date: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    processed: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        Index("ix_uploaded_files_upload_date_id", "upload_date", "id"),
+        Index("ix_uploaded_files_file_size_id", "file_size", "id"),
+        Index("ix_uploaded_files_file_type", "file_type"),
+    )
+
+    def to_model(self) -> FileInfo:
+        return FileInfo(
+            id=self.id,
+            filename=self.filename,
+            file_path=self.file_path,
+            file_size=self.file_size,
+            file_type=self.file_type,
+            upload_date=self.upload_date,
+            processed=self.processed,
+        )
+
+
+def file_type_of(filename: str) -> str:
+    """拡張子からファイル種別（"xlsx"・"pdf" など）を決める"""
+    return Path(filename).suffix.lower().lstrip(".")
+
+
+def encode_cursor(value: Any, row_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, row_id]).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, int]:
+    """カーソルを (列の値, id) に戻す（不正なカーソルは ValueError）"""
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if sort == "upload_date":
+            value = datetime.fromisoformat(value)
+        elif sort == "file_size":
+            value = int(value)
+        elif not isinstance(value, str):
+            raise ValueError(value)
+        return value, int(row_id)
+    except Exception as e:
+        raise ValueError(f"不正なカーソルです: {cursor}") from e
+
+
+class FileCatalog:
+    """アップロード済みファイルのカタログ
+
+    テーブルは初回アクセス時に作成するため、インスタンスの作成時にはデータベースに接続しない。
+    """
+
+    def __init__(self, database_url: Optional[str] = None):
+        url = database_url or settings.DATABASE_URL
+        connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+        self.engine = create_engine(url, pool_pre_ping=True, connect_args=connect_args)
+        self._sessions = sessionmaker(self.engine, expire_on_commit=False)
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _session(self):
+        if not self._schema_ready:
+            with self._schema_lock:
+                if not self._schema_ready:
+                    Base.metadata.create_all(self.engine)
+                    self._schema_ready = True
+        return self._sessions()
+
+    def upsert(
+        self,
+        filename: str,
+        file_path: str,
+        file_size: int,
+        sha256: Optional[str] = None,
+        upload_date: Optional[datetime] = None
+    ) -> FileInfo:
+        """ファイルを登録（同じファイル名の場合は置き換え）
+
+        内容（ハッシュ）が変わった場合のみ取り込み済みフラグを戻す。
+        """
+        upload_date = upload_date or datetime.now()
+        for attempt in range(2):
+            try:
+                with self._session() as session, session.begin():
+                    row = session.scalars(select(UploadedFile).where(UploadedFile.filename == filename)).first()
+                    if row is None:
+                        row = UploadedFile(filename=filename, processed=False)
+                        session.add(row)
+                    elif sha256 is None or row.sha256 != sha256:
+                        row.processed = False
+                    row.file_path = file_path
+                    row.file_size = file_size
+                    row.file_type = file_type_of(filename)
+                    row.sha256 = sha256
+                    row.upload_date = upload_date
+                    session.flush()
+                    return row.to_model()
+            except IntegrityError:
+                # 同じファイル名が同時に登録された場合は更新としてやり直す
+                if attempt:
+                    raise
+
+    def remove(self, filenames: Iterable[str]) -> None:
+        """ファイルの登録を削除"""
+        filenames = list(filenames)
+        if not filenames:
+            return
+        with self._session() as session, session.begin():
+            session.execute(delete(UploadedFile).where(UploadedFile.filename.in_(filenames)))
+
+    def mark_processed(self, filenames: Iterable[str], processed: bool = True) -> None:
+        """RAGシステムへの取り込み済みフラグを更新（登録されていないファイル名は無視）"""
+        filenames = list(filenames)
+        if not filenames:
+            return
+        with self._session() as session, session.begin():
+            session.execute(
+                update(UploadedFile).where(UploadedFile.filename.in_(filenames)).values(processed=processed)
+            )
+
+    def reset_processed(self) -> None:
+        """すべてのファイルを未取り込みに戻す（RAGコレクションのクリア時）"""
+        with self._session() as session, session.begin():
+            session.execute(update(UploadedFile).values(processed=False))
+
+    def list_files(
+        self,
+        limit: int,
+        cursor: Optional[str] = None,
+        sort: str = "upload_date",
+        order: str = "desc",
+        file_type: Optional[str] = None,
+        name: Optional[str] = None,
+        processed: Optional[bool] = None
+    ) -> Tuple[List[FileInfo], int, Optional[str]]:
+        """ファイル一覧の1ページ分を返す（ファイル, 条件に一致する件数, 次のページのカーソル）
+
+        並べ替えは (sort の列, id) の組で行い、カーソル以降の行をインデックスで直接読み出す。
+        """
+        if sort not in FILE_SORT_KEYS:
+            raise ValueError(f"sort は {', '.join(FILE_SORT_KEYS)} のいずれかを指定してください")
+        if order not in FILE_SORT_ORDERS:
+            raise ValueError(f"order は {', '.join(FILE_SORT_ORDERS)} のいずれかを指定してください")
+        column = getattr(UploadedFile, sort)
+
+        conditions = []
+        if file_type:
+            conditions.append(UploadedFile.file_type == file_type.lower().lstrip("."))
+        if name:
+            escaped = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            conditions.append(UploadedFile.filename.ilike(f"%{escaped}%", escape="\\"))
+        if processed is not None:
+            conditions.append(UploadedFile.processed == processed)
+
+        page_conditions = list(conditions)
+        if cursor:
+            value, row_id = decode_cursor(cursor, sort)
+            if order == "asc":
+                page_conditions.append(or_(column > value, and_(column == value, UploadedFile.id > row_id)))
+            else:
+                page_conditions.append(or_(column < value, and_(column == value, UploadedFile.id < row_id)))
+
+        ordering = (column.asc(), UploadedFile.id.asc()) if order == "asc" else (column.desc(), UploadedFile.id.desc())
+        with self._session() as session:
+            total = session.scalar(select(func.count()).select_from(UploadedFile).where(*conditions))
+            rows = session.scalars(
+                select(UploadedFile).where(*page_conditions).order_by(*ordering).limit(limit + 1)
+            ).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(getattr(last, sort), last.id)
+        return [row.to_model() for row in rows], total, next_cursor
+
+    def backfill(
+        self,
+        upload_dir: Path,
+        get_sha256: Optional[Callable[[str], Optional[str]]] = None,
+        is_processed: Optional[Callable[[str], bool]] = None,
+        batch_size: int = 1000
+    ) -> int:
+        """アップロードディレクトリのうち未登録のファイルを登録し、登録した件数を返す"""
+        with self._session() as session:
+            known = set(session.scalars(select(UploadedFile.filename)).all())
+
+        added = 0
+        batch: List[UploadedFile] = []
+        for file_path in upload_dir.iterdir():
+            # .tmp・.blobs などの内部ディレクトリやファイルは対象外
+            if file_path.name.startswith(".") or not file_path.is_file() or file_path.name in known:
+                continue
+            stat = file_path.stat()
+            batch.append(UploadedFile(
+                filename=file_path.name,
+                file_path=str(file_path),
+                file_size=stat.st_size,
+                file_type=file_type_of(file_path.name),
+                sha256=get_sha256(file_path.name) if get_sha256 else None,
+                upload_date=datetime.fromtimestamp(stat.st_mtime),
+                processed=bool(is_processed and is_processed(file_path.name)),
+            ))
+            if len(batch) >= batch_size:
+                added += self._insert(batch)
+                batch = []
+        if batch:
+            added += self._insert(batch)
+        return added
+
+    def _insert(self, rows: List[UploadedFile]) -> int:
+        with self._session() as session, session.begin():
+            session.add_all(rows)
+        return len(rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="アップロード済みファイルのカタログ")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = subparsers.add_parser("backfill", help="アップロードディレクトリの既存ファイルを登録")
+    backfill_parser.add_argument("--upload-dir", default=settings.UPLOAD_DIR)
+    args = parser.parse_args()
+
+    from .document_catalog import DocumentCatalog
+    from .upload_index import UploadIndex
+
+    upload_dir = Path(args.upload_dir)
+    upload_index = UploadIndex(upload_dir / ".blobs" / "index.sqlite3")
+    document_catalog = DocumentCatalog()
+
+    def get_sha256(filename: str) -> Optional[str]:
+        with upload_index.transaction() as index:
+            entry = index.get(filename)
+        return entry[0] if entry else None
+
+    added = FileCatalog().backfill(upload_dir, get_sha256=get_sha256, is_processed=document_catalog.contains)
+    print(f"{added} 件のファイルを登録しました")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -1,87 +1,156 @@
+import asyncio
+import hashlib
 import os
 import shutil
+import uuid
+from collections import deque
 from pathlib import Path
-from typing import List, Optional
+from typing import AsyncIterator, Awaitable, Callable, Deque, List, NamedTuple, Optional, Tuple, TypeVar
 from fastapi import UploadFile, HTTPException
-import pandas as pd
 import PyPDF2
 import logging
-from datetime import datetime
 
 from ..config import settings
-from ..models.skillsheet import SkillsheetResponse
+from ..models.skillsheet import FileInfo
+from .executor import executor_service
+from .excel_extractor import extract_compact_segments, extract_legacy_segments
+from .file_catalog import FileCatalog
+from .upload_index import UploadIndex
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+
+class StoredFile(NamedTuple):
+    """保存したアップロードファイル"""
+    path: Path
+    sha256: str
+    size: int
+    unchanged: bool  # 同じファイル名で同じ内容が保存済みだった
+
+
 class FileService:
     def __init__(self):
         self.upload_dir = Path(settings.UPLOAD_DIR)
         self.upload_dir.mkdir(exist_ok=True)
+        self.temp_dir = self.upload_dir / ".tmp"
+        self.temp_dir.mkdir(exist_ok=True)
+        # 内容のハッシュ名で保存した実体（ファイル名はそのハードリンク）
+        self.blob_dir = self.upload_dir / ".blobs"
+        self.blob_dir.mkdir(exist_ok=True)
+        self.upload_index = UploadIndex(self.blob_dir / "index.sqlite3")
+        self.file_catalog = FileCatalog()
+        
+    async def save_file(self, file: UploadFile) -> StoredFile:
+        """ファイルを保存
+        
+        チャンク単位で読み込みながらハッシュを計算して一時ファイルに書き込み、
+        MAX_FILE_SIZE を超えた時点で中断する。保存後は内容のハッシュ名の blob に移し、
+        ファイル名をそのハードリンクにする（同じ内容の blob があれば一時ファイルは捨てる）。
+        同じファイル名は再アップロードとして既存ファイルを置き換える。
+        """
+        filename = self._get_safe_filename(file.filename)
+        temp_path = self.temp_dir / f"{uuid.uuid4().hex}.part"
+        digest = hashlib.sha256()
+        size = 0
+        
+        def write_chunk(buffer, chunk: bytes) -> None:
+            # ハッシュ計算（GILを解放）と書き込みはI/Oプールで行う
+            digest.update(chunk)
+            buffer.write(chunk)
         
-    async def save_file(self, file: UploadFile) -> Path:
-        """ファイルを保存"""
         try:
-            # ファイルサイズチェック（UploadFileは size を持たない場合があるため手動で計測）
-            file_stream = getattr(file, "file", None)
-            if file_stream and hasattr(file_stream, "seek") and hasattr(file_stream, "tell"):
-                current_pos = file_stream.tell()
-                file_stream.seek(0, os.SEEK_END)
-                size_bytes = file_stream.tell()
-                file_stream.seek(current_pos)
-                if size_bytes > settings.MAX_FILE_SIZE:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"ファイルサイズが大きすぎます。最大{settings.MAX_FILE_SIZE // (1024*1024)}MBまで"
-                    )
+            buffer = await executor_service.run_io(open, temp_path, "wb")
+            try:
+                while True:
+                    chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > settings.MAX_FILE_SIZE:
+                        raise HTTPException(
+                            status_code=400,
+                            detail=f"ファイルサイズが大きすぎます。最大{settings.MAX_FILE_SIZE // (1024*1024)}MBまで"
+                        )
+                    await executor_service.run_io(write_chunk, buffer, chunk)
+            finally:
+                await executor_service.run_io(buffer.close)
             
-            # ファイル名の重複チェック
-            filename = self._get_unique_filename(file.filename)
-            file_path = self.upload_dir / filename
-            
-            # ファイル保存
-            with open(file_path, "wb") as buffer:
-                # 先ほどサイズ計測でポインタが進んでいる可能性があるため先頭へ
-                if file_stream and hasattr(file_stream, "seek"):
-                    file_stream.seek(0)
-                shutil.copyfileobj(file.file, buffer)
-            
-            logger.info(f"ファイル保存完了: {filename}")
-            return file_path
+            stored = await executor_service.run_io(self._store_blob, filename, temp_path, digest.hexdigest(), size)
+            # 内容が同じ場合も登録し直す（カタログの取り込み済みフラグは内容が変わった場合のみ戻る）
+            await executor_service.run_io(
+                self.file_catalog.upsert, filename, str(stored.path), stored.size, stored.sha256
+            )
+            logger.info(f"ファイル保存完了: {filename}{'（内容に変更なし）' if stored.unchanged else ''}")
+            return stored
             
+        except HTTPException:
+            temp_path.unlink(missing_ok=True)
+            raise
         except Exception as e:
+            temp_path.unlink(missing_ok=True)
             logger.error(f"ファイル保存エラー: {str(e)}")
             raise HTTPException(status_code=500, detail=f"ファイル保存に失敗しました: {str(e)}")
     
-    def _get_unique_filename(self, filename: str) -> str:
-        """重複しないファイル名を生成"""
-        if not filename:
-            filename = "unknown_file"
-        
-        name, ext = os.path.splitext(filename)
-        counter = 1
-        new_filename = filename
-        
-        while (self.upload_dir / new_filename).exists():
-            new_filename = f"{name}_{counter}{ext}"
-            counter += 1
-        
-        return new_filename
+    def _store_blob(self, filename: str, temp_path: Path, sha256: str, size: int) -> StoredFile:
+        """一時ファイルを blob に移し、ファイル名をそのハードリンクにする（ブロッキング）"""
+        file_path = self.upload_dir / filename
+        blob_path = self._blob_path(sha256)
+        with self.upload_index.transaction() as index:
+            if blob_path.exists():
+                temp_path.unlink()
+            else:
+                blob_path.parent.mkdir(exist_ok=True)
+                os.replace(temp_path, blob_path)
+            
+            previous = index.get(filename)
+            if previous and previous[0] == sha256 and file_path.exists():
+                return StoredFile(file_path, sha256, size, unchanged=True)
+            
+            # 取り込み中のワーカーが中途半端なファイルを読まないようアトミックに置き換え
+            link_path = self.temp_dir / f"{uuid.uuid4().hex}.link"
+            try:
+                os.link(blob_path, link_path)
+            except OSError:
+                # ハードリンクを作れないファイルシステムではコピーする
+                shutil.copyfile(blob_path, link_path)
+            os.replace(link_path, file_path)
+            index.put(filename, sha256, size)
+            if previous and previous[0] != sha256:
+                self._release_blob(index, previous[0])
+        return StoredFile(file_path, sha256, size, unchanged=False)
     
-    async def list_files(self) -> List[SkillsheetResponse]:
-        """アップロードされたファイル一覧を取得"""
+    def _blob_path(self, sha256: str) -> Path:
+        return self.blob_dir / sha256[:2] / sha256
+    
+    def _release_blob(self, index: UploadIndex, sha256: str) -> None:
+        """どのファイル名からも参照されなくなった blob を削除"""
+        if not index.is_referenced(sha256):
+            self._blob_path(sha256).unlink(missing_ok=True)
+    
+    def _get_safe_filename(self, filename: str) -> str:
+        """保存用のファイル名を生成（ディレクトリ部分は取り除く）"""
+        return Path(filename or "").name or "unknown_file"
+    
+    async def list_files(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        sort: str = "upload_date",
+        order: str = "desc",
+        file_type: Optional[str] = None,
+        name: Optional[str] = None,
+        processed: Optional[bool] = None
+    ) -> Tuple[List[FileInfo], int, Optional[str]]:
+        """アップロードされたファイル一覧の1ページ分を取得（ファイル, 件数, 次のページのカーソル）"""
+        limit = min(limit or settings.FILE_LIST_PAGE_SIZE, settings.FILE_LIST_MAX_PAGE_SIZE)
         try:
-            files = []
-            for file_path in self.upload_dir.iterdir():
-                if file_path.is_file():
-                    stat = file_path.stat()
-                    files.append(SkillsheetResponse(
-                        filename=file_path.name,
-                        file_path=str(file_path),
-                        file_size=stat.st_size,
-                        upload_date=datetime.fromtimestamp(stat.st_mtime),
-                        message="ファイルが正常にアップロードされています"
-                    ))
-            return files
+            return await executor_service.run_io(
+                self.file_catalog.list_files, limit, cursor, sort, order, file_type, name, processed
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         except Exception as e:
             logger.error(f"ファイル一覧取得エラー: {str(e)}")
             raise HTTPException(status_code=500, detail=f"ファイル一覧取得に失敗しました: {str(e)}")
@@ -93,60 +162,167 @@ class FileService:
             if not file_path.exists():
                 raise HTTPException(status_code=404, detail="ファイルが見つかりません")
             
-            file_path.unlink()
+            await executor_service.run_io(self._delete_file_sync, filename, file_path)
+            await executor_service.run_io(self.file_catalog.remove, [filename])
             logger.info(f"ファイル削除完了: {filename}")
             return True
             
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"ファイル削除エラー: {str(e)}")
             raise HTTPException(status_code=500, detail=f"ファイル削除に失敗しました: {str(e)}")
     
+    def _delete_file_sync(self, filename: str, file_path: Path) -> None:
+        with self.upload_index.transaction() as index:
+            file_path.unlink()
+            previous = index.get(filename)
+            if previous:
+                index.remove(filename)
+                self._release_blob(index, previous[0])
+    
     async def extract_text_from_excel(self, file_path: Path) -> str:
         """Excelファイルからテキストを抽出"""
-        try:
-            df = pd.read_excel(file_path, sheet_name=None)
-            text_content = []
-            
-            for sheet_name, sheet_df in df.items():
-                text_content.append(f"Sheet: {sheet_name}")
-                text_content.append(sheet_df.to_string(index=False))
-                text_content.append("")
-            
-            return "\n".join(text_content)
-            
-        except Exception as e:
-            logger.error(f"Excelテキスト抽出エラー: {str(e)}")
-            raise Exception(f"Excelファイルのテキスト抽出に失敗しました: {str(e)}")
+        return "\n".join([segment async for segment in self._iter_excel_segments(file_path, self._deadline())])
     
     async def extract_text_from_pdf(self, file_path: Path) -> str:
-        """PDFファイルからテキストを抽出"""
-        try:
-            text_content = []
-            
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                for page_num, page in enumerate(pdf_reader.pages):
-                    text_content.append(f"Page {page_num + 1}")
-                    text_content.append(page.extract_text())
-                    text_content.append("")
-            
-            return "\n".join(text_content)
-            
-        except Exception as e:
-            logger.error(f"PDFテキスト抽出エラー: {str(e)}")
-            raise Exception(f"PDFファイルのテキスト抽出に失敗しました: {str(e)}")
+        """PDFファイルからテキストを抽出（大きなPDFはページ範囲ごとに並列抽出）"""
+        return "\n".join([segment async for segment in self._iter_pdf_segments(file_path, self._deadline())])
     
     async def extract_text(self, file_path: Path) -> str:
         """ファイルからテキストを抽出（ファイル形式に応じて）"""
+        return "\n".join([segment async for segment in self.iter_text(file_path)])
+    
+    async def iter_text(
+        self,
+        file_path: Path,
+        progress_callback: Optional[Callable[[float], None]] = None
+    ) -> AsyncIterator[str]:
+        """ファイルからテキストを先頭から順に少しずつ抽出（ストリーミング）
+        
+        yield された要素を "\n" で連結すると extract_text の結果と一致する。
+        progress_callback には抽出済みの割合（0.0〜1.0）が渡される。
+        """
         try:
+            # 壊れたファイルで取り込み全体が止まらないようにファイル単位でタイムアウト
+            deadline = self._deadline()
             if file_path.suffix.lower() == '.xlsx':
-                return await self.extract_text_from_excel(file_path)
+                segments = self._iter_excel_segments(file_path, deadline, progress_callback)
             elif file_path.suffix.lower() == '.pdf':
-                return await self.extract_text_from_pdf(file_path)
+                segments = self._iter_pdf_segments(file_path, deadline, progress_callback)
             else:
                 raise Exception(f"サポートされていないファイル形式: {file_path.suffix}")
+            
+            async for segment in segments:
+                yield segment
                 
         except Exception as e:
             logger.error(f"テキスト抽出エラー: {str(e)}")
             raise e
+    
+    async def _iter_excel_segments(
+        self,
+        file_path: Path,
+        deadline: float,
+        progress_callback: Optional[Callable[[float], None]] = None
+    ) -> AsyncIterator[str]:
+        # compact: openpyxl の行ストリーミングで「見出し: 値」形式、legacy: pandas の to_string 形式
+        if settings.EXCEL_EXTRACTION_FORMAT == "legacy":
+            extractor = extract_legacy_segments
+        else:
+            extractor = extract_compact_segments
+        try:
+            segments = await self._wait_until(
+                executor_service.run_process(extractor, file_path), deadline, file_path
+            )
+        except Exception as e:
+            logger.error(f"Excelテキスト抽出エラー: {str(e)}")
+            raise Exception(f"Excelファイルのテキスト抽出に失敗しました: {str(e)}")
+        
+        if progress_callback:
+            progress_callback(1.0)
+        for segment in segments:
+            yield segment
+    
+    async def _iter_pdf_segments(
+        self,
+        file_path: Path,
+        deadline: float,
+        progress_callback: Optional[Callable[[float], None]] = None
+    ) -> AsyncIterator[str]:
+        # 先読みするページ範囲の数を制限し、抽出済みテキストが溜まりすぎないようにする
+        pending: Deque[Tuple[asyncio.Future, int]] = deque()
+        try:
+            page_count = await self._wait_until(
+                executor_service.run_process(_count_pdf_pages, file_path), deadline, file_path
+            )
+            
+            pages_per_task = max(1, settings.PDF_PAGES_PER_TASK)
+            page_ranges = deque(
+                (start, min(start + pages_per_task, page_count))
+                for start in range(0, page_count, pages_per_task)
+            )
+            max_inflight = max(1, settings.EXTRACTION_MAX_INFLIGHT_RANGES)
+            
+            while page_ranges or pending:
+                while page_ranges and len(pending) < max_inflight:
+                    start, end = page_ranges.popleft()
+                    future = asyncio.ensure_future(
+                        executor_service.run_process(_extract_pdf_page_range, file_path, start, end)
+                    )
+                    pending.append((future, end))
+                
+                # 先頭の範囲から順に受け取り、ページ順を保つ
+                future, pages_done = pending.popleft()
+                part = await self._wait_until(future, deadline, file_path)
+                if progress_callback and page_count:
+                    progress_callback(pages_done / page_count)
+                for segment in part:
+                    yield segment
+                    
+        except Exception as e:
+            logger.error(f"PDFテキスト抽出エラー: {str(e)}")
+            raise Exception(f"PDFファイルのテキスト抽出に失敗しました: {str(e)}")
+        finally:
+            for future, _ in pending:
+                future.cancel()
+    
+    def _deadline(self) -> float:
+        return asyncio.get_running_loop().time() + settings.EXTRACTION_TIMEOUT_SECONDS
+    
+    async def _wait_until(self, awaitable: Awaitable[T], deadline: float, file_path: Path) -> T:
+        """期限までに完了しない抽出処理を打ち切る"""
+        remaining = deadline - asyncio.get_running_loop().time()
+        try:
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            return await asyncio.wait_for(awaitable, timeout=remaining)
+        except asyncio.TimeoutError:
+            # 実行中のワーカープロセスはキャンセルでは止まらないためプールごと作り直す
+            executor_service.reset_process_pool()
+            raise Exception(
+                f"テキスト抽出がタイムアウトしました（{settings.EXTRACTION_TIMEOUT_SECONDS}秒）: {file_path.name}"
+            )
+
+
+# 以下はプロセスプールで実行するため、pickle可能なモジュールレベル関数として定義する
+
+def _count_pdf_pages(file_path: Path) -> int:
+    """PDFのページ数を取得"""
+    with open(file_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+
+def _extract_pdf_page_range(file_path: Path, start: int, end: int) -> List[str]:
+    """PDFの指定ページ範囲 [start, end) からテキストを抽出"""
+    text_content = []
+    
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        
+        for page_num in range(start, end):
+            text_content.append(f"Page {page_num + 1}")
+            text_content.append(pdf_reader.pages[page_num].extract_text())
+            text_content.append("")
+    
+    return text_content
@@ -1,6 +1,8 @@
 import os
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+from typing import List, Dict, Any, Optional, AsyncIterator, Iterator, Tuple
 from pathlib import Path
 import tempfile
 from google.oauth2.credentials import Credentials
@@ -8,14 +10,30 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
-import io
 import json
 
 from ..config import settings
 from ..models.skillsheet import SkillsheetResponse
+from ..services.executor import executor_service
+from ..services.cache_service import AsyncTTLCache
 
 logger = logging.getLogger(__name__)
 
+# スキルシートとして扱うファイル形式
+SKILLSHEET_MIME_TYPES = [
+    'application/vnd.google-apps.document',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'application/pdf',
+]
+
+# Google Docs系は exportMimeType を指定してダウンロード（変換後の拡張子）
+EXPORT_MAP = {
+    'application/vnd.google-apps.document': ('application/pdf', '.pdf'),  # Google Docs → PDF
+    'application/vnd.google-apps.spreadsheet': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', '.xlsx'),  # Google Sheets → XLSX
+}
+
+FILE_FIELDS = "id, name, mimeType, size, md5Checksum, modifiedTime, parents"
+
 class GoogleDocsService:
     """Google Docs連携サービス"""
     
@@ -25,11 +43,26 @@ class GoogleDocsService:
         'https://www.googleapis.com/auth/documents.readonly'
     ]
     
-    def __init__(self):
+    def __init__(self, drive_service: Optional[Any] = None, media_download: Optional[Any] = None):
         self.creds = None
         self.drive_service = None
         self.docs_service = None
-        self._authenticate()
+        self.media_download = media_download or MediaIoBaseDownload
+        # httplib2 はスレッドセーフでないため、並行ダウンロードではスレッドごとに Drive クライアントを作る
+        self._thread_local = threading.local()
+        # ファイル一覧・名前検索の結果（GOOGLE_DRIVE_CACHE_TTL_SECONDS の間は Drive に問い合わせない）
+        self.listing_cache = AsyncTTLCache(settings.GOOGLE_DRIVE_CACHE_TTL_SECONDS, settings.GOOGLE_DRIVE_CACHE_SIZE)
+        
+        if drive_service is None and settings.GOOGLE_DRIVE_FAKE_DIR:
+            from .fake_drive import FakeDriveService, FakeMediaDownload
+            drive_service = FakeDriveService(settings.GOOGLE_DRIVE_FAKE_DIR)
+            self.media_download = media_download or FakeMediaDownload
+            logger.info(f"ローカルディレクトリ '{settings.GOOGLE_DRIVE_FAKE_DIR}' をGoogle Driveとして使用します")
+        
+        if drive_service is not None:
+            self.drive_service = drive_service
+        else:
+            self._authenticate()
     
     def _authenticate(self):
         """Google API認証"""
@@ -53,6 +86,14 @@ class GoogleDocsService:
                         logger.warning("credentials.json が見つかりません。Google Cloud Consoleからダウンロードしてください。")
                         return
                     
+                    # ブラウザでの認証はサーバーの起動を無期限に止めるため、開発環境でのみ行う
+                    if not self._interactive_auth_enabled():
+                        logger.warning(
+                            "有効な token.json がないため、Google連携は無効です。"
+                            "開発環境で認証して作成した token.json を配置してください。"
+                        )
+                        return
+                    
                     flow = InstalledAppFlow.from_client_secrets_file(
                         str(credentials_path), self.SCOPES
                     )
@@ -72,30 +113,59 @@ class GoogleDocsService:
             logger.error(f"Google API認証エラー: {str(e)}")
             self.creds = None
     
+    def _interactive_auth_enabled(self) -> bool:
+        """ブラウザでのOAuth認証を行うか（未設定の場合は開発環境のみ）"""
+        if settings.GOOGLE_INTERACTIVE_AUTH is not None:
+            return settings.GOOGLE_INTERACTIVE_AUTH
+        return settings.ENVIRONMENT == "development"
+    
+    def _drive(self) -> Any:
+        """現在のスレッド用の Drive クライアント"""
+        if self.creds is None:
+            # 認証を使わない（フェイクなど外部から渡された）クライアントはそのまま共有する
+            return self.drive_service
+        drive = getattr(self._thread_local, "drive", None)
+        if drive is None:
+            drive = build('drive', 'v3', credentials=self.creds, cache_discovery=False)
+            self._thread_local.drive = drive
+        return drive
+    
+    def _skillsheet_query(self, folder_id: Optional[str] = None) -> str:
+        """スキルシートを対象とする検索クエリ"""
+        mime_query = " or ".join(f"mimeType='{mime_type}'" for mime_type in SKILLSHEET_MIME_TYPES)
+        query = f"({mime_query}) and trashed=false"
+        if folder_id:
+            query += f" and '{folder_id}' in parents"
+        return query
+    
+    def iter_files(self, query: str, page_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """検索クエリに一致するファイルを nextPageToken をたどって全ページ分返す"""
+        page_token = None
+        while True:
+            results = self._drive().files().list(
+                q=query,
+                pageSize=page_size or settings.GOOGLE_DRIVE_PAGE_SIZE,
+                pageToken=page_token,
+                fields=f"nextPageToken, files({FILE_FIELDS})"
+            ).execute()
+            yield from results.get('files', [])
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+    
     async def list_skillsheets(self, folder_id: Optional[str] = None) -> List[Dict[str, Any]]:
-        """スキルシートファイル一覧を取得"""
+        """スキルシートファイル一覧を取得（全ページ、一定時間キャッシュ）"""
         try:
             if not self.drive_service:
                 logger.warning("Google Drive APIが利用できません")
                 return []
             
-            # 検索クエリ
-            query = "mimeType='application/vnd.google-apps.document' or mimeType='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet' or mimeType='application/pdf'"
-            
-            if folder_id:
-                query += f" and '{folder_id}' in parents"
-            
-            # ファイル一覧を取得
-            results = self.drive_service.files().list(
-                q=query,
-                pageSize=100,
-                fields="nextPageToken, files(id, name, mimeType, size, modifiedTime, parents)"
-            ).execute()
-            
-            files = results.get('files', [])
-            logger.info(f"Google Driveから {len(files)} 件のファイルを取得しました")
+            async def load() -> List[Dict[str, Any]]:
+                files = await executor_service.run_io(lambda: list(self.iter_files(self._skillsheet_query(folder_id))))
+                logger.info(f"Google Driveから {len(files)} 件のファイルを取得しました")
+                return files
             
-            return files
+            return await self.listing_cache.get_or_load(("list", folder_id), load)
             
         except Exception as e:
             logger.error(f"Google Driveファイル一覧取得エラー: {str(e)}")
@@ -111,51 +181,136 @@ class GoogleDocsService:
                 logger.warning("Google Drive APIが利用できません")
                 return None
             
-            # ファイル情報を取得
-            file = self.drive_service.files().get(fileId=file_id, fields="id, name, mimeType").execute()
-            
-            # 一時ファイルに保存
             temp_dir = Path(tempfile.gettempdir()) / "skillsheet_rag"
-            temp_dir.mkdir(exist_ok=True)
-            
-            temp_file = temp_dir / filename
-
-            # Google Docs系は exportMimeType を指定
-            export_map = {
-                'application/vnd.google-apps.document': 'application/pdf',  # Google Docs → PDF
-                'application/vnd.google-apps.spreadsheet': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',  # Google Sheets → XLSX
-            }
-
-            request = None
-            if file.get('mimeType') in export_map:
-                request = self.drive_service.files().export_media(fileId=file_id, mimeType=export_map[file['mimeType']])
-                # 拡張子を補正
-                if file['mimeType'] == 'application/vnd.google-apps.document' and not filename.lower().endswith('.pdf'):
-                    temp_file = temp_dir / (Path(filename).stem + '.pdf')
-                if file['mimeType'] == 'application/vnd.google-apps.spreadsheet' and not filename.lower().endswith('.xlsx'):
-                    temp_file = temp_dir / (Path(filename).stem + '.xlsx')
-            else:
-                # 通常ファイルのバイナリ取得
-                request = self.drive_service.files().get_media(fileId=file_id)
-            fh = io.BytesIO()
-            downloader = MediaIoBaseDownload(fh, request)
-            
-            done = False
-            while done is False:
-                status, done = downloader.next_chunk()
-                logger.info(f"ダウンロード進捗: {int(status.progress() * 100)}%")
-            
-            # ファイルに保存
-            with open(temp_file, 'wb') as f:
-                f.write(fh.getvalue())
-            
-            logger.info(f"ファイルダウンロード完了: {filename}")
-            return temp_file
+            return await executor_service.run_io(self.download_to, file_id, filename, temp_dir)
             
         except Exception as e:
             logger.error(f"ファイルダウンロードエラー: {str(e)}")
             return None
     
+    def download_to(
+        self,
+        file_id: str,
+        filename: str,
+        directory: Path,
+        mime_type: Optional[str] = None
+    ) -> Path:
+        """ファイルを directory にチャンク単位で直接書き込んでダウンロード（ブロッキング）
+        
+        書き込み途中のファイルは .part として保存し、完了後に名前を変更する。
+        保存先のパスを返す。
+        """
+        drive = self._drive()
+        if mime_type is None:
+            mime_type = drive.files().get(fileId=file_id, fields="id, name, mimeType").execute().get('mimeType')
+        
+        directory.mkdir(parents=True, exist_ok=True)
+        destination = directory / filename
+        if mime_type in EXPORT_MAP:
+            export_mime_type, extension = EXPORT_MAP[mime_type]
+            request = drive.files().export_media(fileId=file_id, mimeType=export_mime_type)
+            # 拡張子を補正
+            if not filename.lower().endswith(extension):
+                destination = directory / (Path(filename).stem + extension)
+        else:
+            # 通常ファイルのバイナリ取得
+            request = drive.files().get_media(fileId=file_id)
+        
+        partial = destination.with_name(destination.name + ".part")
+        try:
+            with open(partial, 'wb') as f:
+                downloader = self.media_download(f, request, chunksize=settings.GOOGLE_DRIVE_DOWNLOAD_CHUNK_SIZE)
+                done = False
+                while not done:
+                    status, done = downloader.next_chunk()
+                    if status:
+                        logger.debug(f"ダウンロード進捗 '{filename}': {int(status.progress() * 100)}%")
+            os.replace(partial, destination)
+        except Exception:
+            partial.unlink(missing_ok=True)
+            raise
+        
+        logger.info(f"ファイルダウンロード完了: {destination.name}")
+        return destination
+    
+    def list_folder_files(self, folder_id: str) -> List[Dict[str, Any]]:
+        """フォルダ内のすべてのスキルシートの情報を取得（ブロッキング）"""
+        return list(self.iter_files(self._skillsheet_query(folder_id)))
+    
+    def folder_download_dir(self, folder_id: str) -> Path:
+        """フォルダ同期でダウンロードしたファイルの保存先（ファイルは <ファイルID>/<名前> に保存）"""
+        return Path(tempfile.gettempdir()) / "skillsheet_rag" / folder_id
+    
+    def iter_folder_downloads(
+        self,
+        folder_id: str,
+        directory: Optional[Path] = None
+    ) -> AsyncIterator[Tuple[Dict[str, Any], Optional[Path]]]:
+        """フォルダ内のすべてのスキルシートを並行してダウンロードし、完了した順に返す
+        
+        ファイル一覧はページ単位で取得し、取得したページのファイルから順にダウンロードを始める。
+        """
+        return self.iter_downloads(
+            self.iter_files(self._skillsheet_query(folder_id)),
+            directory or self.folder_download_dir(folder_id)
+        )
+    
+    async def iter_downloads(
+        self,
+        files: Iterator[Dict[str, Any]],
+        directory: Path
+    ) -> AsyncIterator[Tuple[Dict[str, Any], Optional[Path]]]:
+        """ファイルを並行して directory にダウンロードし、完了した順に返す
+        
+        files はI/Oプールで1ページ分ずつ取り出すため、Drive の一覧取得を続けながら
+        取得済みのファイルのダウンロードを進められる。
+        同時ダウンロード数は Settings.GOOGLE_DRIVE_DOWNLOAD_CONCURRENCY まで。
+        Drive では同じフォルダに同名のファイルを置けるため、ファイルは directory/<ファイルID>/ に保存する。
+        (ファイル情報, 保存先のパス) を返し、ダウンロードに失敗したファイルのパスは None とする。
+        """
+        files = iter(files)
+        semaphore = asyncio.Semaphore(max(1, settings.GOOGLE_DRIVE_DOWNLOAD_CONCURRENCY))
+        completed: "asyncio.Queue[Tuple[Dict[str, Any], Optional[Path]]]" = asyncio.Queue()
+        
+        async def download(file: Dict[str, Any]) -> None:
+            path = None
+            try:
+                async with semaphore:
+                    path = await executor_service.run_io(
+                        self.download_to, file['id'], file['name'], directory / file['id'], file.get('mimeType')
+                    )
+            except Exception as e:
+                logger.error(f"ファイルダウンロードエラー '{file.get('name')}': {str(e)}")
+            await completed.put((file, path))
+        
+        async def list_and_download() -> int:
+            tasks = []
+            while True:
+                # 1ページ分ずつ取得し、次のページを待つ間もダウンロードを進める
+                page = await executor_service.run_io(_next_page, files, settings.GOOGLE_DRIVE_PAGE_SIZE)
+                tasks.extend(asyncio.create_task(download(file)) for file in page)
+                if len(page) < settings.GOOGLE_DRIVE_PAGE_SIZE:
+                    break
+            await asyncio.gather(*tasks)
+            return len(tasks)
+        
+        lister = asyncio.create_task(list_and_download())
+        received = 0
+        try:
+            while not (lister.done() and received == lister.result()):
+                getter = asyncio.create_task(completed.get())
+                await asyncio.wait({getter, lister}, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    received += 1
+                    yield getter.result()
+                else:
+                    getter.cancel()
+                    if lister.exception() is not None:
+                        raise lister.exception()
+        finally:
+            if not lister.done():
+                lister.cancel()
+    
     async def get_document_content(self, document_id: str) -> Optional[str]:
         """Google Docsの内容を取得"""
         try:
@@ -184,30 +339,51 @@ class GoogleDocsService:
             return None
     
     async def search_files(self, query: str) -> List[Dict[str, Any]]:
-        """Google Driveでファイルを検索"""
+        """Google Driveでファイルを検索（一定時間キャッシュ）"""
         try:
             if not self.drive_service:
                 logger.warning("Google Drive APIが利用できません")
                 return []
             
-            # ファイル名で検索
-            search_query = f"name contains '{query}' and (mimeType='application/vnd.google-apps.document' or mimeType='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet' or mimeType='application/pdf')"
+            query = query.strip()
             
-            results = self.drive_service.files().list(
-                q=search_query,
-                pageSize=50,
-                fields="nextPageToken, files(id, name, mimeType, size, modifiedTime)"
-            ).execute()
-            
-            files = results.get('files', [])
-            logger.info(f"Google Drive検索結果: {len(files)} 件")
+            async def load() -> List[Dict[str, Any]]:
+                # ファイル名で検索（クエリ内の引用符はエスケープ）
+                escaped = query.replace("\\", "\\\\").replace("'", "\\'")
+                mime_query = " or ".join(f"mimeType='{mime_type}'" for mime_type in SKILLSHEET_MIME_TYPES)
+                search_query = f"name contains '{escaped}' and ({mime_query}) and trashed=false"
+                
+                results = await executor_service.run_io(
+                    lambda: self._drive().files().list(
+                        q=search_query,
+                        pageSize=50,
+                        fields="nextPageToken, files(id, name, mimeType, size, modifiedTime)"
+                    ).execute()
+                )
+                
+                files = results.get('files', [])
+                logger.info(f"Google Drive検索結果: {len(files)} 件")
+                return files
             
-            return files
+            # Drive の名前検索は大文字・小文字を区別しないため、キーも区別しない
+            return await self.listing_cache.get_or_load(("search", query.lower()), load)
             
         except Exception as e:
             logger.error(f"Google Drive検索エラー: {str(e)}")
             return []
     
     def is_authenticated(self) -> bool:
-        """認証状態を確認"""
-        return self.creds is not None and self.creds.valid
+        """認証状態を確認（外部から渡された Drive クライアントは認証済みとみなす）"""
+        if self.creds is None:
+            return self.drive_service is not None
+        return self.creds.valid
+
+
+def _next_page(files: Iterator[Dict[str, Any]], size: int) -> List[Dict[str, Any]]:
+    """イテレーターから最大 size 件を取り出す"""
+    page = []
+    for file in files:
+        page.append(file)
+        if len(page) >= size:
+            break
+    return page
@@ -70,7 +70,7 @@ class GPTService:
         context_parts = []
         
         for i, item in enumerate(context, 1):
-            filename = item.get('filename', '不明なファイル')
+            filename = item.get('display_name') or item.get('filename', '不明なファイル')
             content = item.get('content', '')
             score = item.get('score', 0)
             
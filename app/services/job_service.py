@@ -0,0 +1,99 @@
+import logging
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import redis
+
+from ..config import settings
+from ..models.skillsheet import ProcessingStatus
+
+logger = logging.getLogger(__name__)
+
+
+class JobService:
+    """取り込みジョブの状態管理サービス
+
+    ジョブ状態は Redis に保存し、APIプロセスとCeleryワーカーの間で共有する。
+    Redis に接続できない場合（ローカル開発など）はプロセス内のメモリで代替する。
+    """
+
+    KEY_PREFIX = "skillsheet:job:"
+
+    def __init__(self):
+        self.ttl = settings.JOB_TTL_SECONDS
+        self._memory_store: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.redis = None
+        try:
+            client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+            client.ping()
+            self.redis = client
+        except Exception as e:
+            logger.warning(f"Redisに接続できないため、ジョブ状態をメモリで管理します: {str(e)}")
+
+    def create_job(self, filename: str, source: str = "upload") -> ProcessingStatus:
+        """ジョブを作成"""
+        now = datetime.now()
+        job = ProcessingStatus(
+            job_id=uuid.uuid4().hex,
+            filename=filename,
+            source=source,
+            status="pending",
+            stage="queued",
+            progress=0.0,
+            message="取り込みジョブをキューに登録しました",
+            created_at=now,
+            updated_at=now,
+        )
+        self._save(job)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[ProcessingStatus]:
+        """ジョブ状態を取得"""
+        raw = self._load(job_id)
+        if raw is None:
+            return None
+        return ProcessingStatus.model_validate_json(raw)
+
+    def update_job(self, job_id: str, **fields: Any) -> Optional[ProcessingStatus]:
+        """ジョブ状態を更新"""
+        job = self.get_job(job_id)
+        if job is None:
+            logger.warning(f"ジョブが見つかりません: {job_id}")
+            return None
+        job = job.model_copy(update={**fields, "updated_at": datetime.now()})
+        self._save(job)
+        return job
+
+    def update_progress(self, job_id: str, stage: str, progress: float) -> None:
+        """ステージと進捗率を更新（RAGServiceの進捗コールバック用）"""
+        self.update_job(
+            job_id,
+            status="processing",
+            stage=stage,
+            progress=max(0.0, min(progress, 1.0)),
+        )
+
+    def mark_completed(self, job_id: str, message: str, result: Optional[Dict[str, Any]] = None) -> None:
+        """ジョブを完了状態にする"""
+        self.update_job(job_id, status="completed", stage="done", progress=1.0, message=message, result=result)
+
+    def mark_failed(self, job_id: str, message: str) -> None:
+        """ジョブを失敗状態にする"""
+        self.update_job(job_id, status="failed", message=message)
+
+    def _save(self, job: ProcessingStatus) -> None:
+        payload = job.model_dump_json()
+        if self.redis is not None:
+            self.redis.set(self.KEY_PREFIX + job.job_id, payload, ex=self.ttl)
+            return
+        with self._lock:
+            self._memory_store[job.job_id] = payload
+
+    def _load(self, job_id: str) -> Optional[str]:
+        if self.redis is not None:
+            return self.redis.get(self.KEY_PREFIX + job_id)
+        with self._lock:
+            return self._memory_store.get(job_id)
@@ -0,0 +1,144 @@
+import json
+import logging
+import re
+import sqlite3
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# 英数字の単語（"c++"・"c#"・"node.js" などの記号を含む技術用語は1語として扱う）と、それ以外の文字の連続
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[+#]+|\.[a-z0-9]+)*|[^\W_a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """テキストを検索用のトークンに分割
+
+    英数字は単語単位、日本語など分かち書きしない文字列は文字2-gramに分割する。
+    """
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(unicodedata.normalize("NFKC", text).lower()):
+        token = match.group()
+        if token[0].isascii():
+            tokens.append(token)
+        elif len(token) == 1:
+            tokens.append(token)
+        else:
+            tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+    return tokens
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """クエリのトークンを OR で結合した FTS5 の検索式を作成"""
+    terms = []
+    for token in dict.fromkeys(tokenize(query)):
+        # 1文字の日本語は2-gramの先頭に一致させる
+        terms.append(f'"{token}"*' if len(token) == 1 and not token.isascii() else f'"{token}"')
+    return " OR ".join(terms) if terms else None
+
+
+class LexicalIndex:
+    """チャンク本文の転置インデックス（BM25による語彙検索）
+
+    SQLite の FTS5 にトークン化済みのチャンクを格納し、ベクトル検索では
+    順位が上がりにくい技術用語（"COBOL"・"SAP ABAP" など）の完全一致を拾う。
+    チャンクIDは ChromaDB のコレクションと共通で、取り込み・削除のたびに同期して更新する。
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = Path(db_path or settings.LEXICAL_INDEX_PATH)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS lexical_chunks ("
+            " rowid INTEGER PRIMARY KEY,"
+            " chunk_id TEXT NOT NULL UNIQUE,"
+            " filename TEXT NOT NULL,"
+            " chunk_index INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS lexical_chunks_filename ON lexical_chunks (filename, chunk_index)")
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS lexical_fts USING fts5("
+            "tokens, tokenize=\"unicode61 remove_diacritics 0 tokenchars '+#.'\")"
+        )
+        self._conn.commit()
+
+    def upsert(self, ids: List[str], metadatas: List[Dict[str, Any]], documents: List[str]) -> None:
+        """チャンクを登録（同じIDのチャンクは置き換え）"""
+        rows = [
+            (chunk_id, metadata["filename"], metadata["chunk_index"], " ".join(tokenize(document)))
+            for chunk_id, metadata, document in zip(ids, metadatas, documents)
+        ]
+        with self._lock:
+            for chunk_id, filename, chunk_index, tokens in rows:
+                existing = self._conn.execute(
+                    "SELECT rowid FROM lexical_chunks WHERE chunk_id = ?", (chunk_id,)
+                ).fetchone()
+                if existing:
+                    rowid = existing[0]
+                    self._conn.execute(
+                        "UPDATE lexical_chunks SET filename = ?, chunk_index = ? WHERE rowid = ?",
+                        (filename, chunk_index, rowid)
+                    )
+                    self._conn.execute("DELETE FROM lexical_fts WHERE rowid = ?", (rowid,))
+                else:
+                    rowid = self._conn.execute(
+                        "INSERT INTO lexical_chunks (chunk_id, filename, chunk_index) VALUES (?, ?, ?)",
+                        (chunk_id, filename, chunk_index)
+                    ).lastrowid
+                self._conn.execute("INSERT INTO lexical_fts (rowid, tokens) VALUES (?, ?)", (rowid, tokens))
+            self._conn.commit()
+
+    def delete_file(self, filename: str) -> None:
+        """ファイルのチャンクをすべて削除"""
+        self._delete("filename = ?", (filename,))
+
+    def delete_ids(self, ids: List[str]) -> None:
+        """指定したIDのチャンクを削除（置き換え前・書き込み途中の世代の削除に使用）"""
+        self._delete("chunk_id IN (SELECT value FROM json_each(?))", (json.dumps(ids, ensure_ascii=False),))
+
+    def clear(self) -> None:
+        """すべてのチャンクを削除"""
+        with self._lock:
+            self._conn.execute("DELETE FROM lexical_fts")
+            self._conn.execute("DELETE FROM lexical_chunks")
+            self._conn.commit()
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM lexical_chunks LIMIT 1").fetchone() is None
+
+    def search(self, query: str, n_results: int = 10, filenames: Optional[List[str]] = None) -> List[Tuple[str, float]]:
+        """BM25スコアの高い順に (チャンクID, スコア) を取得（filenames 指定時はそのファイルのみ）"""
+        match_query = build_match_query(query)
+        if match_query is None:
+            return []
+        sql = (
+            "SELECT c.chunk_id, bm25(lexical_fts) AS rank"
+            " FROM lexical_fts JOIN lexical_chunks c ON c.rowid = lexical_fts.rowid"
+            " WHERE lexical_fts MATCH ?"
+        )
+        params: List[Any] = [match_query]
+        if filenames is not None:
+            # バインド変数の上限を避けるため、ファイル名の一覧はJSON配列として渡す
+            sql += " AND c.filename IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(filenames, ensure_ascii=False))
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY rank LIMIT ?", [*params, n_results]).fetchall()
+        # FTS5 の bm25() は関連度が高いほど小さい（負の）値を返すため符号を反転
+        return [(chunk_id, -rank) for chunk_id, rank in rows]
+
+    def _delete(self, condition: str, params: tuple) -> None:
+        with self._lock:
+            self._conn.execute(
+                f"DELETE FROM lexical_fts WHERE rowid IN (SELECT rowid FROM lexical_chunks WHERE {condition})",
+                params
+            )
+            self._conn.execute(f"DELETE FROM lexical_chunks WHERE {condition}", params)
+            self._conn.commit()
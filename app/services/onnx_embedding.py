@@ -0,0 +1,321 @@
+"""ONNX Runtime による埋め込み計算
+
+SentenceTransformer のモデルを ONNX 形式に書き出し（必要に応じて int8 に動的量子化し）、
+CPU上で onnxruntime により推論する。プーリング・正規化は SentenceTransformer の
+モジュール構成に合わせて NumPy で行う。
+
+モデルの書き出し（onnx / onnx_int8 バックエンドを使うプロセスを起動する前に1度実行）:
+    python -m app.services.onnx_embedding export
+
+現在のベクトルとの一致度・スループットの比較:
+    python -m app.services.onnx_embedding compare --backends onnx onnx_int8 --samples 500
+"""
+import argparse
+import fcntl
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from ..config import settings
+from .embedding_backend import EmbeddingBackend
+
+logger = logging.getLogger(__name__)
+
+CONFIG_FILE = "embedding_config.json"
+FP32_MODEL_FILE = "model.onnx"
+INT8_MODEL_FILE = "model.int8.onnx"
+
+
+def get_model_dir(model_name: str) -> Path:
+    """モデル名に対応する書き出し先ディレクトリ"""
+    return Path(settings.ONNX_MODEL_DIR) / model_name.replace("/", "__")
+
+
+def is_exported(model_dir: Path) -> bool:
+    return (model_dir / CONFIG_FILE).exists() and (model_dir / FP32_MODEL_FILE).exists()
+
+
+@contextmanager
+def _export_lock(model_dir: Path) -> Iterator[None]:
+    """同じモデルの書き出しを複数プロセスで同時に行わないためのファイルロック"""
+    model_dir.parent.mkdir(parents=True, exist_ok=True)
+    with open(model_dir.parent / f"{model_dir.name}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def export_onnx_model(model_name: str, output_dir: Path, quantize: bool = True) -> Path:
+    """SentenceTransformer のモデルを ONNX 形式で書き出す（quantize=True の場合は int8 版も作成）
+
+    一時ディレクトリに書き出してから1回の rename で配置するため、読み込み側が
+    書き出し途中のファイルを見ることはない。書き出し済みの場合は何もしない。
+    """
+    with _export_lock(output_dir):
+        if not is_exported(output_dir):
+            temp_dir = output_dir.parent / f".{output_dir.name}.{uuid.uuid4().hex}.tmp"
+            try:
+                _write_onnx_model(model_name, temp_dir)
+                if output_dir.exists():
+                    # 以前の書き出しが途中で止まった残り
+                    shutil.rmtree(output_dir)
+                os.rename(temp_dir, output_dir)
+            finally:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+            logger.info(f"ONNXモデルを書き出しました: {output_dir / FP32_MODEL_FILE}")
+
+        if quantize and not (output_dir / INT8_MODEL_FILE).exists():
+            _quantize_onnx_model(output_dir)
+    return output_dir
+
+
+def _write_onnx_model(model_name: str, output_dir: Path) -> None:
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    output_dir.mkdir(parents=True)
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer = model[0]
+    tokenizer = transformer.tokenizer
+    auto_model = transformer.auto_model.eval()
+
+    pooling = next((module for module in model if isinstance(module, Pooling)), None)
+    pooling_mode = "mean"
+    if pooling is not None and pooling.pooling_mode_cls_token:
+        pooling_mode = "cls"
+    elif pooling is not None and pooling.pooling_mode_max_tokens:
+        pooling_mode = "max"
+
+    sample = tokenizer(["スキルシート sample"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = auto_model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+    with torch.no_grad():
+        torch.onnx.export(
+            LastHiddenState(),
+            tuple(sample[name] for name in input_names),
+            str(output_dir / FP32_MODEL_FILE),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+    tokenizer.save_pretrained(str(output_dir))
+    with open(output_dir / CONFIG_FILE, "w") as f:
+        json.dump({
+            "model": model_name,
+            "pooling": pooling_mode,
+            "normalize": any(isinstance(module, Normalize) for module in model),
+            "max_seq_length": model.max_seq_length,
+            "inputs": input_names,
+        }, f, indent=2)
+
+
+def _quantize_onnx_model(model_dir: Path) -> Path:
+    """書き出し済みの ONNX モデルを重みのみ int8 に動的量子化（一時ファイルから置き換え）"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    output_path = model_dir / INT8_MODEL_FILE
+    temp_path = model_dir / f".{INT8_MODEL_FILE}.{uuid.uuid4().hex}.tmp"
+    try:
+        quantize_dynamic(str(model_dir / FP32_MODEL_FILE), str(temp_path), weight_type=QuantType.QInt8)
+        os.replace(temp_path, output_path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+    logger.info(f"ONNXモデルをint8に量子化しました: {output_path}")
+    return output_path
+
+
+class OnnxEmbeddingBackend(EmbeddingBackend):
+    """ONNX Runtime（CPU）で埋め込みを計算
+
+    モデルは事前に python -m app.services.onnx_embedding export で書き出しておく
+    （各プロセスで torch を読み込んで書き出さないよう、ここでは書き出さない）。
+    """
+
+    def __init__(self, quantized: bool = False, model_name: Optional[str] = None, model_dir: Optional[Path] = None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name or settings.EMBEDDING_MODEL
+        self.model_id = f"{self.model_name}#int8" if quantized else self.model_name
+        self.model_dir = model_dir or get_model_dir(self.model_name)
+        model_path = self.model_dir / (INT8_MODEL_FILE if quantized else FP32_MODEL_FILE)
+        if not is_exported(self.model_dir) or not model_path.exists():
+            raise RuntimeError(
+                f"ONNXモデル '{model_path}' がありません。"
+                "python -m app.services.onnx_embedding export で書き出してください"
+            )
+
+        with open(self.model_dir / CONFIG_FILE) as f:
+            config = json.load(f)
+        self.pooling = config["pooling"]
+        self.normalize = config["normalize"]
+        self.max_seq_length = config["max_seq_length"]
+        self.input_names = config["inputs"]
+
+        self.tokenizer = AutoTokenizer.from_pretrained(str(self.model_dir))
+        options = ort.SessionOptions()
+        if settings.ONNX_NUM_THREADS > 0:
+            options.intra_op_num_threads = settings.ONNX_NUM_THREADS
+        self.session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        logger.info(f"ONNXモデルを読み込みました: {model_path}")
+
+    def encode(self, sentences: List[str], batch_size: int = 32, convert_to_numpy: bool = True) -> np.ndarray:
+        if not sentences:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        # 長さの近い文をまとめてパディングを減らす（結果は元の順序に戻す）
+        order = np.argsort([-len(sentence) for sentence in sentences], kind="stable")
+        outputs = []
+        for start in range(0, len(sentences), batch_size):
+            batch = [sentences[i] for i in order[start:start + batch_size]]
+            encoded = self.tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            feeds = {name: encoded[name].astype(np.int64) for name in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+            outputs.append(self._pool(hidden, encoded["attention_mask"]))
+
+        embeddings = np.empty((len(sentences), outputs[0].shape[1]), dtype=np.float32)
+        embeddings[order] = np.concatenate(outputs)
+        return embeddings
+
+    def _pool(self, hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        mask = attention_mask[..., None].astype(np.float32)
+        if self.pooling == "cls":
+            pooled = hidden[:, 0]
+        elif self.pooling == "max":
+            pooled = np.where(mask > 0, hidden, -1e9).max(axis=1)
+        else:
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+
+def load_reference_sample(limit: int) -> Tuple[List[str], Optional[np.ndarray]]:
+    """ベクトルストアに保存済みのチャンク本文と埋め込みを取得（比較の基準に使う）"""
+    from .vector_store import create_vector_store
+
+    results = create_vector_store().get(include=["documents", "embeddings"], limit=limit)
+    if not results["ids"]:
+        return [], None
+    return results["documents"], np.asarray(results["embeddings"], dtype=np.float32)
+
+
+def compare_backends(
+    texts: List[str],
+    reference: np.ndarray,
+    backend: EmbeddingBackend,
+    batch_size: int,
+    top_k: int = 10
+) -> Dict[str, Any]:
+    """基準のベクトルとの一致度とスループットを計測
+
+    - cosine_mean・cosine_min: 同じテキストの基準ベクトルとのコサイン類似度
+    - neighbor_recall: 各テキストの近傍 top_k 件（サンプル内）が基準と一致する割合
+    """
+    backend.encode(texts[:batch_size], batch_size=batch_size)  # ウォームアップ
+
+    start = time.perf_counter()
+    vectors = np.asarray(backend.encode(texts, batch_size=batch_size), dtype=np.float32)
+    batch_seconds = time.perf_counter() - start
+
+    single_latencies = []
+    for text in texts[:50]:
+        start = time.perf_counter()
+        backend.encode([text], batch_size=1)
+        single_latencies.append(time.perf_counter() - start)
+
+    normalized = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    expected = reference / np.clip(np.linalg.norm(reference, axis=1, keepdims=True), 1e-12, None)
+    cosine = (normalized * expected).sum(axis=1)
+
+    k = min(top_k, len(texts) - 1)
+    recall = 1.0
+    if k > 0:
+        neighbors = np.argsort(-(normalized @ normalized.T), axis=1)[:, 1:k + 1]
+        expected_neighbors = np.argsort(-(expected @ expected.T), axis=1)[:, 1:k + 1]
+        recall = float(np.mean([
+            len(set(row) & set(expected_row)) / k
+            for row, expected_row in zip(neighbors, expected_neighbors)
+        ]))
+
+    return {
+        "backend": backend.model_id,
+        "cosine_mean": float(cosine.mean()),
+        "cosine_min": float(cosine.min()),
+        "neighbor_recall": recall,
+        "texts_per_second": len(texts) / batch_seconds,
+        "single_latency_ms": float(np.median(single_latencies)) * 1000,
+    }
+
+
+if __name__ == "__main__":
+    from .embedding_backend import LocalEmbeddingBackend, create_embedding_backend
+
+    parser = argparse.ArgumentParser(description="ONNX 埋め込みモデルの書き出し・比較")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="埋め込みモデルを ONNX 形式（と int8 版）で書き出す")
+    export_parser.add_argument("--model", default=settings.EMBEDDING_MODEL)
+    export_parser.add_argument("--no-quantize", action="store_true", help="int8 版を作成しない")
+    compare_parser = subparsers.add_parser("compare", help="埋め込みバックエンドの一致度・スループット比較")
+    compare_parser.add_argument("--backends", nargs="+", default=["onnx", "onnx_int8"], choices=["local", "onnx", "onnx_int8"])
+    compare_parser.add_argument("--samples", type=int, default=500, help="コレクションから取得するチャンク数")
+    compare_parser.add_argument("--batch-size", type=int, default=settings.EMBEDDING_BATCH_SIZE)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "export":
+        output_dir = export_onnx_model(args.model, get_model_dir(args.model), quantize=not args.no_quantize)
+        print(f"書き出し先: {output_dir}")
+        raise SystemExit(0)
+
+    texts, reference = load_reference_sample(args.samples)
+    if not texts:
+        raise SystemExit("コレクションにチャンクがありません。スキルシートを取り込んでから実行してください")
+    print(f"基準: コレクションに保存済みのベクトル {len(texts)} 件")
+
+    # local（現在のベクトルを作ったバックエンド）を常に先頭で計測し、速度比の基準にする
+    names = ["local"] + [name for name in args.backends if name != "local"]
+    reports = [
+        compare_backends(
+            texts,
+            reference,
+            LocalEmbeddingBackend() if name == "local" else create_embedding_backend(name),
+            args.batch_size
+        )
+        for name in names
+    ]
+    baseline = reports[0]["texts_per_second"]
+    for name, report in zip(names, reports):
+        print(
+            f"{name:10s} cos平均 {report['cosine_mean']:.5f} / 最小 {report['cosine_min']:.5f} "
+            f"近傍一致 {report['neighbor_recall']:.1%} "
+            f"{report['texts_per_second']:.1f} 件/秒 (x{report['texts_per_second'] / baseline:.2f}) "
+            f"単発 {report['single_latency_ms']:.1f} ms"
+        )
@@ -1,96 +1,469 @@
-import chromadb
-from chromadb.config import Settings as ChromaSettings
-from sentence_transformers import SentenceTransformer
 import logging
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Tuple
 import asyncio
+import uuid
+from datetime import datetime
+import numpy as np
 
 from ..config import settings
 from ..services.file_service import FileService
-from ..models.skillsheet import SearchResult
+from ..services.executor import executor_service
+from ..services.cache_service import QueryEmbeddingCache, SearchResultCache, normalize_query
+from ..services.embedding_store import EmbeddingStore, hash_chunk
+from ..services.chunker import create_chunker
+from ..services.embedding_backend import create_embedding_backend
+from ..services.document_catalog import DocumentCatalog
+from ..services.lexical_index import LexicalIndex
+from ..services.vector_store import create_vector_store
+from ..services.ranking import AGGREGATIONS, CorpusMatrix, Hit, group_hits_by_file, maximal_marginal_relevance
+from ..models.skillsheet import SearchResult, SearchFilters, CandidateMatch, IngestionResult
 
 logger = logging.getLogger(__name__)
 
+# 進捗コールバック: (ステージ名, 進捗率 0.0〜1.0)
+ProgressCallback = Callable[[str, float], None]
+
+# 検索モード: ベクトル検索・語彙検索（BM25）・両者の順位融合
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+# 検索結果のまとめ方: ファイル単位
+SEARCH_GROUP_BY = ("file",)
+
+def new_generation() -> str:
+    """取り込み1回分のチャンクの世代（チャンクIDとメタデータの generation に使う）"""
+    return uuid.uuid4().hex[:12]
+
+def is_current_chunk(metadata: Dict[str, Any], generations: Dict[str, Optional[str]]) -> bool:
+    """チャンクがカタログに登録された世代のものか（世代のない以前のチャンクは世代のない行と一致）"""
+    filename = metadata.get("filename")
+    return filename in generations and generations[filename] == metadata.get("generation")
+
+class SearchScope:
+    """絞り込み条件を各検索に渡せる形に変換したもの（None は絞り込みなし）"""
+    
+    def __init__(self, where: Optional[Dict[str, Any]] = None, filenames: Optional[List[str]] = None):
+        self.where = where
+        self.filenames = filenames
+
 class RAGService:
     def __init__(self):
-        self.chroma_client = chromadb.PersistentClient(
-            path=settings.CHROMA_PERSIST_DIR,
-            settings=ChromaSettings(
-                anonymized_telemetry=False
-            )
-        )
-        
-        # コレクション名
-        self.collection_name = "skillsheets"
-        
-        # コレクションの取得または作成
-        try:
-            self.collection = self.chroma_client.get_collection(self.collection_name)
-            logger.info(f"既存のコレクション '{self.collection_name}' を取得しました")
-        except:
-            self.collection = self.chroma_client.create_collection(
-                name=self.collection_name,
-                metadata={"description": "スキルシートのRAG検索用コレクション"}
-            )
-            logger.info(f"新しいコレクション '{self.collection_name}' を作成しました")
+        # ベクトルの保存先（Settings.VECTOR_STORE: ChromaDB またはメモリマップの flat）
+        self.vector_store = create_vector_store()
         
         # ファイルサービス
         self.file_service = FileService()
         
-        # 埋め込みモデルの初期化
-        self.embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
-        logger.info(f"埋め込みモデル '{settings.EMBEDDING_MODEL}' を初期化しました")
+        # 埋め込みモデルの初期化（server の場合はモデルを読み込まず埋め込みサーバーに依頼）
+        self.embedding_backend = create_embedding_backend()
+        logger.info(f"埋め込みモデル '{self.embedding_backend.model_id}' を初期化しました（{settings.EMBEDDING_BACKEND}）")
+        
+        # チャンク分割器（トークナイザーの読み込みをここで済ませておく）
+        create_chunker()
+        
+        # チャンク本文ハッシュ → 埋め込みの永続ストア（再アップロード時の再計算を省略）
+        self.embedding_store = EmbeddingStore(model_name=self.embedding_backend.model_id)
+        
+        # ファイル単位の統計情報（コレクション情報の取得に使用）
+        self.document_catalog = DocumentCatalog()
+        
+        # チャンク本文の転置インデックス（語彙検索用）
+        self.lexical_index = LexicalIndex()
+        self._lexical_index_checked = False
+        
+        # クエリ埋め込みキャッシュ
+        self.query_embedding_cache = QueryEmbeddingCache(model_id=self.embedding_backend.model_id)
+        
+        # 検索結果キャッシュ（コレクションへの書き込みで無効化）
+        self.search_result_cache = SearchResultCache()
+        
+        # 候補者ランキング用の全チャンクの埋め込み行列（(コレクションバージョン, チャンク数), 行列）
+        self._corpus_matrix: Optional[Tuple[Tuple[int, int], CorpusMatrix]] = None
+        self._corpus_matrix_lock = asyncio.Lock()
+        self._catalog_rebuild_lock = asyncio.Lock()
     
-    async def add_document(self, file_path: Path, filename: str) -> bool:
+    async def add_document(
+        self,
+        file_path: Path,
+        filename: str,
+        progress_callback: Optional[ProgressCallback] = None,
+        source: str = "upload"
+    ) -> bool:
         """ドキュメントをRAGシステムに追加"""
+        result = await self.ingest_document(file_path, filename, progress_callback, source)
+        return result.success
+    
+    async def ingest_document(
+        self,
+        file_path: Path,
+        filename: str,
+        progress_callback: Optional[ProgressCallback] = None,
+        source: str = "upload",
+        display_name: Optional[str] = None
+    ) -> IngestionResult:
+        """ドキュメントをRAGシステムに追加し、取り込み結果を返す
+        
+        抽出→チャンク分割→埋め込み→追加をストリーミングで行い、
+        メモリ上に保持するのは未処理のテキストと小さなバッチ分のチャンクのみとする。
+        チャンクは取り込みごとの新しい世代として書き込み、すべて書き終えてからカタログの世代を
+        切り替えて置き換え前の世代を削除する（それまでの検索は置き換え前の世代のみを返す）。
+        失敗した場合は新しい世代のみを削除し、置き換え前のドキュメントは残す。
+        本文が変わっていないチャンクは保存済みの埋め込みを再利用する。
+        filename はドキュメントのキーで、表示名が異なる場合（Google Driveのファイル）は
+        display_name をメタデータとカタログに記録し、検索結果などの表示とファイル名での絞り込みに使う。
+        """
+        def report(stage: str, progress: float):
+            if progress_callback:
+                progress_callback(stage, progress)
+
+        chunker = create_chunker()
+        pending: List[str] = []
+        ids: List[str] = []
+        metadatas: List[Dict[str, Any]] = []
+        micro_batch_size = max(1, settings.INGEST_MICRO_BATCH_SIZE)
+        ingested_at = datetime.now()
+        generation = new_generation()
+        result = IngestionResult(filename=filename, success=False)
+        # 書き込みを始めたチャンクのID（失敗時に新しい世代のみを削除するため）
+        written_ids: List[str] = []
+        replaced = False
+
+        async def flush(limit: int):
+            # 溜まったチャンクを micro_batch_size 件ずつ埋め込み・追加
+            while len(pending) >= limit and pending:
+                batch = pending[:micro_batch_size]
+                del pending[:micro_batch_size]
+                batch_ids, batch_metadatas = self._build_chunk_records(
+                    batch, filename, file_path, source, ingested_at, generation,
+                    start_index=len(ids), display_name=display_name
+                )
+                embeddings, reused = await self._embed_chunks(batch)
+                # ベクトルと語彙インデックスの一方だけが書き込まれて失敗した場合も取り除けるよう、書き込み前に記録
+                written_ids.extend(batch_ids)
+                await executor_service.run_io(
+                    self.vector_store.upsert,
+                    documents=batch,
+                    metadatas=batch_metadatas,
+                    ids=batch_ids,
+                    embeddings=embeddings
+                )
+                await executor_service.run_io(self.lexical_index.upsert, batch_ids, batch_metadatas, batch)
+                ids.extend(batch_ids)
+                metadatas.extend(batch_metadatas)
+                result.reused_chunks += sum(reused)
+
         try:
-            # ファイルからテキストを抽出
-            text_content = await self.file_service.extract_text(file_path)
+            # ファイルからテキストを逐次抽出し、チャンクが溜まり次第埋め込み・追加
+            report("extracting", 0.05)
+            first = True
+            async for segment in self.file_service.iter_text(
+                file_path,
+                progress_callback=lambda fraction: report("extracting", 0.05 + 0.8 * fraction)
+            ):
+                pending.extend(chunker.feed(segment if first else "\n" + segment))
+                first = False
+                await flush(micro_batch_size)
+            pending.extend(chunker.finish())
+            await flush(1)
             
-            if not text_content.strip():
+            if not ids:
                 logger.warning(f"ファイル '{filename}' からテキストが抽出できませんでした")
-                return False
+                result.message = "テキストが抽出できませんでした"
+                # ファイルは置き換わっているため、置き換え前のドキュメントを検索対象に残さない
+                if await executor_service.run_io(self.document_catalog.contains, filename):
+                    replaced = True
+                    await self._delete_document_chunks(filename)
+                return result
             
-            # テキストをチャンクに分割
-            chunks = self._split_text_into_chunks(text_content)
+            # 総チャンク数は最後まで確定しないため、メタデータをまとめて更新
+            report("storing", 0.9)
+            for metadata in metadatas:
+                metadata["total_chunks"] = len(ids)
+            for start in range(0, len(ids), settings.EMBEDDING_BATCH_SIZE):
+                end = start + settings.EMBEDDING_BATCH_SIZE
+                await executor_service.run_io(
+                    self.vector_store.update,
+                    ids=ids[start:end],
+                    metadatas=metadatas[start:end]
+                )
             
-            # 埋め込みを一括計算
-            embeddings = self.embedding_model.encode(chunks, convert_to_numpy=False)
-
-            # 追加用データを構築
-            ids = []
-            metadatas = []
-            for i, chunk in enumerate(chunks):
-                ids.append(f"{filename}_chunk_{i}")
-                metadatas.append({
-                    "filename": filename,
-                    "chunk_index": i,
-                    "total_chunks": len(chunks),
-                    "file_path": str(file_path),
-                    "chunk_size": len(chunk)
-                })
-
-            # コレクションに一括追加（埋め込み付き）
-            self.collection.add(
-                documents=chunks,
-                metadatas=metadatas,
-                ids=ids,
-                embeddings=[emb if isinstance(emb, list) else emb.tolist() for emb in embeddings]
+            # カタログの世代を切り替えてから、置き換え前の世代を削除
+            replaced = True
+            await executor_service.run_io(
+                self.document_catalog.upsert,
+                filename,
+                len(ids),
+                sum(metadata["chunk_size"] for metadata in metadatas),
+                source,
+                str(file_path),
+                ingested_at,
+                generation,
+                display_name
             )
+            try:
+                await self._delete_other_generations(filename, ids)
+            except Exception as e:
+                # 残った置き換え前の世代は検索されず、次の取り込みで削除される
+                logger.error(f"置き換え前のチャンクの削除エラー '{filename}': {str(e)}")
             
-            logger.info(f"ドキュメント '{filename}' をRAGシステムに追加しました（{len(chunks)}チャンク）")
-            return True
+            result.success = True
+            result.chunks = len(ids)
+            result.reuse_ratio = result.reused_chunks / len(ids)
+            result.message = "RAGシステムに追加しました"
+            logger.info(
+                f"ドキュメント '{filename}' をRAGシステムに追加しました"
+                f"（{len(ids)}チャンク、埋め込み再利用率 {result.reuse_ratio:.0%}）"
+            )
+            return result
             
         except Exception as e:
             logger.error(f"ドキュメント追加エラー '{filename}': {str(e)}")
-            return False
+            # 書き込み途中の新しい世代のみを取り除く（切り替え前なら置き換え前のドキュメントは検索できるまま）
+            if written_ids and not replaced:
+                try:
+                    await self._delete_chunk_ids(written_ids)
+                except Exception as delete_error:
+                    logger.error(f"チャンク削除エラー '{filename}': {str(delete_error)}")
+            result.message = f"RAGシステムへの追加に失敗しました: {str(e)}"
+            return result
+        finally:
+            if written_ids or replaced:
+                await self._invalidate_search_cache()
+    
+    async def add_documents(
+        self,
+        documents: List[Tuple[Path, str]],
+        progress_callback: Optional[ProgressCallback] = None,
+        source: str = "upload"
+    ) -> List[IngestionResult]:
+        """複数ドキュメントをまとめてRAGシステムに追加
+        
+        テキスト抽出はファイル単位で並列に行い、全ドキュメントのチャンクを
+        固定サイズのバッチに詰めて埋め込み計算とコレクション追加を行う。
+        ingest_document と同様に新しい世代として書き込み、成功したドキュメントのみ
+        カタログの世代を切り替える。
+        """
+        def report(stage: str, progress: float):
+            if progress_callback:
+                progress_callback(stage, progress)
+
+        results = [IngestionResult(filename=filename, success=False) for _, filename in documents]
+        if not documents:
+            return results
+
+        # ファイルからテキストを並列抽出
+        semaphore = asyncio.Semaphore(settings.BATCH_EXTRACT_CONCURRENCY)
+        extracted = 0
+        ingested_at = datetime.now()
+        generation = new_generation()
+
+        async def extract(file_path: Path) -> str:
+            nonlocal extracted
+            async with semaphore:
+                try:
+                    return await self.file_service.extract_text(file_path)
+                finally:
+                    extracted += 1
+                    report("extracting", 0.3 * extracted / len(documents))
+
+        texts = await asyncio.gather(
+            *[extract(file_path) for file_path, _ in documents],
+            return_exceptions=True
+        )
+
+        # 全ドキュメントのチャンクを1つのリストに詰める
+        report("chunking", 0.3)
+        all_chunks: List[str] = []
+        all_ids: List[str] = []
+        all_metadatas: List[Dict[str, Any]] = []
+        owners: List[int] = []
+        # テキストが抽出できなかったファイル（置き換え前のドキュメントを削除する）
+        emptied: List[str] = []
+        for index, ((file_path, filename), text) in enumerate(zip(documents, texts)):
+            if isinstance(text, BaseException):
+                results[index].message = f"テキスト抽出に失敗しました: {str(text)}"
+                continue
+            if not text.strip():
+                logger.warning(f"ファイル '{filename}' からテキストが抽出できませんでした")
+                results[index].message = "テキストが抽出できませんでした"
+                emptied.append(filename)
+                continue
+
+            chunks = self._split_text_into_chunks(text)
+            ids, metadatas = self._build_chunk_records(chunks, filename, file_path, source, ingested_at, generation)
+            all_chunks.extend(chunks)
+            all_ids.extend(ids)
+            all_metadatas.extend(metadatas)
+            owners.extend([index] * len(chunks))
+            results[index].chunks = len(chunks)
+
+        # 固定サイズのバッチ単位で埋め込み計算→コレクションに追加
+        batch_size = settings.EMBEDDING_BATCH_SIZE
+        failed = set()
+        for start in range(0, len(all_chunks), batch_size):
+            end = min(start + batch_size, len(all_chunks))
+            try:
+                embeddings, reused = await self._embed_chunks(all_chunks[start:end])
+                for owner, was_reused in zip(owners[start:end], reused):
+                    results[owner].reused_chunks += was_reused
+                await executor_service.run_io(
+                    self.vector_store.upsert,
+                    documents=all_chunks[start:end],
+                    metadatas=all_metadatas[start:end],
+                    ids=all_ids[start:end],
+                    embeddings=embeddings
+                )
+                await executor_service.run_io(
+                    self.lexical_index.upsert,
+                    all_ids[start:end],
+                    all_metadatas[start:end],
+                    all_chunks[start:end]
+                )
+            except Exception as e:
+                logger.error(f"バッチ埋め込み・追加エラー（チャンク {start}〜{end}）: {str(e)}")
+                for index in set(owners[start:end]):
+                    failed.add(index)
+                    results[index].message = f"RAGシステムへの追加に失敗しました: {str(e)}"
+            report("embedding", 0.3 + 0.65 * end / len(all_chunks))
+
+        # 失敗したドキュメントは新しい世代のみを取り除き（置き換え前のドキュメントは残す）、
+        # 成功したドキュメントはカタログの世代を切り替えてから置き換え前の世代を削除
+        report("storing", 0.95)
+        for index, result in enumerate(results):
+            if not result.chunks:
+                continue
+            chunk_ids = [chunk_id for chunk_id, owner in zip(all_ids, owners) if owner == index]
+            if index not in failed:
+                try:
+                    await executor_service.run_io(
+                        self.document_catalog.upsert,
+                        result.filename,
+                        result.chunks,
+                        sum(metadata["chunk_size"] for metadata, owner in zip(all_metadatas, owners) if owner == index),
+                        source,
+                        str(documents[index][0]),
+                        ingested_at,
+                        generation
+                    )
+                except Exception as e:
+                    logger.error(f"カタログ更新エラー '{result.filename}': {str(e)}")
+                    failed.add(index)
+                    result.message = f"RAGシステムへの追加に失敗しました: {str(e)}"
+            if index in failed:
+                try:
+                    await self._delete_chunk_ids(chunk_ids)
+                except Exception as e:
+                    logger.error(f"チャンク削除エラー '{result.filename}': {str(e)}")
+                continue
+            try:
+                await self._delete_other_generations(result.filename, chunk_ids)
+            except Exception as e:
+                # 残った置き換え前の世代は検索されず、次の取り込みで削除される
+                logger.error(f"置き換え前のチャンクの削除エラー '{result.filename}': {str(e)}")
+            result.success = True
+            result.reuse_ratio = result.reused_chunks / result.chunks
+            result.message = "RAGシステムに追加しました"
+
+        # ファイルは置き換わっているため、テキストがなくなったファイルの置き換え前のドキュメントを削除
+        removed = False
+        for filename in emptied:
+            if await executor_service.run_io(self.document_catalog.contains, filename):
+                await self._delete_document_chunks(filename)
+                removed = True
+
+        if all_chunks or removed:
+            await self._invalidate_search_cache()
+
+        succeeded = sum(1 for result in results if result.success)
+        logger.info(
+            f"{len(documents)} 件のドキュメントを一括追加しました"
+            f"（成功 {succeeded} 件、{len(all_chunks)}チャンク）"
+        )
+        return results
+    
+    async def _embed_chunks(self, chunks: List[str]) -> Tuple[np.ndarray, List[bool]]:
+        """チャンクの埋め込みを計算（本文が同じチャンクは保存済みの埋め込みを再利用）"""
+        hashes = [hash_chunk(chunk) for chunk in chunks]
+        stored = await executor_service.run_io(self.embedding_store.get_many, hashes)
+        reused = [chunk_hash in stored for chunk_hash in hashes]
+        
+        missing = [i for i, hit in enumerate(reused) if not hit]
+        if missing:
+            encoded = await executor_service.run_cpu(
+                self.embedding_backend.encode,
+                [chunks[i] for i in missing],
+                batch_size=settings.EMBEDDING_BATCH_SIZE,
+                convert_to_numpy=True
+            )
+            new_items = [(hashes[i], vector) for i, vector in zip(missing, encoded)]
+            await executor_service.run_io(self.embedding_store.put_many, new_items)
+            stored.update(new_items)
+        
+        embeddings = np.stack([stored[chunk_hash] for chunk_hash in hashes]).astype(np.float32)
+        return embeddings, reused
+    
+    async def _delete_other_generations(self, filename: str, current_ids: List[str]) -> None:
+        """ファイルのチャンクのうち current_ids 以外（置き換え前・書き込み途中で残った世代）を削除"""
+        current = set(current_ids)
+        existing = await executor_service.run_io(self.vector_store.get, include=[], where={"filename": filename})
+        await self._delete_chunk_ids([chunk_id for chunk_id in existing["ids"] if chunk_id not in current])
+    
+    async def _delete_chunk_ids(self, chunk_ids: List[str]) -> None:
+        """指定したIDのチャンクをコレクションと語彙インデックスから削除"""
+        if not chunk_ids:
+            return
+        await executor_service.run_io(self.vector_store.delete, ids=chunk_ids)
+        await executor_service.run_io(self.lexical_index.delete_ids, chunk_ids)
+    
+    async def _delete_document_chunks(self, filename: str) -> None:
+        """ドキュメントのチャンクをコレクション・語彙インデックス・カタログから削除"""
+        await executor_service.run_io(self.vector_store.delete, where={"filename": filename})
+        await executor_service.run_io(self.lexical_index.delete_file, filename)
+        await executor_service.run_io(self.document_catalog.remove, [filename])
+    
+    def _build_chunk_records(
+        self,
+        chunks: List[str],
+        filename: str,
+        file_path: Path,
+        source: str,
+        ingested_at: datetime,
+        generation: str,
+        start_index: int = 0,
+        display_name: Optional[str] = None
+    ) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """チャンクのIDとメタデータを構築
+        
+        source・ingested_at（UNIX秒）・file_type は検索時の絞り込み条件として
+        ChromaDB の where 句で使う。file_type は拡張子のないキー（Google Driveのファイル）でも
+        決まるよう、保存先のパスから求める。チャンクIDには世代を含め、置き換え前の世代と重ならないようにする。
+        """
+        file_type = Path(file_path).suffix.lower().lstrip(".")
+        ingested_timestamp = int(ingested_at.timestamp())
+        ids = []
+        metadatas = []
+        for i, chunk in enumerate(chunks, start_index):
+            ids.append(f"{filename}_{generation}_chunk_{i}")
+            metadatas.append({
+                "filename": filename,
+                "generation": generation,
+                "chunk_index": i,
+                "total_chunks": len(chunks),
+                "file_path": str(file_path),
+                "chunk_size": len(chunk),
+                "source": source,
+                "ingested_at": ingested_timestamp,
+                "file_type": file_type
+            })
+            if display_name:
+                metadatas[-1]["display_name"] = display_name
+        return ids, metadatas
     
     async def remove_document(self, filename: str) -> bool:
         """ドキュメントをRAGシステムから削除"""
         try:
             # メタデータで直接削除
-            self.collection.delete(where={"filename": filename})
+            await self._delete_document_chunks(filename)
+            await self._invalidate_search_cache()
             logger.info(f"ドキュメント '{filename}' のチャンクを削除しました")
             
             return True
@@ -99,112 +472,581 @@ class RAGService:
             logger.error(f"ドキュメント削除エラー '{filename}': {str(e)}")
             return False
     
-    async def search(self, query: str, n_results: int = 10) -> List[SearchResult]:
-        """クエリで検索"""
+    async def search(
+        self,
+        query: str,
+        n_results: int = 10,
+        mode: Optional[str] = None,
+        filters: Optional[SearchFilters] = None,
+        group_by: Optional[str] = None,
+        mmr: bool = False,
+        mmr_lambda: Optional[float] = None
+    ) -> List[SearchResult]:
+        """クエリで検索
+        
+        mode は "vector"（ベクトル検索）・"lexical"（BM25による語彙検索）・
+        "hybrid"（両者の順位を Reciprocal Rank Fusion で融合）のいずれか。
+        省略時は Settings.SEARCH_MODE を使う。
+        filters を指定した場合は条件に一致するチャンクのみを検索する。
+        group_by="file" の場合はファイル単位にまとめ、mmr=True の場合は
+        Maximal Marginal Relevance で似た結果が並ばないよう選び直す。
+        """
         try:
-            # クエリを埋め込みベクトルに変換
-            query_embedding = self.embedding_model.encode(query).tolist()
+            results = await self._search_many([query], n_results, mode, filters, group_by, mmr, mmr_lambda)
+            return results[0]
             
-            # コレクションで検索
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results
-            )
+        except Exception as e:
+            logger.error(f"検索エラー: {str(e)}")
+            return []
+    
+    async def search_batch(
+        self,
+        queries: List[str],
+        n_results: int = 10,
+        mode: Optional[str] = None,
+        filters: Optional[SearchFilters] = None,
+        group_by: Optional[str] = None,
+        mmr: bool = False,
+        mmr_lambda: Optional[float] = None
+    ) -> List[List[SearchResult]]:
+        """複数のクエリをまとめて検索し、クエリごとの結果を返す
+        
+        クエリの埋め込みは1回のバッチ計算で求め、ベクトル検索は複数の埋め込みを
+        渡した1回の問い合わせで行う。引数の意味は search と同じ。
+        """
+        try:
+            return await self._search_many(queries, n_results, mode, filters, group_by, mmr, mmr_lambda)
             
-            # 結果を整形
-            search_results = []
+        except Exception as e:
+            logger.error(f"一括検索エラー: {str(e)}")
+            return [[] for _ in queries]
+    
+    async def _search_many(
+        self,
+        queries: List[str],
+        n_results: int,
+        mode: Optional[str],
+        filters: Optional[SearchFilters],
+        group_by: Optional[str],
+        mmr: bool,
+        mmr_lambda: Optional[float]
+    ) -> List[List[SearchResult]]:
+        mode = mode or settings.SEARCH_MODE
+        mmr_lambda = settings.MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"サポートされていない検索モード: {mode}")
+        if group_by is not None and group_by not in SEARCH_GROUP_BY:
+            raise ValueError(f"サポートされていない group_by: {group_by}")
+        
+        # 同一条件の検索結果がキャッシュにあればそのまま返す
+        cache = self.search_result_cache
+        filter_params = filters.model_dump(mode="json") if filters else None
+        cache_params = [
+            {
+                "query": normalize_query(query),
+                "n_results": n_results,
+                "mode": mode,
+                "filters": filter_params,
+                "group_by": group_by,
+                "mmr_lambda": mmr_lambda if mmr else None
+            }
+            for query in queries
+        ]
+        lookups = await asyncio.gather(*[self._call_cache(cache, cache.get, params) for params in cache_params])
+        results: List[Optional[List[SearchResult]]] = [
+            [SearchResult.model_construct(**item) for item in cached] if cached is not None else None
+            for _, cached in lookups
+        ]
+        pending = [i for i, cached in enumerate(results) if cached is None]
+        if not pending:
+            return results
+        
+        # まとめる・選び直す場合は、重複を除いても n_results 件残るよう多めに取得
+        fetch_results = n_results
+        if group_by or mmr:
+            fetch_results = n_results * max(1, settings.SEARCH_OVERFETCH_MULTIPLIER)
+        
+        scope = await self._resolve_filters(filters)
+        if scope is None:
+            hits_per_query: List[List[Hit]] = [[] for _ in pending]
+        else:
+            hits_per_query = await self._retrieve([queries[i] for i in pending], fetch_results, mode, scope)
+        
+        for i, hits in zip(pending, hits_per_query):
+            search_results = await self._build_results(queries[i], hits, n_results, group_by, mmr, mmr_lambda)
+            logger.info(f"検索クエリ '{queries[i]}'（{mode}）で {len(search_results)} 件の結果を取得しました")
+            await self._call_cache(
+                cache,
+                cache.set,
+                cache_params[i],
+                lookups[i][0],
+                [result.model_dump() for result in search_results]
+            )
+            results[i] = search_results
+        return results
+    
+    async def _retrieve(
+        self,
+        queries: List[str],
+        n_results: int,
+        mode: str,
+        scope: "SearchScope"
+    ) -> List[List[Hit]]:
+        """各クエリの (チャンクID, 本文, メタデータ, スコア) をスコア順に取得"""
+        candidates = n_results
+        if mode == "hybrid":
+            candidates = n_results * max(1, settings.HYBRID_CANDIDATE_MULTIPLIER)
+        
+        async def no_hits() -> List[list]:
+            return [[] for _ in queries]
+        
+        vector_hits, lexical_hits = await asyncio.gather(
+            self._query_vectors(queries, candidates, scope.where) if mode != "lexical" else no_hits(),
+            self._query_lexical(queries, candidates, scope.filenames) if mode != "vector" else no_hits()
+        )
+        if mode == "vector":
+            return await self._current_hits(vector_hits)
+        
+        if mode == "lexical":
+            rankings = [self._normalize_lexical_scores(hits) for hits in lexical_hits]
+        else:
+            rankings = [
+                self._fuse_rankings(vector, lexical, n_results)
+                for vector, lexical in zip(vector_hits, lexical_hits)
+            ]
+        
+        # ベクトル検索で取得済みでないチャンクの本文・メタデータを、全クエリ分まとめて取得
+        chunks = {hit[0]: (hit[1], hit[2]) for hits in vector_hits for hit in hits}
+        missing = list(dict.fromkeys(
+            chunk_id for ranking in rankings for chunk_id, _ in ranking if chunk_id not in chunks
+        ))
+        chunks.update(await self._fetch_chunks(missing))
+        return await self._current_hits([
+            [(chunk_id, *chunks[chunk_id], score) for chunk_id, score in ranking if chunk_id in chunks]
+            for ranking in rankings
+        ])
+    
+    async def _current_hits(self, hits_per_query: List[List[Hit]]) -> List[List[Hit]]:
+        """カタログの世代と一致するチャンクのみを残す（取り込み中・失敗して残った世代を除く）"""
+        filenames = {hit[2].get("filename") for hits in hits_per_query for hit in hits}
+        if not filenames:
+            return hits_per_query
+        await self._ensure_document_catalog()
+        generations = await executor_service.run_io(self.document_catalog.get_generations, filenames)
+        return [[hit for hit in hits if is_current_chunk(hit[2], generations)] for hits in hits_per_query]
+    
+    @staticmethod
+    def _fuse_rankings(
+        vector_hits: List[Hit],
+        lexical_hits: List[Tuple[str, float]],
+        n_results: int
+    ) -> List[Tuple[str, float]]:
+        """ベクトル検索と語彙検索の順位を Reciprocal Rank Fusion で融合
+        
+        スコアの尺度が異なるため、各検索の順位 r から 1 / (k + r) を足し合わせた値で順位を決める。
+        返すスコアは両方の検索で1位の場合を 1.0 とするよう正規化し、vector と同じ [0, 1] に揃える。
+        """
+        fused: Dict[str, float] = {}
+        rankings = ([hit[0] for hit in vector_hits], [hit[0] for hit in lexical_hits])
+        for ranking in rankings:
+            for rank, chunk_id in enumerate(ranking, 1):
+                fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (settings.HYBRID_RRF_K + rank)
+        best = len(rankings) / (settings.HYBRID_RRF_K + 1)
+        top_ids = sorted(fused, key=fused.get, reverse=True)[:n_results]
+        return [(chunk_id, fused[chunk_id] / best) for chunk_id in top_ids]
+    
+    @staticmethod
+    def _normalize_lexical_scores(lexical_hits: List[Tuple[str, float]]) -> List[Tuple[str, float]]:
+        """BM25スコアを [0, 1] に正規化
+        
+        BM25スコアには上限がないため、hybrid と同様にクエリごとの1位を 1.0 とした値で返す。
+        """
+        if not lexical_hits or lexical_hits[0][1] <= 0:
+            return lexical_hits
+        best = lexical_hits[0][1]
+        return [(chunk_id, score / best) for chunk_id, score in lexical_hits]
+    
+    async def _build_results(
+        self,
+        query: str,
+        hits: List[Hit],
+        n_results: int,
+        group_by: Optional[str],
+        mmr: bool,
+        mmr_lambda: float
+    ) -> List[SearchResult]:
+        """ヒットをまとめ・選び直して検索結果に整形"""
+        matched_chunks: Dict[str, int] = {}
+        if group_by == "file":
+            hits, matched_chunks = group_hits_by_file(hits)
+        if mmr:
+            hits = await self._diversify(query, hits, n_results, mmr_lambda)
+        
+        search_results = [
+            SearchResult(
+                filename=metadata.get('filename', 'unknown'),
+                content=doc,
+                score=score,
+                display_name=metadata.get('display_name') or metadata.get('filename', 'unknown'),
+                metadata=metadata,
+                matched_chunks=matched_chunks.get(chunk_id)
+            )
+            for chunk_id, doc, metadata, score in hits
+        ]
+        
+        # スコアでソート（MMRの場合は選択順を保つ）
+        if not mmr:
+            search_results.sort(key=lambda x: x.score, reverse=True)
+        return search_results[:n_results]
+    
+    async def _diversify(self, query: str, hits: List[Hit], n_results: int, mmr_lambda: float) -> List[Hit]:
+        """候補のチャンクの埋め込みを使い、MMRで n_results 件を選び直す"""
+        if len(hits) <= 1:
+            return hits
+        query_embedding = (await self._encode_queries([query]))[0]
+        results = await executor_service.run_io(
+            self.vector_store.get,
+            ids=[hit[0] for hit in hits],
+            include=["embeddings"]
+        )
+        vectors = dict(zip(results['ids'], results['embeddings']))
+        hits = [hit for hit in hits if hit[0] in vectors]
+        embeddings = np.array([vectors[hit[0]] for hit in hits], dtype=np.float32)
+        selected = maximal_marginal_relevance(query_embedding, embeddings, n_results, mmr_lambda)
+        return [hits[index] for index in selected]
+    
+    async def _query_vectors(
+        self,
+        queries: List[str],
+        n_results: int,
+        where: Optional[Dict[str, Any]] = None
+    ) -> List[List[Hit]]:
+        """ベクトル検索で各クエリの (チャンクID, 本文, メタデータ, スコア) を類似度順に取得"""
+        # クエリを埋め込みベクトルに変換
+        query_embeddings = await self._encode_queries(queries)
+        
+        # コレクションで検索（全クエリを1回で問い合わせ）
+        results = await executor_service.run_io(
+            self.vector_store.query,
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where
+        )
+        
+        hits_per_query = []
+        for i in range(len(queries)):
+            hits = []
             if results['documents'] and results['metadatas'] and results['distances']:
-                for i, (doc, metadata, distance) in enumerate(zip(
-                    results['documents'][0], 
-                    results['metadatas'][0], 
-                    results['distances'][0]
-                )):
+                for chunk_id, doc, metadata, distance in zip(
+                    results['ids'][i],
+                    results['documents'][i],
+                    results['metadatas'][i],
+                    results['distances'][i]
+                ):
                     # 距離をスコアに変換（距離が小さいほどスコアが高い）
-                    score = 1.0 / (1.0 + distance)
-                    
-                    search_results.append(SearchResult(
-                        filename=metadata.get('filename', 'unknown'),
-                        content=doc,
-                        score=score,
-                        metadata=metadata
-                    ))
+                    hits.append((chunk_id, doc, metadata, 1.0 / (1.0 + distance)))
+            hits_per_query.append(hits)
+        return hits_per_query
+    
+    async def _query_lexical(
+        self,
+        queries: List[str],
+        n_results: int,
+        filenames: Optional[List[str]] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """語彙インデックスで各クエリの (チャンクID, BM25スコア) をスコア順に取得"""
+        await self._ensure_lexical_index()
+        return await executor_service.run_io(
+            lambda: [self.lexical_index.search(query, n_results, filenames) for query in queries]
+        )
+    
+    async def rank_candidates(
+        self,
+        job_description: str,
+        top_k: int = 20,
+        aggregation: str = "max_mean",
+        filters: Optional[SearchFilters] = None
+    ) -> Tuple[int, List[CandidateMatch]]:
+        """求人票とすべてのスキルシートの類似度を計算し、候補者をランキング
+        
+        求人票を取り込み時と同じチャンク分割器で分割し、全チャンクの埋め込み行列との
+        類似度をまとめて計算してファイル単位に集約する。
+        (求人票のチャンク数, スコア上位 top_k 件の候補者) を返す。
+        """
+        if aggregation not in AGGREGATIONS:
+            raise ValueError(f"サポートされていない集約方法: {aggregation}")
+        try:
+            requirements = create_chunker().split(job_description)
+            if not requirements:
+                return 0, []
             
-            # スコアでソート
-            search_results.sort(key=lambda x: x.score, reverse=True)
+            query_embeddings, matrix = await asyncio.gather(
+                executor_service.run_cpu(
+                    self.embedding_backend.encode,
+                    requirements,
+                    batch_size=settings.EMBEDDING_BATCH_SIZE,
+                    convert_to_numpy=True
+                ),
+                self._get_corpus_matrix()
+            )
+            scores, per_requirement = await executor_service.run_cpu(matrix.score_files, query_embeddings, aggregation)
             
-            logger.info(f"検索クエリ '{query}' で {len(search_results)} 件の結果を取得しました")
-            return search_results
+            ranked = [int(index) for index in np.argsort(-scores, kind="stable")]
+            if filters is not None:
+                scope = await self._resolve_filters(filters)
+                if scope is None:
+                    return len(requirements), []
+                if scope.filenames is not None:
+                    allowed = set(scope.filenames)
+                    ranked = [index for index in ranked if matrix.filenames[index] in allowed]
+            ranked = ranked[:top_k]
+            
+            # 上位の候補者のみ、最も近いチャンクの本文を取得
+            best_chunk_ids = [matrix.best_chunk_id(index, query_embeddings) for index in ranked]
+            chunks = await self._fetch_chunks(best_chunk_ids)
+            candidates = [
+                CandidateMatch(
+                    filename=matrix.filenames[index],
+                    score=float(scores[index]),
+                    display_name=(
+                        chunks[chunk_id][1].get("display_name") if chunk_id in chunks else None
+                    ) or matrix.filenames[index],
+                    requirement_scores=per_requirement[index].tolist(),
+                    best_chunk=chunks[chunk_id][0] if chunk_id in chunks else None
+                )
+                for index, chunk_id in zip(ranked, best_chunk_ids)
+            ]
+            logger.info(
+                f"求人票（{len(requirements)}チャンク）で {len(matrix.filenames)} 件のスキルシートをランキングしました"
+            )
+            return len(requirements), candidates
             
         except Exception as e:
-            logger.error(f"検索エラー: {str(e)}")
-            return []
+            logger.error(f"候補者ランキングエラー: {str(e)}")
+            raise
     
-    def _split_text_into_chunks(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
-        """テキストをチャンクに分割"""
-        chunks = []
-        start = 0
+    async def _get_corpus_matrix(self) -> CorpusMatrix:
+        """全チャンクの埋め込み行列を取得（コレクションが変わるまで再利用）"""
+        await self._ensure_document_catalog()
+        async with self._corpus_matrix_lock:
+            # 読み込み中の書き込みを取りこぼさないよう、バージョンは読み込み前に取得
+            version = await self._call_cache(self.search_result_cache, self.search_result_cache.current_version)
+            count = await executor_service.run_io(self.vector_store.count)
+            key = (version, count)
+            if self._corpus_matrix is None or self._corpus_matrix[0] != key:
+                matrix = await executor_service.run_io(self._load_corpus_matrix)
+                self._corpus_matrix = (key, matrix)
+            return self._corpus_matrix[1]
+    
+    def _load_corpus_matrix(self, page_size: int = 5000) -> CorpusMatrix:
+        """コレクションの全チャンク（カタログの世代のもの）の埋め込みを読み込む"""
+        generations = self.document_catalog.get_generations()
+        ids: List[str] = []
+        filenames: List[str] = []
+        embeddings: List[List[float]] = []
+        offset = 0
+        while True:
+            page = self.vector_store.get(include=["embeddings", "metadatas"], limit=page_size, offset=offset)
+            for chunk_id, metadata, embedding in zip(page["ids"], page["metadatas"], page["embeddings"]):
+                if is_current_chunk(metadata, generations):
+                    ids.append(chunk_id)
+                    filenames.append(metadata["filename"])
+                    embeddings.append(embedding)
+            if len(page["ids"]) < page_size:
+                break
+            offset += page_size
         
-        while start < len(text):
-            end = start + chunk_size
-            
-            # チャンクの境界を調整（単語の境界で分割）
-            if end < len(text):
-                # 次の単語の境界を探す
-                while end < len(text) and text[end] != ' ' and text[end] != '\n':
-                    end += 1
-            
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            
-            # オーバーラップを考慮して次の開始位置を設定
-            start = end - overlap
-            if start >= len(text):
+        matrix = CorpusMatrix(ids, filenames, np.array(embeddings, dtype=np.float32))
+        logger.info(f"埋め込み行列を読み込みました（{len(matrix)} チャンク、{len(matrix.filenames)} ファイル）")
+        return matrix
+    
+    async def _resolve_filters(self, filters: Optional[SearchFilters]) -> Optional["SearchScope"]:
+        """絞り込み条件を ChromaDB の where 句と語彙検索用のファイル名一覧に変換
+        
+        一致するファイルが1つもない場合は None を返す。
+        """
+        if filters is None or not any(filters.model_dump().values()):
+            return SearchScope()
+        
+        # 語彙インデックスにはファイル名しかないため、条件に一致するファイルをカタログから求める
+        await self._ensure_document_catalog()
+        filenames = await executor_service.run_io(
+            self.document_catalog.find_filenames,
+            patterns=filters.filename,
+            source=filters.source,
+            file_type=filters.file_type,
+            ingested_from=filters.ingested_from,
+            ingested_to=filters.ingested_to
+        )
+        if not filenames:
+            return None
+        
+        conditions: List[Dict[str, Any]] = []
+        if filters.filename:
+            # ChromaDB の where 句はワイルドカードを扱えないため、一致したファイル名の $in に展開
+            conditions.append({"filename": {"$in": filenames}})
+        if filters.source:
+            conditions.append({"source": filters.source})
+        if filters.file_type:
+            conditions.append({"file_type": filters.file_type.lower().lstrip(".")})
+        if filters.ingested_from:
+            conditions.append({"ingested_at": {"$gte": int(filters.ingested_from.timestamp())}})
+        if filters.ingested_to:
+            conditions.append({"ingested_at": {"$lte": int(filters.ingested_to.timestamp())}})
+        where = conditions[0] if len(conditions) == 1 else {"$and": conditions}
+        return SearchScope(where=where, filenames=filenames)
+    
+    async def _fetch_chunks(self, chunk_ids: List[str]) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+        """チャンクIDから本文とメタデータを取得"""
+        if not chunk_ids:
+            return {}
+        results = await executor_service.run_io(
+            self.vector_store.get,
+            ids=chunk_ids,
+            include=["documents", "metadatas"]
+        )
+        return {
+            chunk_id: (doc, metadata)
+            for chunk_id, doc, metadata in zip(results['ids'], results['documents'], results['metadatas'])
+        }
+    
+    async def _ensure_lexical_index(self) -> None:
+        """語彙インデックス導入前に取り込まれたチャンクがあれば、一度だけコレクションから構築"""
+        if self._lexical_index_checked:
+            return
+        if await executor_service.run_io(self.lexical_index.is_empty):
+            if await executor_service.run_io(self.vector_store.count):
+                await executor_service.run_io(self._rebuild_lexical_index)
+        self._lexical_index_checked = True
+    
+    def _rebuild_lexical_index(self, page_size: int = 1000) -> None:
+        """コレクションの全チャンクを語彙インデックスに登録"""
+        offset = 0
+        while True:
+            page = self.vector_store.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            if page["ids"]:
+                self.lexical_index.upsert(page["ids"], page["metadatas"], page["documents"])
+            if len(page["ids"]) < page_size:
                 break
+            offset += page_size
+        logger.info(f"語彙インデックスを構築しました（{offset + len(page['ids'])} チャンク）")
+    
+    async def _encode_queries(self, queries: List[str]) -> np.ndarray:
+        """クエリを埋め込みベクトルに変換（キャッシュにないクエリのみまとめて計算）"""
+        normalized = [normalize_query(query) for query in queries]
+        cache = self.query_embedding_cache
+        
+        embeddings: Dict[str, np.ndarray] = {}
+        for key in dict.fromkeys(normalized):
+            embedding = cache.get_local(key)
+            if embedding is None:
+                embedding = await self._call_cache(cache, cache.get_remote, key)
+            if embedding is not None:
+                embeddings[key] = embedding
         
-        return chunks
+        missing = [key for key in dict.fromkeys(normalized) if key not in embeddings]
+        if missing:
+            encoded = await executor_service.run_cpu(
+                self.embedding_backend.encode,
+                missing,
+                batch_size=settings.EMBEDDING_BATCH_SIZE,
+                convert_to_numpy=True
+            )
+            for key, embedding in zip(missing, encoded):
+                embeddings[key] = embedding
+                await self._call_cache(cache, cache.set, key, embedding)
+        return np.stack([embeddings[key] for key in normalized])
+    
+    async def _call_cache(self, cache: Any, func: Callable[..., Any], *args: Any) -> Any:
+        """キャッシュ操作を実行（Redisへのアクセスはネットワーク待ちが発生するためI/Oプールで実行）"""
+        if cache.redis is not None:
+            return await executor_service.run_io(func, *args)
+        return func(*args)
+    
+    async def _invalidate_search_cache(self) -> None:
+        """コレクションへの書き込み後に検索結果キャッシュを無効化"""
+        await self._call_cache(self.search_result_cache, self.search_result_cache.bump_version)
+    
+    def _split_text_into_chunks(self, text: str) -> List[str]:
+        """テキストをチャンクに分割（分割方式は Settings.CHUNK_STRATEGY）"""
+        return create_chunker().split(text)
     
     async def get_collection_info(self) -> Dict[str, Any]:
-        """コレクション情報を取得"""
+        """コレクション情報を取得（ファイル別の統計情報カタログから応答）"""
         try:
-            count = self.collection.count()
-            
-            # ファイル別の統計情報
-            results = self.collection.query(
-                query_texts=[""],
-                n_results=1000
-            )
-            
-            file_stats = {}
-            if results['metadatas']:
-                for metadata in results['metadatas'][0]:
-                    filename = metadata.get('filename', 'unknown')
-                    if filename not in file_stats:
-                        file_stats[filename] = {
-                            'chunks': 0,
-                            'total_size': 0
-                        }
-                    file_stats[filename]['chunks'] += 1
-                    file_stats[filename]['total_size'] += metadata.get('chunk_size', 0)
-            
-            return {
-                "total_documents": count,
-                "files": len(file_stats),
-                "file_statistics": file_stats
-            }
+            await self._ensure_document_catalog()
+            return await executor_service.run_io(self.document_catalog.get_summary)
             
         except Exception as e:
             logger.error(f"コレクション情報取得エラー: {str(e)}")
             return {}
     
+    async def _ensure_document_catalog(self) -> None:
+        """カタログ導入前に取り込まれたチャンクがあれば、一度だけメタデータからカタログを再構築"""
+        if not await executor_service.run_io(self.document_catalog.is_empty):
+            return
+        async with self._catalog_rebuild_lock:
+            if (
+                await executor_service.run_io(self.document_catalog.is_empty)
+                and await executor_service.run_io(self.vector_store.count)
+            ):
+                await executor_service.run_io(self._rebuild_document_catalog)
+    
+    def _rebuild_document_catalog(self, page_size: int = 5000) -> None:
+        """コレクションのメタデータを走査してファイル別の統計情報を再構築
+        
+        取り込み元・取り込み日時はチャンクのメタデータにあればそれを使う（ない場合は "unknown"・再構築時刻）。
+        複数の世代のチャンクが残っているファイルは、取り込み日時が最も新しい世代を登録する。
+        """
+        # ファイル名 → 世代 → 統計情報
+        file_stats: Dict[str, Dict[Optional[str], Dict[str, Any]]] = {}
+        offset = 0
+        while True:
+            page = self.vector_store.get(include=["metadatas"], limit=page_size, offset=offset)
+            metadatas = page["metadatas"] or []
+            for metadata in metadatas:
+                filename = metadata.get("filename", "unknown")
+                stats = file_stats.setdefault(filename, {}).setdefault(
+                    metadata.get("generation"),
+                    {
+                        "chunks": 0,
+                        "total_size": 0,
+                        "file_path": metadata.get("file_path"),
+                        "display_name": metadata.get("display_name"),
+                        "source": None,
+                        "ingested_at": None
+                    }
+                )
+                stats["chunks"] += 1
+                stats["total_size"] += metadata.get("chunk_size", 0)
+                stats["source"] = stats["source"] or metadata.get("source")
+                if metadata.get("ingested_at") is not None:
+                    stats["ingested_at"] = max(stats["ingested_at"] or 0, metadata["ingested_at"])
+            if len(metadatas) < page_size:
+                break
+            offset += page_size
+        
+        for filename, generations in file_stats.items():
+            generation, stats = max(generations.items(), key=lambda item: item[1]["ingested_at"] or 0)
+            self.document_catalog.upsert(
+                filename,
+                stats["chunks"],
+                stats["total_size"],
+                stats["source"] or "unknown",
+                stats["file_path"],
+                datetime.fromtimestamp(stats["ingested_at"]) if stats["ingested_at"] is not None else None,
+                generation,
+                stats["display_name"]
+            )
+        logger.info(f"ファイル別の統計情報を再構築しました（{len(file_stats)} ファイル）")
+    
     async def clear_collection(self) -> bool:
         """コレクションをクリア"""
         try:
-            self.chroma_client.delete_collection(self.collection_name)
-            self.collection = self.chroma_client.create_collection(
-                name=self.collection_name,
-                metadata={"description": "スキルシートのRAG検索用コレクション"}
-            )
+            await executor_service.run_io(self.vector_store.clear)
+            await executor_service.run_io(self.lexical_index.clear)
+            await executor_service.run_io(self.document_catalog.clear)
+            await self._invalidate_search_cache()
             logger.info("コレクションをクリアしました")
             return True
             
@@ -0,0 +1,127 @@
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+# 検索ヒット: (チャンクID, 本文, メタデータ, スコア)
+Hit = Tuple[str, str, Dict[str, Any], float]
+
+
+def group_hits_by_file(hits: List[Hit]) -> Tuple[List[Hit], Dict[str, int]]:
+    """スコア順のヒットをファイル単位にまとめる
+
+    各ファイルの最もスコアの高いチャンクを代表とし、ファイルのスコアはその値とする。
+    代表チャンクのID → そのファイルでヒットしたチャンク数 も返す。
+    """
+    grouped: List[Hit] = []
+    representatives: Dict[str, str] = {}
+    matched_chunks: Dict[str, int] = {}
+    for hit in sorted(hits, key=lambda hit: hit[3], reverse=True):
+        filename = hit[2].get("filename", "unknown")
+        if filename not in representatives:
+            representatives[filename] = hit[0]
+            matched_chunks[hit[0]] = 0
+            grouped.append(hit)
+        matched_chunks[representatives[filename]] += 1
+    return grouped, matched_chunks
+
+
+def maximal_marginal_relevance(
+    query_embedding: np.ndarray,
+    embeddings: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.7
+) -> List[int]:
+    """Maximal Marginal Relevance で多様性を考慮して k 件を選ぶ
+
+    各ステップで「クエリとの類似度 × λ − 選択済みとの最大類似度 × (1 − λ)」が最大の候補を選ぶ。
+    選択済みとの最大類似度はステップごとに1行分だけ更新するため、計算量は O(k・n・次元数)。
+    選択順の候補インデックスを返す。
+    """
+    if len(embeddings) == 0 or k <= 0:
+        return []
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = vectors @ query
+    max_similarity = np.full(len(vectors), -np.inf, dtype=np.float32)
+    available = np.ones(len(vectors), dtype=bool)
+    selected: List[int] = []
+    for _ in range(min(k, len(vectors))):
+        if selected:
+            scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_similarity
+        else:
+            scores = relevance.copy()
+        scores[~available] = -np.inf
+        index = int(np.argmax(scores))
+        selected.append(index)
+        available[index] = False
+        max_similarity = np.maximum(max_similarity, vectors @ vectors[index])
+    return selected
+
+
+# 求人票とスキルシートの類似度の集約方法
+#   max_mean: 求人票の各チャンクについてファイル内で最も近いチャンクとの類似度を求め、その平均
+#   max: ファイル内のチャンクと求人票のチャンクの組で最も高い類似度
+#   mean: ファイル内の全チャンクと求人票の全チャンクの類似度の平均
+AGGREGATIONS = ("max_mean", "max", "mean")
+
+
+class CorpusMatrix:
+    """コレクションの全チャンクの埋め込み行列
+
+    行を正規化し、同じファイルのチャンクが連続した行になるよう並べて保持する。
+    ファイル単位の集約は np.maximum.reduceat などで一度に計算する。
+    """
+
+    def __init__(self, ids: List[str], filenames: List[str], embeddings: np.ndarray):
+        order = sorted(range(len(ids)), key=lambda i: filenames[i])
+        self.ids = [ids[i] for i in order]
+        self.embeddings = _normalize_rows(np.asarray(embeddings, dtype=np.float32)[order]) if ids else None
+
+        sorted_filenames = [filenames[i] for i in order]
+        self.filenames: List[str] = []
+        starts = []
+        for row, filename in enumerate(sorted_filenames):
+            if not self.filenames or self.filenames[-1] != filename:
+                self.filenames.append(filename)
+                starts.append(row)
+        self.starts = np.array(starts, dtype=np.int64)
+        self.counts = np.diff(np.append(self.starts, len(self.ids)))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def score_files(
+        self,
+        query_embeddings: np.ndarray,
+        aggregation: str = "max_mean"
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """ファイルごとのスコア (ファイル数,) と、求人票の各チャンクとの最大類似度 (ファイル数, チャンク数) を計算"""
+        queries = _normalize_rows(np.asarray(query_embeddings, dtype=np.float32))
+        if not self.ids:
+            return np.zeros(0, dtype=np.float32), np.zeros((0, len(queries)), dtype=np.float32)
+
+        similarity = self.embeddings @ queries.T
+        per_requirement = np.maximum.reduceat(similarity, self.starts, axis=0)
+        if aggregation == "max_mean":
+            scores = per_requirement.mean(axis=1)
+        elif aggregation == "max":
+            scores = per_requirement.max(axis=1)
+        elif aggregation == "mean":
+            scores = np.add.reduceat(similarity, self.starts, axis=0).mean(axis=1) / self.counts
+        else:
+            raise ValueError(f"サポートされていない集約方法: {aggregation}")
+        return scores, per_requirement
+
+    def best_chunk_id(self, file_index: int, query_embeddings: np.ndarray) -> str:
+        """ファイル内で求人票のいずれかのチャンクに最も近いチャンクのID"""
+        start = int(self.starts[file_index])
+        end = start + int(self.counts[file_index])
+        similarity = self.embeddings[start:end] @ _normalize_rows(np.asarray(query_embeddings, dtype=np.float32)).T
+        return self.ids[start + int(np.argmax(similarity.max(axis=1)))]
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
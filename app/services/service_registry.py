@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Generic, Optional, TypeVar
+
+from ..services.executor import executor_service
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class LazyService(Generic[T]):
+    """初回利用時（またはウォームアップ時）に1度だけ作成されるサービス
+
+    作成処理（モデルの読み込み・外部サービスへの接続など）はI/Oプールで実行し、
+    イベントループを止めない。作成中に届いたリクエストは同じ作成処理の完了を待つ。
+    作成に失敗した場合は次回の利用時に再度作成を試みる。
+    """
+
+    def __init__(self, name: str, factory: Callable[[], T], required: bool = True):
+        self.name = name
+        self.factory = factory
+        self.required = required  # False の場合は作成に失敗しても準備完了とみなす
+        self.status = "pending"  # "pending", "loading", "ready", "failed"
+        self.error: Optional[str] = None
+        self.started_at: Optional[datetime] = None
+        self.duration_seconds: Optional[float] = None
+        self._instance: Optional[T] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def get(self) -> T:
+        """サービスを取得（未作成の場合は作成を待つ）"""
+        if self._instance is not None:
+            return self._instance
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._create())
+        # 待っているリクエストがキャンセルされても作成処理は続ける
+        return await asyncio.shield(self._task)
+
+    async def _create(self) -> T:
+        self.status = "loading"
+        self.error = None
+        self.started_at = datetime.now()
+        start = time.perf_counter()
+        try:
+            instance = await executor_service.run_io(self.factory)
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+            self.duration_seconds = time.perf_counter() - start
+            self._task = None
+            logger.error(f"サービス '{self.name}' の初期化エラー: {str(e)}")
+            raise
+        self._instance = instance
+        self.status = "ready"
+        self.duration_seconds = time.perf_counter() - start
+        logger.info(f"サービス '{self.name}' を初期化しました（{self.duration_seconds:.2f}秒）")
+        return instance
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "required": self.required,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "duration_seconds": round(self.duration_seconds, 3) if self.duration_seconds is not None else None,
+            "error": self.error,
+        }
+
+
+class ServiceRegistry:
+    """アプリケーションのサービス一覧とウォームアップ状況の管理"""
+
+    def __init__(self):
+        self.services: Dict[str, LazyService] = {}
+
+    def register(self, name: str, factory: Callable[[], T], required: bool = True) -> LazyService[T]:
+        service = LazyService(name, factory, required)
+        self.services[name] = service
+        return service
+
+    async def warm_up(self) -> None:
+        """すべてのサービスを並行して作成"""
+        await asyncio.gather(
+            *[service.get() for service in self.services.values()],
+            return_exceptions=True
+        )
+
+    @property
+    def ready(self) -> bool:
+        return all(service.status == "ready" for service in self.services.values() if service.required)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "services": {name: service.get_status() for name, service in self.services.items()},
+        }
@@ -0,0 +1,63 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+
+class UploadIndex:
+    """アップロードされたファイル名 → 内容のハッシュ（SHA-256）の対応表
+
+    ファイルの実体はハッシュ名の1つのファイル（blob）として保存し、ファイル名はその
+    ハードリンクとする。同じ内容のファイルは何度アップロードされてもディスクを消費しない。
+    どのファイル名からも参照されなくなった blob は削除してよい。
+    SQLite（WALモード）に保存するため、APIプロセスとワーカーの間で共有できる。
+    get・put・remove・is_referenced は transaction() の中で呼ぶ。
+    """
+
+    def __init__(self, db_path: Path):
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            " filename TEXT PRIMARY KEY,"
+            " sha256 TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " uploaded_at TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS uploads_sha256 ON uploads (sha256)")
+        self._conn.commit()
+
+    @contextmanager
+    def transaction(self) -> Iterator["UploadIndex"]:
+        """書き込みトランザクション（blob の作成・削除を他のプロセスと重ならないように行う）"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def get(self, filename: str) -> Optional[Tuple[str, int]]:
+        """ファイル名に対応する (ハッシュ, サイズ)"""
+        row = self._conn.execute("SELECT sha256, size FROM uploads WHERE filename = ?", (filename,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def put(self, filename: str, sha256: str, size: int) -> None:
+        """ファイル名とハッシュの対応を登録（同じファイル名の場合は置き換え）"""
+        self._conn.execute(
+            "INSERT OR REPLACE INTO uploads (filename, sha256, size, uploaded_at) VALUES (?, ?, ?, ?)",
+            (filename, sha256, size, datetime.now().isoformat())
+        )
+
+    def remove(self, filename: str) -> None:
+        self._conn.execute("DELETE FROM uploads WHERE filename = ?", (filename,))
+
+    def is_referenced(self, sha256: str) -> bool:
+        """いずれかのファイル名から参照されているか"""
+        return self._conn.execute("SELECT 1 FROM uploads WHERE sha256 = ? LIMIT 1", (sha256,)).fetchone() is not None
@@ -0,0 +1,610 @@
+"""チャンクの埋め込みベクトルの保存先
+
+- chroma: ChromaDB の PersistentClient（既定）
+- flat: 正規化した埋め込みを float16 / int8 でメモリマップファイルに並べ、
+  1回の行列積で厳密な top-k を求める。本文・メタデータは SQLite の別テーブルに保持する。
+  ファイルはページキャッシュを通じて uvicorn・Celery の全ワーカーで共有される。
+
+RAGService からは ChromaDB のコレクションと同じ呼び出し方（upsert・update・delete・get・query・count）で使う。
+
+ChromaDB のコレクションから flat への移行:
+    python -m app.services.vector_store migrate
+"""
+import argparse
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+VECTOR_STORES = ("chroma", "flat")
+COLLECTION_NAME = "skillsheets"
+
+# int8 で保存する場合の倍率（正規化済みベクトルの各成分は [-1, 1]）
+INT8_SCALE = 127.0
+
+
+def match_where(metadata: Dict[str, Any], where: Dict[str, Any]) -> bool:
+    """メタデータが ChromaDB 形式の where 句に一致するか"""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(match_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(match_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if not _compare(value, operator, operand):
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def _compare(value: Any, operator: str, operand: Any) -> bool:
+    if operator == "$eq":
+        return value == operand
+    if operator == "$ne":
+        return value != operand
+    if operator == "$in":
+        return value in operand
+    if operator == "$nin":
+        return value not in operand
+    if value is None:
+        return False
+    if operator == "$gt":
+        return value > operand
+    if operator == "$gte":
+        return value >= operand
+    if operator == "$lt":
+        return value < operand
+    if operator == "$lte":
+        return value <= operand
+    raise ValueError(f"サポートされていない演算子: {operator}")
+
+
+class _Snapshot(NamedTuple):
+    """FlatVectorStore の行の一覧（ある世代の時点）"""
+    generation: Optional[int]
+    matrix: Optional[np.memmap]
+    rows: np.ndarray  # 位置 → 行番号（行番号順）
+    ids: np.ndarray  # 位置 → チャンクID（object 配列）
+    metadatas: np.ndarray  # 位置 → メタデータ（object 配列）
+
+
+def _object_array(values: List[Any]) -> np.ndarray:
+    """要素を変換せずに並べた object 配列（差分の反映をポインタのコピーで済ませるため）"""
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+class VectorStore:
+    """埋め込みベクトルの保存先のインターフェース（ChromaDB のコレクションと同じ呼び出し方）"""
+
+    def upsert(self, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    def update(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None) -> None:
+        raise NotImplementedError
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        include: Sequence[str] = ("documents", "metadatas"),
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        where: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def query(self, query_embeddings: np.ndarray, n_results: int, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class ChromaVectorStore(VectorStore):
+    """ChromaDB のコレクション"""
+
+    def __init__(self, persist_dir: Optional[str] = None):
+        import chromadb
+        from chromadb.config import Settings as ChromaSettings
+
+        self.client = chromadb.PersistentClient(
+            path=persist_dir or settings.CHROMA_PERSIST_DIR,
+            settings=ChromaSettings(
+                anonymized_telemetry=False
+            )
+        )
+        try:
+            self.collection = self.client.get_collection(COLLECTION_NAME)
+            logger.info(f"既存のコレクション '{COLLECTION_NAME}' を取得しました")
+        except:
+            self.collection = self._create_collection()
+            logger.info(f"新しいコレクション '{COLLECTION_NAME}' を作成しました")
+
+    def _create_collection(self):
+        return self.client.create_collection(
+            name=COLLECTION_NAME,
+            metadata={"description": "スキルシートのRAG検索用コレクション"}
+        )
+
+    def upsert(self, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        self.collection.upsert(
+            ids=ids,
+            embeddings=np.asarray(embeddings, dtype=np.float32).tolist(),
+            documents=documents,
+            metadatas=metadatas
+        )
+
+    def update(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        self.collection.update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None) -> None:
+        self.collection.delete(ids=ids, where=where)
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        include: Sequence[str] = ("documents", "metadatas"),
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        where: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        return self.collection.get(ids=ids, include=list(include), limit=limit, offset=offset, where=where)
+
+    def query(self, query_embeddings: np.ndarray, n_results: int, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return self.collection.query(
+            query_embeddings=np.asarray(query_embeddings, dtype=np.float32).tolist(),
+            n_results=n_results,
+            where=where
+        )
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def clear(self) -> None:
+        self.client.delete_collection(COLLECTION_NAME)
+        self.collection = self._create_collection()
+
+
+class FlatVectorStore(VectorStore):
+    """メモリマップファイル上の埋め込み行列による厳密な近傍検索
+
+    - vectors.bin: 正規化した埋め込みを float16 または int8 で行ごとに並べたファイル
+    - rows.sqlite3: 行番号 → チャンクID・本文・メタデータ（JSON）、空き行と変更履歴の一覧
+
+    書き込みのたびに世代番号を進め、変更した行を変更履歴に記録する。各プロセスは世代番号が
+    変わった場合に、前回読み込んだ世代以降に変更された行のみを読み直す。
+    ベクトルはコミット済みの一覧から参照されていない行にのみ書き込み（既存のチャンクの置き換えも
+    新しい行に書く）、削除した行は検索中の他プロセスがまだ参照している可能性があるため、
+    世代が進みかつ FREE_ROW_REUSE_SECONDS が経過してから再利用する。
+    距離は ChromaDB の既定（L2距離の2乗）に合わせ、正規化済みベクトルの 2 − 2・cos を返す。
+    """
+
+    BLOCK_ROWS = 16384  # 行列積を float32 で計算する際の1ブロックの行数
+    CHANGE_LOG_GENERATIONS = 10000  # 変更履歴を残す世代数（これより古い一覧は全体を読み直す）
+    FREE_ROW_REUSE_SECONDS = 60.0  # 削除した行を再利用するまでの最短時間
+
+    def __init__(self, directory: Optional[str] = None, dtype: Optional[str] = None):
+        self.directory = Path(directory or settings.FLAT_VECTOR_STORE_DIR)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.directory / "vectors.bin"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.directory / "rows.sqlite3"), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rows ("
+            " row INTEGER PRIMARY KEY,"
+            " chunk_id TEXT NOT NULL UNIQUE,"
+            " document TEXT NOT NULL,"
+            " metadata TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS free_rows ("
+            " row INTEGER PRIMARY KEY,"
+            " freed_generation INTEGER NOT NULL DEFAULT 0,"
+            " freed_at REAL NOT NULL DEFAULT 0)"
+        )
+        # 空き行の削除時刻がない以前のファイルには列を追加（既存の空き行はすぐに再利用できる）
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(free_rows)")}
+        for column, definition in (("freed_generation", "INTEGER"), ("freed_at", "REAL")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE free_rows ADD COLUMN {column} {definition} NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS changes (generation INTEGER NOT NULL, row INTEGER NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS changes_generation ON changes (generation)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        # 変更履歴のない以前のファイルは、現在の世代から履歴を記録する
+        self._conn.execute(
+            "INSERT OR IGNORE INTO meta (key, value) "
+            "SELECT 'log_start', coalesce((SELECT value FROM meta WHERE key = 'generation'), '0')"
+        )
+        self._conn.commit()
+
+        stored_dtype = self._get_meta("dtype")
+        self.dtype = np.dtype(stored_dtype or dtype or settings.FLAT_VECTOR_DTYPE)
+        if self.dtype not in (np.dtype("float16"), np.dtype("int8")):
+            raise ValueError(f"サポートされていない保存形式: {self.dtype}")
+        if stored_dtype is None:
+            self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('dtype', ?)", (self.dtype.name,))
+            self._conn.commit()
+
+        # プロセス内に読み込んだ行の一覧（世代番号が変わるまで再利用）
+        self._snapshot = _Snapshot(None, None, np.zeros(0, dtype=np.int64), _object_array([]), _object_array([]))
+
+    def upsert(self, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        vectors = self._encode(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                dimension = self._ensure_dimension(vectors.shape[1])
+                generation = self._next_generation()
+                rows = []
+                changed = []
+                for chunk_id, document, metadata in zip(ids, documents, metadatas):
+                    existing = self._conn.execute("SELECT row FROM rows WHERE chunk_id = ?", (chunk_id,)).fetchone()
+                    if existing:
+                        # 他プロセスが参照している行は書き換えず、新しい行に移す
+                        self._free_row(existing[0], generation)
+                        changed.append(existing[0])
+                    row = self._allocate_row(generation)
+                    self._conn.execute(
+                        "INSERT INTO rows (row, chunk_id, document, metadata) VALUES (?, ?, ?, ?)",
+                        (row, chunk_id, document, json.dumps(metadata, ensure_ascii=False))
+                    )
+                    rows.append(row)
+                    changed.append(row)
+
+                # 書き込む行はどの世代の一覧からも参照されていないため、コミットに失敗しても既存のチャンクは変わらない
+                matrix = self._writable_matrix(max(rows) + 1, dimension)
+                matrix[rows] = vectors
+                matrix.flush()
+                del matrix
+                self._record_changes(generation, changed)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def update(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                generation = self._next_generation()
+                changed = []
+                for chunk_id, metadata in zip(ids, metadatas):
+                    existing = self._conn.execute("SELECT row FROM rows WHERE chunk_id = ?", (chunk_id,)).fetchone()
+                    if existing:
+                        self._conn.execute(
+                            "UPDATE rows SET metadata = ? WHERE row = ?",
+                            (json.dumps(metadata, ensure_ascii=False), existing[0])
+                        )
+                        changed.append(existing[0])
+                self._record_changes(generation, changed)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if where is not None:
+                    # 同時に追加されたチャンクも対象になるよう、書き込みロックを取得してから条件を評価
+                    snapshot = self._load_snapshot()
+                    matched = {snapshot.ids[position] for position in self._filter_positions(snapshot, where)}
+                    ids = [chunk_id for chunk_id in ids if chunk_id in matched] if ids is not None else list(matched)
+                generation = self._next_generation()
+                changed = []
+                for chunk_id in ids or []:
+                    existing = self._conn.execute("SELECT row FROM rows WHERE chunk_id = ?", (chunk_id,)).fetchone()
+                    if existing:
+                        self._free_row(existing[0], generation)
+                        changed.append(existing[0])
+                self._record_changes(generation, changed)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        include: Sequence[str] = ("documents", "metadatas"),
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        where: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        snapshot = self._refresh()
+        if ids is not None:
+            positions = self._positions_of(snapshot, ids)
+            if where is not None:
+                positions = [position for position in positions if match_where(snapshot.metadatas[position], where)]
+        else:
+            positions = self._filter_positions(snapshot, where) if where is not None else range(len(snapshot.ids))
+            start = offset or 0
+            end = len(positions) if limit is None else start + limit
+            positions = list(positions[start:end])
+        return self._build_result(snapshot, positions, include)
+
+    def query(self, query_embeddings: np.ndarray, n_results: int, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        snapshot = self._refresh()
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        results: Dict[str, List[list]] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+
+        candidates = self._filter_positions(snapshot, where) if where is not None else None
+        positions = np.arange(len(snapshot.ids)) if candidates is None else np.asarray(candidates, dtype=np.int64)
+        if len(positions) == 0:
+            for _ in queries:
+                for key in results:
+                    results[key].append([])
+            return results
+
+        similarity = self._similarity(snapshot.matrix, snapshot.rows[positions], queries)
+        k = min(n_results, len(positions))
+        for scores in similarity:
+            top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+            top = top[np.argsort(-scores[top], kind="stable")]
+            result = self._build_result(snapshot, [int(positions[i]) for i in top], ("documents", "metadatas"))
+            results["ids"].append(result["ids"])
+            results["documents"].append(result["documents"])
+            results["metadatas"].append(result["metadatas"])
+            results["distances"].append([float(2.0 - 2.0 * scores[i]) for i in top])
+        return results
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                generation = self._next_generation()
+                self._conn.execute("DELETE FROM rows")
+                self._conn.execute("DELETE FROM free_rows")
+                self._conn.execute("DELETE FROM changes")
+                self._conn.execute("DELETE FROM meta WHERE key IN ('dimension', 'capacity')")
+                if self.vectors_path.exists():
+                    self.vectors_path.unlink()
+                # 変更履歴を消したため、以前の世代の一覧は全体を読み直す
+                self._set_meta("generation", generation)
+                self._set_meta("log_start", generation)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        if self.dtype == np.dtype("int8"):
+            return np.clip(np.rint(vectors * INT8_SCALE), -127, 127).astype(np.int8)
+        return vectors.astype(np.float16)
+
+    def _decode(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = vectors.astype(np.float32)
+        if self.dtype == np.dtype("int8"):
+            vectors /= INT8_SCALE
+        return vectors
+
+    def _similarity(self, matrix: np.memmap, rows: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """指定した行とクエリのコサイン類似度 (クエリ数, 行数)（ブロック単位で float32 に変換して計算）"""
+        similarity = np.empty((len(queries), len(rows)), dtype=np.float32)
+        # 空き行がなければ先頭からの連続した範囲をそのまま読む（コピーなし）
+        contiguous = int(rows[-1]) == len(rows) - 1
+        for start in range(0, len(rows), self.BLOCK_ROWS):
+            end = min(start + self.BLOCK_ROWS, len(rows))
+            block = matrix[start:end] if contiguous else matrix[rows[start:end]]
+            similarity[:, start:end] = queries @ self._decode(block).T
+        return similarity
+
+    def _filter_positions(self, snapshot: _Snapshot, where: Dict[str, Any]) -> List[int]:
+        return [position for position, metadata in enumerate(snapshot.metadatas) if match_where(metadata, where)]
+
+    def _positions_of(self, snapshot: _Snapshot, ids: List[str]) -> List[int]:
+        """チャンクIDの一覧内の位置（行番号を SQLite で引き、行番号順の一覧を二分探索）"""
+        with self._lock:
+            rows_by_id = dict(self._conn.execute(
+                "SELECT chunk_id, row FROM rows WHERE chunk_id IN (SELECT value FROM json_each(?))",
+                (json.dumps(ids, ensure_ascii=False),)
+            ).fetchall())
+        positions = []
+        for chunk_id in ids:
+            row = rows_by_id.get(chunk_id)
+            if row is None:
+                continue
+            position = int(np.searchsorted(snapshot.rows, row))
+            # 一覧の読み込み後に移動・追加されたチャンクは一覧にないものとして扱う
+            if position < len(snapshot.rows) and snapshot.rows[position] == row and snapshot.ids[position] == chunk_id:
+                positions.append(position)
+        return positions
+
+    def _build_result(self, snapshot: _Snapshot, positions: List[int], include: Sequence[str]) -> Dict[str, Any]:
+        rows = snapshot.rows[positions]
+        result: Dict[str, Any] = {"ids": [snapshot.ids[position] for position in positions]}
+        if "metadatas" in include:
+            result["metadatas"] = [snapshot.metadatas[position] for position in positions]
+        if "documents" in include:
+            result["documents"] = self._fetch_documents([int(row) for row in rows])
+        if "embeddings" in include:
+            result["embeddings"] = self._decode(snapshot.matrix[rows]).tolist() if len(rows) else []
+        return result
+
+    def _fetch_documents(self, rows: List[int]) -> List[str]:
+        documents: Dict[int, str] = {}
+        with self._lock:
+            for start in range(0, len(rows), 500):
+                batch = rows[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                documents.update(self._conn.execute(
+                    f"SELECT row, document FROM rows WHERE row IN ({placeholders})", batch
+                ).fetchall())
+        return [documents.get(row, "") for row in rows]
+
+    def _refresh(self) -> _Snapshot:
+        """世代番号が変わっていれば行の一覧とメモリマップを読み直す"""
+        with self._lock:
+            return self._load_snapshot()
+
+    def _load_snapshot(self) -> _Snapshot:
+        """行の一覧を最新の世代に更新（self._lock を保持して呼ぶ）
+
+        前回読み込んだ世代の変更履歴が残っていれば、変更された行のみを読み直して一覧に反映する。
+        """
+        generation = int(self._get_meta("generation") or 0)
+        previous = self._snapshot
+        if generation == previous.generation:
+            return previous
+        log_start = int(self._get_meta("log_start") or 0)
+
+        if previous.generation is not None and previous.generation >= log_start:
+            changed = [row for (row,) in self._conn.execute(
+                "SELECT DISTINCT row FROM changes WHERE generation > ?", (previous.generation,)
+            ).fetchall()]
+            records = self._conn.execute(
+                "SELECT row, chunk_id, metadata FROM rows WHERE row IN (SELECT value FROM json_each(?))",
+                (json.dumps(changed),)
+            ).fetchall()
+            keep = ~np.isin(previous.rows, np.asarray(changed, dtype=np.int64))
+            rows = np.concatenate([previous.rows[keep], np.array([record[0] for record in records], dtype=np.int64)])
+            ids = np.concatenate([previous.ids[keep], _object_array([record[1] for record in records])])
+            metadatas = np.concatenate([
+                previous.metadatas[keep],
+                _object_array([json.loads(record[2]) for record in records])
+            ])
+            order = np.argsort(rows, kind="stable")
+            rows, ids, metadatas = rows[order], ids[order], metadatas[order]
+        else:
+            records = self._conn.execute("SELECT row, chunk_id, metadata FROM rows ORDER BY row").fetchall()
+            rows = np.array([record[0] for record in records], dtype=np.int64)
+            ids = _object_array([record[1] for record in records])
+            metadatas = _object_array([json.loads(record[2]) for record in records])
+
+        dimension = int(self._get_meta("dimension") or 0)
+        capacity = int(self._get_meta("capacity") or 0)
+        matrix = None
+        if len(rows) and capacity and dimension:
+            matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode="r", shape=(capacity, dimension))
+        # 検索中の他スレッドは読み直し前の一覧をそのまま使う
+        self._snapshot = _Snapshot(generation, matrix, rows, ids, metadatas)
+        return self._snapshot
+
+    def _ensure_dimension(self, dimension: int) -> int:
+        stored = self._get_meta("dimension")
+        if stored is None:
+            self._conn.execute("INSERT INTO meta (key, value) VALUES ('dimension', ?)", (str(dimension),))
+            return dimension
+        if int(stored) != dimension:
+            raise ValueError(f"埋め込みの次元数 {dimension} が保存済みの次元数 {stored} と一致しません")
+        return dimension
+
+    def _allocate_row(self, generation: int) -> int:
+        """空き行（以前の世代で削除され、再利用までの時間が経過したもの）または末尾の新しい行を割り当てる"""
+        free = self._conn.execute(
+            "SELECT row FROM free_rows WHERE freed_generation < ? AND freed_at <= ? ORDER BY row LIMIT 1",
+            (generation, time.time() - self.FREE_ROW_REUSE_SECONDS)
+        ).fetchone()
+        if free:
+            self._conn.execute("DELETE FROM free_rows WHERE row = ?", free)
+            return free[0]
+        # 再利用を待っている空き行も割り当て済みとして扱う
+        last = self._conn.execute(
+            "SELECT MAX(last) FROM (SELECT MAX(row) AS last FROM rows UNION ALL SELECT MAX(row) FROM free_rows)"
+        ).fetchone()[0]
+        return 0 if last is None else last + 1
+
+    def _free_row(self, row: int, generation: int) -> None:
+        self._conn.execute("DELETE FROM rows WHERE row = ?", (row,))
+        self._conn.execute(
+            "INSERT OR REPLACE INTO free_rows (row, freed_generation, freed_at) VALUES (?, ?, ?)",
+            (row, generation, time.time())
+        )
+
+    def _writable_matrix(self, rows: int, dimension: int) -> np.memmap:
+        """書き込み用のメモリマップ（容量が足りない場合はファイルを倍に拡張）"""
+        capacity = int(self._get_meta("capacity") or 0)
+        if rows > capacity or not self.vectors_path.exists():
+            capacity = max(rows, capacity * 2, 1024)
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(capacity * dimension * self.dtype.itemsize)
+            self._set_meta("capacity", capacity)
+        return np.memmap(self.vectors_path, dtype=self.dtype, mode="r+", shape=(capacity, dimension))
+
+    def _next_generation(self) -> int:
+        return int(self._get_meta("generation") or 0) + 1
+
+    def _record_changes(self, generation: int, rows: List[int]) -> None:
+        """世代番号を進めて変更した行を記録し、古い変更履歴を削除"""
+        if not rows:
+            return
+        self._set_meta("generation", generation)
+        self._conn.executemany("INSERT INTO changes (generation, row) VALUES (?, ?)", [(generation, row) for row in rows])
+        expired = generation - self.CHANGE_LOG_GENERATIONS
+        if expired > int(self._get_meta("log_start") or 0):
+            self._conn.execute("DELETE FROM changes WHERE generation <= ?", (expired,))
+            self._set_meta("log_start", expired)
+
+    def _set_meta(self, key: str, value: Any) -> None:
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, str(value))
+        )
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+
+def create_vector_store(store: Optional[str] = None) -> VectorStore:
+    """設定に応じたベクトルの保存先を作成"""
+    store = store or settings.VECTOR_STORE
+    if store == "chroma":
+        return ChromaVectorStore()
+    if store == "flat":
+        return FlatVectorStore()
+    raise ValueError(f"サポートされていないベクトルストア: {store}")
+
+
+def migrate(source: VectorStore, target: VectorStore, page_size: int = 1000) -> int:
+    """source の全チャンクを target にコピー"""
+    copied = 0
+    offset = 0
+    while True:
+        page = source.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+        if page["ids"]:
+            target.upsert(page["ids"], np.asarray(page["embeddings"], dtype=np.float32), page["documents"], page["metadatas"])
+            copied += len(page["ids"])
+        if len(page["ids"]) < page_size:
+            return copied
+        offset += page_size
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ベクトルストアの管理")
+    parser.add_argument("command", choices=["migrate"])
+    parser.add_argument("--source", default="chroma", choices=VECTOR_STORES)
+    parser.add_argument("--target", default="flat", choices=VECTOR_STORES)
+    args = parser.parse_args()
+
+    copied = migrate(create_vector_store(args.source), create_vector_store(args.target))
+    print(f"{args.source} から {args.target} に {copied} チャンクをコピーしました")
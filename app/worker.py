@@ -0,0 +1,325 @@
+import asyncio
+import logging
+from pathlib import Path
+from typing import List, Optional
+
+from celery import Celery
+
+from .config import settings
+from .models.skillsheet import IngestionResult
+from .services.drive_sync_ledger import DriveSyncLedger, plan_sync
+from .services.executor import executor_service
+from .services.file_catalog import FileCatalog
+from .services.job_service import JobService
+
+# ログ設定
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+celery_app = Celery(
+    "skillsheet_rag",
+    broker=settings.CELERY_BROKER_URL or settings.REDIS_URL,
+    backend=settings.CELERY_RESULT_BACKEND or settings.REDIS_URL,
+)
+celery_app.conf.update(
+    task_default_queue=settings.INGESTION_QUEUE,
+    task_always_eager=settings.CELERY_TASK_ALWAYS_EAGER,
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,  # 重い取り込みタスクを1件ずつ取得
+    worker_concurrency=settings.INGESTION_WORKER_CONCURRENCY,
+    result_expires=settings.JOB_TTL_SECONDS,
+)
+if settings.GOOGLE_DRIVE_SYNC_FOLDERS:
+    # celery -A app.worker.celery_app beat で定期的にフォルダを差分同期
+    celery_app.conf.beat_schedule = {
+        "sync-google-drive-folders": {
+            "task": "sync_google_drive_folders",
+            "schedule": settings.GOOGLE_DRIVE_SYNC_INTERVAL_SECONDS,
+        },
+    }
+
+# ワーカープロセス内で使い回すサービス（初回タスク実行時に初期化）
+_rag_service = None
+_google_docs_service = None
+_drive_sync_ledger: Optional[DriveSyncLedger] = None
+_file_catalog: Optional[FileCatalog] = None
+_job_service: Optional[JobService] = None
+
+
+def get_job_service() -> JobService:
+    global _job_service
+    if _job_service is None:
+        _job_service = JobService()
+    return _job_service
+
+
+def get_rag_service():
+    global _rag_service
+    if _rag_service is None:
+        from .services.rag_service import RAGService
+        _rag_service = RAGService()
+    return _rag_service
+
+
+def get_google_docs_service():
+    global _google_docs_service
+    if _google_docs_service is None:
+        from .services.google_docs_service import GoogleDocsService
+        _google_docs_service = GoogleDocsService()
+    return _google_docs_service
+
+
+def get_drive_sync_ledger() -> DriveSyncLedger:
+    global _drive_sync_ledger
+    if _drive_sync_ledger is None:
+        _drive_sync_ledger = DriveSyncLedger()
+    return _drive_sync_ledger
+
+
+def get_file_catalog() -> FileCatalog:
+    global _file_catalog
+    if _file_catalog is None:
+        _file_catalog = FileCatalog()
+    return _file_catalog
+
+
+def _ingest(job_id: str, file_path: Path, filename: str, source: str = "upload") -> bool:
+    """ファイルをRAGシステムに取り込み、ジョブ状態を更新"""
+    job_service = get_job_service()
+    rag_service = get_rag_service()
+
+    result = asyncio.run(rag_service.ingest_document(
+        file_path,
+        filename,
+        progress_callback=lambda stage, progress: job_service.update_progress(job_id, stage, progress),
+        source=source
+    ))
+    if result.success:
+        if source == "upload":
+            get_file_catalog().mark_processed([filename])
+        job_service.mark_completed(
+            job_id,
+            f"RAGシステムへの追加が完了しました（埋め込み再利用率 {result.reuse_ratio:.0%}）",
+            result=result.model_dump()
+        )
+    else:
+        job_service.mark_failed(job_id, result.message or "RAGシステムへの追加に失敗しました")
+    return result.success
+
+
+@celery_app.task(name="ingest_document")
+def ingest_document(job_id: str, file_path: str, filename: str) -> bool:
+    """アップロード済みファイルの取り込みタスク"""
+    try:
+        return _ingest(job_id, Path(file_path), filename)
+    except Exception as e:
+        logger.error(f"取り込みタスクエラー '{filename}': {str(e)}")
+        get_job_service().mark_failed(job_id, str(e))
+        raise
+
+
+@celery_app.task(name="import_google_doc")
+def import_google_doc(job_id: str, file_id: str, filename: str) -> bool:
+    """Google Driveファイルのダウンロード＋取り込みタスク"""
+    job_service = get_job_service()
+    try:
+        google_docs_service = get_google_docs_service()
+        if not google_docs_service.is_authenticated():
+            job_service.mark_failed(job_id, "Google認証が必要です。credentials.jsonを設定してください。")
+            return False
+
+        job_service.update_progress(job_id, "downloading", 0.0)
+        temp_file = asyncio.run(google_docs_service.download_file(file_id, filename))
+        if not temp_file:
+            job_service.mark_failed(job_id, "Google Driveからのファイルダウンロードに失敗しました")
+            return False
+
+        return _ingest(job_id, temp_file, filename, source="google_drive")
+    except Exception as e:
+        logger.error(f"Google Docsインポートタスクエラー '{filename}': {str(e)}")
+        job_service.mark_failed(job_id, str(e))
+        raise
+
+
+@celery_app.task(name="ingest_batch")
+def ingest_batch(job_id: str, documents: List[List[str]]) -> dict:
+    """一括アップロードされたファイルの取り込みタスク"""
+    job_service = get_job_service()
+    try:
+        rag_service = get_rag_service()
+        results = asyncio.run(rag_service.add_documents(
+            [(Path(file_path), filename) for file_path, filename in documents],
+            progress_callback=lambda stage, progress: job_service.update_progress(job_id, stage, progress)
+        ))
+        succeeded = sum(1 for result in results if result.success)
+        get_file_catalog().mark_processed([result.filename for result in results if result.success])
+        summary = {
+            "total": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "files": [result.model_dump() for result in results],
+        }
+        job_service.mark_completed(
+            job_id,
+            f"{len(results)} 件中 {succeeded} 件をRAGシステムに追加しました",
+            result=summary
+        )
+        return summary
+    except Exception as e:
+        logger.error(f"一括取り込みタスクエラー: {str(e)}")
+        job_service.mark_failed(job_id, str(e))
+        raise
+
+
+def drive_document_name(folder_id: str, file_id: str) -> str:
+    """フォルダ同期で取り込むドキュメントのキー
+
+    Drive では同じフォルダに同名のファイルを置け、同じ名前のファイルが別のフォルダにもあるため、
+    表示名ではなくフォルダIDとファイルIDで識別する（表示名はメタデータとカタログの display_name に記録）。
+    """
+    return f"gdrive/{folder_id}/{file_id}"
+
+
+async def _remove_drive_document(rag_service, filename: str) -> None:
+    """同期で取り込んだドキュメントを削除
+
+    ファイルIDのキーを使う前に表示名で登録した記録は、同じ名前のアップロードファイルなど
+    他の取り込み元のドキュメントを消さないよう、取り込み元が google_drive の場合のみ削除する。
+    """
+    if not filename.startswith("gdrive/"):
+        source = await executor_service.run_io(rag_service.document_catalog.get_source, filename)
+        if source != "google_drive":
+            return
+    await rag_service.remove_document(filename)
+
+
+async def _sync_folder(job_id: str, folder_id: str, full: bool = False, lock_owner: Optional[str] = None) -> dict:
+    """フォルダの前回の同期からの差分を反映
+
+    追加・更新されたファイルのみダウンロードが完了した順に取り込み、フォルダから消えたファイルは
+    RAGシステムから削除する。full=True の場合は同期済みの記録を使わず全件を取り込み直す。
+    lock_owner を指定した場合は、一覧の取得後とファイルを1件取り込むごとに同期ロックを延長し、
+    ロックを失っていれば同期を中断する。
+    """
+    job_service = get_job_service()
+    google_docs_service = get_google_docs_service()
+    rag_service = get_rag_service()
+    ledger = get_drive_sync_ledger()
+
+    async def extend_lock() -> None:
+        if lock_owner is None:
+            return
+        extended = await executor_service.run_io(
+            ledger.extend_lock, folder_id, lock_owner, settings.GOOGLE_DRIVE_SYNC_LOCK_TTL_SECONDS
+        )
+        if not extended:
+            raise RuntimeError(f"フォルダ '{folder_id}' の同期ロックの期限が切れたため、同期を中断しました")
+
+    job_service.update_progress(job_id, "listing", 0.0)
+    files = await executor_service.run_io(google_docs_service.list_folder_files, folder_id)
+    entries = await executor_service.run_io(ledger.get_entries, folder_id)
+    changed, deleted = plan_sync(entries, files)
+    await extend_lock()
+    if full:
+        changed = files
+    else:
+        # 表示名のキーで登録した以前の記録は、ファイルIDのキーで取り込み直す
+        changed_ids = {file["id"] for file in changed}
+        changed += [
+            file for file in files
+            if file["id"] not in changed_ids
+            and file["id"] in entries
+            and entries[file["id"]]["filename"] != drive_document_name(folder_id, file["id"])
+        ]
+
+    # フォルダから消えたファイルを削除
+    for entry in deleted:
+        await _remove_drive_document(rag_service, entry["filename"])
+        if entry["file_path"]:
+            Path(entry["file_path"]).unlink(missing_ok=True)
+    await executor_service.run_io(ledger.remove, folder_id, [entry["file_id"] for entry in deleted])
+
+    results: List[IngestionResult] = []
+    job_service.update_progress(job_id, "downloading", 0.0)
+    async for file, path in google_docs_service.iter_downloads(
+        iter(changed), google_docs_service.folder_download_dir(folder_id)
+    ):
+        # 大きなフォルダの初回同期でもロックの期限が切れないよう、1件ごとに延長
+        await extend_lock()
+        if path is None:
+            results.append(IngestionResult(filename=file["name"], success=False, message="ダウンロードに失敗しました"))
+        else:
+            document_name = drive_document_name(folder_id, file["id"])
+            result = await rag_service.ingest_document(
+                path, document_name, source="google_drive", display_name=file["name"]
+            )
+            # 結果には表示名を返す
+            result.filename = file["name"]
+            results.append(result)
+            if result.success:
+                # 以前のキーで登録したドキュメントを削除
+                previous = entries.get(file["id"])
+                if previous and previous["filename"] != document_name:
+                    await _remove_drive_document(rag_service, previous["filename"])
+                if previous and previous["file_path"] and previous["file_path"] != str(path):
+                    Path(previous["file_path"]).unlink(missing_ok=True)
+                await executor_service.run_io(ledger.record, folder_id, file, document_name, str(path))
+        job_service.update_progress(job_id, "ingesting", len(results) / len(changed))
+
+    succeeded = sum(1 for result in results if result.success)
+    return {
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "unchanged": len(files) - len(changed),
+        "deleted": len(deleted),
+        "files": [result.model_dump() for result in results],
+    }
+
+
+def _run_folder_sync(job_id: str, folder_id: str, full: bool = False) -> dict:
+    """同じフォルダの同期が実行中でなければ差分同期を実行し、ジョブ状態を更新"""
+    job_service = get_job_service()
+    google_docs_service = get_google_docs_service()
+    if not google_docs_service.is_authenticated():
+        job_service.mark_failed(job_id, "Google認証が必要です。credentials.jsonを設定してください。")
+        return {}
+
+    ledger = get_drive_sync_ledger()
+    owner = ledger.acquire_lock(folder_id, settings.GOOGLE_DRIVE_SYNC_LOCK_TTL_SECONDS)
+    if owner is None:
+        job_service.mark_completed(job_id, "同じフォルダの同期が実行中のためスキップしました")
+        return {}
+    try:
+        summary = asyncio.run(_sync_folder(job_id, folder_id, full, lock_owner=owner))
+    finally:
+        ledger.release_lock(folder_id, owner)
+
+    job_service.mark_completed(
+        job_id,
+        f"{summary['total']} 件の追加・更新のうち {summary['succeeded']} 件を取り込み、"
+        f"{summary['deleted']} 件を削除しました（変更なし {summary['unchanged']} 件）",
+        result=summary
+    )
+    return summary
+
+
+@celery_app.task(name="sync_google_drive_folder")
+def sync_google_drive_folder(job_id: str, folder_id: str, full: bool = False) -> dict:
+    """Google Driveフォルダの差分同期タスク"""
+    try:
+        return _run_folder_sync(job_id, folder_id, full)
+    except Exception as e:
+        logger.error(f"Google Driveフォルダ同期タスクエラー '{folder_id}': {str(e)}")
+        get_job_service().mark_failed(job_id, str(e))
+        raise
+
+
+@celery_app.task(name="sync_google_drive_folders")
+def sync_google_drive_folders() -> None:
+    """Settings.GOOGLE_DRIVE_SYNC_FOLDERS の定期同期タスク（Celery beat から実行）"""
+    job_service = get_job_service()
+    for folder_id in settings.GOOGLE_DRIVE_SYNC_FOLDERS:
+        job = job_service.create_job(f"folder:{folder_id}", source="google_drive")
+        sync_google_drive_folder.delay(job.job_id, folder_id)
@@ -0,0 +1,57 @@
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pytest
+
+from app.config import settings
+from app.services.fake_drive import FakeDriveService, FakeFiles, FakeMediaDownload, FakeRequest
+from app.services.google_docs_service import GoogleDocsService
+
+
+class RecordingFiles(FakeFiles):
+    """files().list() に渡された pageToken を記録する"""
+
+    def list(self, q: Optional[str] = None, pageSize: int = 100, pageToken: Optional[str] = None, **kwargs) -> FakeRequest:
+        self.service.page_tokens.append(pageToken)
+        return super().list(q=q, pageSize=pageSize, pageToken=pageToken, **kwargs)
+
+
+class RecordingDriveService(FakeDriveService):
+    def __init__(self, root: str):
+        super().__init__(root)
+        self.page_tokens: List[Optional[str]] = []
+
+    def files(self) -> RecordingFiles:
+        return RecordingFiles(self)
+
+
+def write_files(root: Path, contents: Dict[str, bytes]) -> None:
+    for relative, data in contents.items():
+        path = root / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+
+@pytest.fixture
+def drive_root(tmp_path: Path) -> Path:
+    root = tmp_path / "drive"
+    root.mkdir()
+    return root
+
+
+@pytest.fixture
+def drive(drive_root: Path) -> RecordingDriveService:
+    return RecordingDriveService(str(drive_root))
+
+
+@pytest.fixture
+def google_docs_service(drive: RecordingDriveService) -> GoogleDocsService:
+    return GoogleDocsService(drive_service=drive, media_download=FakeMediaDownload)
+
+
+@pytest.fixture
+def small_pages(monkeypatch):
+    """1ページ2件・小さなチャンクで、ページングと分割ダウンロードを少ないファイルで試す"""
+    monkeypatch.setattr(settings, "GOOGLE_DRIVE_PAGE_SIZE", 2)
+    monkeypatch.setattr(settings, "GOOGLE_DRIVE_DOWNLOAD_CHUNK_SIZE", 4)
+    monkeypatch.setattr(settings, "GOOGLE_DRIVE_DOWNLOAD_CONCURRENCY", 3)
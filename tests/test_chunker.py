@@ -0,0 +1,72 @@
+import random
+import re
+from typing import List, Union
+
+import pytest
+
+from app.services.chunker import BaseChunker, CharacterChunker, TokenChunker
+
+# 英数字は4文字ずつ、それ以外は1文字ずつを1トークンとする（空白はトークンにしない）
+_TOKEN = re.compile(r"[A-Za-z0-9]{1,4}|\S")
+
+
+class FakeTokenizer:
+    """TokenChunker が使う呼び出し方（トークン数・オフセット）だけを実装したトークナイザー"""
+
+    def __call__(self, text: Union[str, List[str]], add_special_tokens: bool = False, return_offsets_mapping: bool = False):
+        if isinstance(text, list):
+            return {"input_ids": [[0] * len(_TOKEN.findall(item)) for item in text]}
+        return {"offset_mapping": [match.span() for match in _TOKEN.finditer(text)]}
+
+
+TEXTS = {
+    "sentences": "Java・Spring Bootでの開発経験5年。AWSの設計・構築を担当。\n" * 40,
+    "long_clauses": "要件定義、基本設計、詳細設計、実装、テスト、運用保守" * 40 + "を担当。\n" + "短い文。" * 10,
+    "long_words": " ".join(f"project{i} java python kubernetes" for i in range(200)) + ".\nDone.",
+    "no_boundary": "あ" * 3000 + "い、う" + "え" * 500 + "。",
+    "no_boundary_ascii": "x" * 5000 + "\n" + "end",
+}
+
+
+def feed_in_segments(chunker: BaseChunker, text: str, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    chunks = []
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 200)
+        chunks.extend(chunker.feed(text[position:position + size]))
+        position += size
+    return chunks + chunker.finish()
+
+
+@pytest.mark.parametrize("name", sorted(TEXTS))
+@pytest.mark.parametrize("seed", range(5))
+def test_token_chunker_feed_matches_split(name, seed):
+    text = TEXTS[name]
+    expected = TokenChunker(FakeTokenizer(), max_tokens=16, overlap_tokens=4).split(text)
+
+    chunks = feed_in_segments(TokenChunker(FakeTokenizer(), max_tokens=16, overlap_tokens=4), text, seed)
+
+    assert chunks == expected
+
+
+def test_token_chunker_bounds_pending_text_without_boundaries():
+    chunker = TokenChunker(FakeTokenizer(), max_tokens=16, overlap_tokens=4)
+
+    for _ in range(100):
+        chunker.feed("あ" * 50)
+
+    assert len(chunker._pending) < chunker.max_pending_chars + 50
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_character_chunker_feed_matches_split(seed):
+    text = TEXTS["sentences"] + TEXTS["no_boundary"]
+    expected = CharacterChunker(200, 40).split(text)
+
+    assert feed_in_segments(CharacterChunker(200, 40), text, seed) == expected
+
+
+def test_base_chunker_is_abstract():
+    with pytest.raises(TypeError):
+        BaseChunker()
@@ -0,0 +1,129 @@
+import asyncio
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pytest
+
+from app import worker
+from app.models.skillsheet import IngestionResult
+from app.services.drive_sync_ledger import DriveSyncLedger
+
+from .conftest import write_files
+
+SHEETS = {f"sheet{i}.pdf": f"skillsheet {i}".encode() for i in range(5)}
+
+
+class RecordingDocumentCatalog:
+    def __init__(self, documents: Dict[str, dict]):
+        self.documents = documents
+
+    def get_source(self, filename: str) -> Optional[str]:
+        document = self.documents.get(filename)
+        return document["source"] if document else None
+
+
+class RecordingRAGService:
+    """取り込み・削除されたドキュメントを記録する RAGService の代わり"""
+
+    def __init__(self):
+        self.documents: Dict[str, dict] = {}
+        self.removed: List[str] = []
+        self.document_catalog = RecordingDocumentCatalog(self.documents)
+
+    async def ingest_document(self, file_path: Path, filename: str, progress_callback=None, source: str = "upload", display_name: Optional[str] = None) -> IngestionResult:
+        self.documents[filename] = {
+            "content": file_path.read_bytes(),
+            "source": source,
+            "display_name": display_name,
+        }
+        return IngestionResult(filename=filename, success=True, chunks=1)
+
+    async def remove_document(self, filename: str) -> bool:
+        self.removed.append(filename)
+        self.documents.pop(filename, None)
+        return True
+
+
+class NullJobService:
+    def update_progress(self, job_id: str, stage: str, progress: float) -> None:
+        pass
+
+
+@pytest.fixture
+def rag_service(monkeypatch, tmp_path, google_docs_service) -> RecordingRAGService:
+    rag_service = RecordingRAGService()
+    monkeypatch.setattr(worker, "_rag_service", rag_service)
+    monkeypatch.setattr(worker, "_google_docs_service", google_docs_service)
+    monkeypatch.setattr(worker, "_job_service", NullJobService())
+    monkeypatch.setattr(worker, "_drive_sync_ledger", DriveSyncLedger(str(tmp_path / "ledger.sqlite3")))
+    monkeypatch.setattr(google_docs_service, "folder_download_dir", lambda folder_id: tmp_path / "downloads" / folder_id)
+    return rag_service
+
+
+def test_sync_folder_ingests_every_page(drive_root, drive, rag_service, small_pages):
+    write_files(drive_root, SHEETS)
+
+    summary = asyncio.run(worker._sync_folder("job", "root"))
+
+    assert drive.page_tokens == [None, "2", "4"]
+    assert summary["total"] == summary["succeeded"] == len(SHEETS)
+    assert rag_service.documents == {
+        f"gdrive/root/{name}": {"content": content, "source": "google_drive", "display_name": name}
+        for name, content in SHEETS.items()
+    }
+
+
+def test_sync_folder_only_applies_changes(drive_root, rag_service, small_pages):
+    write_files(drive_root, SHEETS)
+    asyncio.run(worker._sync_folder("job", "root"))
+
+    unchanged = asyncio.run(worker._sync_folder("job", "root"))
+    assert unchanged["total"] == 0
+    assert unchanged["unchanged"] == len(SHEETS)
+
+    (drive_root / "sheet0.pdf").unlink()
+    (drive_root / "sheet1.pdf").write_bytes(b"updated")
+    summary = asyncio.run(worker._sync_folder("job", "root"))
+
+    assert summary["deleted"] == 1
+    assert summary["total"] == 1
+    assert "gdrive/root/sheet0.pdf" not in rag_service.documents
+    assert rag_service.documents["gdrive/root/sheet1.pdf"]["content"] == b"updated"
+
+
+def test_sync_folder_does_not_remove_other_sources(drive_root, rag_service, small_pages):
+    # 表示名のキーで記録された以前の同期結果と、同じ名前のアップロードファイル
+    write_files(drive_root, {"sheet0.pdf": SHEETS["sheet0.pdf"]})
+    file = worker.get_google_docs_service().list_folder_files("root")[0]
+    worker.get_drive_sync_ledger().record("root", file, "sheet0.pdf")
+    rag_service.documents["sheet0.pdf"] = {"content": b"uploaded", "source": "upload", "display_name": None}
+
+    asyncio.run(worker._sync_folder("job", "root"))
+
+    assert rag_service.documents["sheet0.pdf"]["source"] == "upload"
+    assert "gdrive/root/sheet0.pdf" in rag_service.documents
+
+
+def test_sync_folder_extends_lock(drive_root, rag_service, small_pages, monkeypatch):
+    write_files(drive_root, SHEETS)
+    ledger = worker.get_drive_sync_ledger()
+    owner = ledger.acquire_lock("root", 1)
+    monkeypatch.setattr(worker.settings, "GOOGLE_DRIVE_SYNC_LOCK_TTL_SECONDS", 3600)
+
+    asyncio.run(worker._sync_folder("job", "root", lock_owner=owner))
+
+    expires_at = ledger._conn.execute("SELECT expires_at FROM sync_locks WHERE folder_id = 'root'").fetchone()[0]
+    assert expires_at > time.time() + 3000
+
+
+def test_sync_folder_stops_when_lock_is_lost(drive_root, rag_service, small_pages):
+    write_files(drive_root, SHEETS)
+    ledger = worker.get_drive_sync_ledger()
+    owner = ledger.acquire_lock("root", 3600)
+    ledger.release_lock("root", owner)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(worker._sync_folder("job", "root", lock_owner=owner))
+
+    assert rag_service.documents == {}
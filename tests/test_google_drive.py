@@ -0,0 +1,87 @@
+import asyncio
+import threading
+import time
+from pathlib import Path
+
+from app.services.fake_drive import FakeMediaDownload
+
+from .conftest import write_files
+
+PDF_FILES = {f"sheet{i}.pdf": f"skillsheet {i} ".encode() * 3 for i in range(5)}
+
+
+def test_fake_list_returns_next_page_token(drive_root, drive):
+    write_files(drive_root, PDF_FILES)
+
+    first = drive.files().list(pageSize=2).execute()
+    last = drive.files().list(pageSize=2, pageToken="4").execute()
+
+    assert [file["name"] for file in first["files"]] == ["sheet0.pdf", "sheet1.pdf"]
+    assert first["nextPageToken"] == "2"
+    assert [file["name"] for file in last["files"]] == ["sheet4.pdf"]
+    assert "nextPageToken" not in last
+
+
+def test_list_folder_files_follows_next_page_token(drive_root, drive, google_docs_service, small_pages):
+    write_files(drive_root, {**PDF_FILES, "other/sheet.pdf": b"other folder", "notes.txt": b"not a skillsheet"})
+
+    files = google_docs_service.list_folder_files("root")
+
+    assert sorted(file["name"] for file in files) == sorted(PDF_FILES)
+    assert drive.page_tokens == [None, "2", "4"]
+
+
+def test_iter_downloads_streams_files_concurrently(tmp_path, drive_root, google_docs_service, small_pages):
+    write_files(drive_root, PDF_FILES)
+    files = google_docs_service.list_folder_files("root")
+    directory = tmp_path / "downloads"
+
+    lock = threading.Lock()
+    active = 0
+    max_active = 0
+    written_to = set()
+
+    class SlowMediaDownload(FakeMediaDownload):
+        """チャンクごとに少し待ち、同時に進んでいるダウンロード数と書き込み先を記録する"""
+
+        def next_chunk(self):
+            nonlocal active, max_active
+            with lock:
+                active += 1
+                max_active = max(max_active, active)
+                written_to.add(self._fd.name)
+            try:
+                time.sleep(0.02)
+                return super().next_chunk()
+            finally:
+                with lock:
+                    active -= 1
+
+    google_docs_service.media_download = SlowMediaDownload
+
+    async def download_all():
+        return [item async for item in google_docs_service.iter_downloads(iter(files), directory)]
+
+    downloaded = asyncio.run(download_all())
+
+    assert len(downloaded) == len(PDF_FILES)
+    assert max_active > 1
+    # 書き込みは .part に行い、完了後に置き換えて .part を残さない
+    assert written_to and all(name.endswith(".part") for name in written_to)
+    assert not list(directory.rglob("*.part"))
+    for file, path in downloaded:
+        assert path == directory / file["id"] / file["name"]
+        assert path.read_bytes() == PDF_FILES[file["name"]]
+
+
+def test_iter_downloads_keeps_same_named_files_apart(tmp_path, drive_root, google_docs_service, small_pages):
+    write_files(drive_root, {"a/スキルシート.pdf": b"folder a", "b/スキルシート.pdf": b"folder b"})
+    files = google_docs_service.list_folder_files("a") + google_docs_service.list_folder_files("b")
+
+    async def download_all():
+        return [item async for item in google_docs_service.iter_downloads(iter(files), tmp_path / "downloads")]
+
+    downloaded = asyncio.run(download_all())
+
+    contents = {file["id"]: path.read_bytes() for file, path in downloaded}
+    assert contents == {"a/スキルシート.pdf": b"folder a", "b/スキルシート.pdf": b"folder b"}